@@ -0,0 +1,262 @@
+"""
+Query builder cho GET /analytics/query: group by / metric / filter tùy ý nhưng
+chỉ trong whitelist DIMENSIONS, METRICS của dashboard_engine.
+
+Mỗi query được biên dịch thành ĐÚNG 1 câu SELECT ... GROUP BY có tham số
+(không ghép giá trị vào SQL), trả về vector thống kê [n, sum, count...] cho
+từng nhóm rồi finalize bằng dashboard_engine -> cùng công thức với dashboard.
+Các section của dashboard là preset (PRESETS) trên builder này.
+
+- ANALYTICS_MAX_GROUPS: số nhóm tối đa của 1 query (vượt -> lỗi, cần thêm filter)
+- ANALYTICS_QUERY_TIMEOUT_MS: giới hạn thời gian chạy (MySQL: hint MAX_EXECUTION_TIME)
+"""
+import os
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+import dashboard_engine as engine
+import models
+from metrics import timed
+
+ANALYTICS_MAX_GROUPS = int(os.getenv("ANALYTICS_MAX_GROUPS", "10000"))
+ANALYTICS_QUERY_TIMEOUT_MS = int(os.getenv("ANALYTICS_QUERY_TIMEOUT_MS", "5000"))
+MAX_GROUP_BY = 3
+MAX_FILTER_VALUES = 100
+
+# (nhóm, tên section) -> preset, giữ alias cột như response dashboard
+PRESETS = {section[1]: section for section in engine.SECTIONS}
+
+
+class QueryError(ValueError):
+    """Tham số query không hợp lệ (-> HTTP 400)"""
+
+
+class QueryTimeout(Exception):
+    """Query vượt ANALYTICS_QUERY_TIMEOUT_MS (-> HTTP 504)"""
+
+
+def dimension_sql(dimension: str) -> str:
+    if dimension not in engine.DIMENSIONS:
+        raise QueryError(f"Unknown dimension '{dimension}', allowed: {sorted(engine.DIMENSIONS)}")
+    return engine.DIMENSIONS[dimension][0]
+
+
+def _convert(dimension: str, raw: str):
+    """Ép giá trị filter (chuỗi trên URL) về kiểu của cột; 'null' = IS NULL"""
+    if raw.lower() == "null":
+        return None
+    source, _, order = engine.DIMENSIONS[dimension]
+    if order is not None:
+        if raw not in order:
+            raise QueryError(f"Invalid value '{raw}' for {dimension}, allowed: {order}")
+        return raw
+    column_type = models.Loan.__table__.columns[source].type.python_type
+    try:
+        return column_type(raw)
+    except ValueError:
+        raise QueryError(f"Invalid value '{raw}' for {dimension}")
+
+
+def parse_list(value) -> list:
+    if not value:
+        return []
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def parse_filters(value) -> dict:
+    """'Region:North|South,Year:2025' -> {"Region": ["North", "South"], "Year": [2025]}"""
+    filters = {}
+    for part in parse_list(value):
+        dimension, sep, raw = part.partition(":")
+        if not sep:
+            raise QueryError(f"Invalid filter '{part}', expected dimension:value[|value...]")
+        dimension_sql(dimension)
+        values = [_convert(dimension, v) for v in raw.split("|")]
+        if len(values) > MAX_FILTER_VALUES:
+            raise QueryError(f"Too many values for filter '{dimension}' (max {MAX_FILTER_VALUES})")
+        filters.setdefault(dimension, []).extend(values)
+    return filters
+
+
+def build_where(filters: dict, params: dict) -> str:
+    # Year / Month đứng đầu để khớp index (Year, Month, id)
+    ordered = sorted(filters.items(), key=lambda item: {"Year": 0, "Month": 1}.get(item[0], 2))
+    conditions = []
+    for dimension, values in ordered:
+        expr = dimension_sql(dimension)
+        parts = []
+        non_null = [v for v in values if v is not None]
+        if non_null:
+            names = []
+            for v in non_null:
+                name = f"p{len(params)}"
+                params[name] = v
+                names.append(f":{name}")
+            parts.append(f"{expr} = {names[0]}" if len(names) == 1 else f"{expr} IN ({', '.join(names)})")
+        if len(non_null) < len(values):
+            parts.append(f"{expr} IS NULL")
+        conditions.append(parts[0] if len(parts) == 1 else f"({' OR '.join(parts)})")
+    return " AND ".join(conditions) or "1=1"
+
+
+def required_measures(metrics: list) -> list:
+    measures = []
+    for metric in metrics:
+        if metric not in engine.METRICS:
+            raise QueryError(f"Unknown metric '{metric}', allowed: {sorted(engine.METRICS)}")
+        column = engine.METRICS[metric][1]
+        if column and column not in measures:
+            measures.append(column)
+    return measures
+
+
+def compile_query(group_by: list, metrics: list, filters: dict, max_groups: int, dialect: str = "mysql"):
+    """Trả về (sql, params) của câu aggregate duy nhất"""
+    if len(group_by) > MAX_GROUP_BY:
+        raise QueryError(f"At most {MAX_GROUP_BY} group_by dimensions")
+    if len(set(group_by)) != len(group_by):
+        raise QueryError("Duplicate group_by dimension")
+    if not metrics:
+        raise QueryError("At least one metric is required")
+
+    columns = [f"{dimension_sql(d)} AS g{i}" for i, d in enumerate(group_by)]
+    columns.append("COUNT(*) AS n")
+    for m in required_measures(metrics):
+        columns.append(f"SUM({m}) AS sum_{m}")
+        columns.append(f"COUNT({m}) AS cnt_{m}")
+
+    params = {}
+    where = build_where(filters, params)
+    hint = f"/*+ MAX_EXECUTION_TIME({ANALYTICS_QUERY_TIMEOUT_MS}) */ " if dialect == "mysql" else ""
+    sql = f"SELECT {hint}{', '.join(columns)} FROM loans WHERE {where}"
+    if group_by:
+        sql += f" GROUP BY {', '.join(f'g{i}' for i in range(len(group_by)))}"
+        # Lấy dư 1 dòng để biết có vượt giới hạn số nhóm hay không
+        sql += " LIMIT :max_groups"
+        params["max_groups"] = max_groups + 1
+    return sql, params
+
+
+def _is_timeout(error: Exception) -> bool:
+    message = str(error).lower()
+    return "3024" in message or "maximum statement execution time" in message
+
+
+def _timeout_error(error: Exception) -> Exception:
+    if _is_timeout(error):
+        return QueryTimeout(f"Query exceeded {ANALYTICS_QUERY_TIMEOUT_MS} ms")
+    return error
+
+
+def _partial(rows, group_by: list, metrics: list, max_groups: int):
+    measures = required_measures(metrics)
+    if len(rows) > max_groups:
+        raise QueryError(f"Result has more than {max_groups} groups, add filters or fewer group_by dimensions")
+
+    k = len(group_by)
+    partial = {}
+    for row in rows:
+        stats = np.zeros(engine.STATS_SIZE)
+        stats[0] = row[k]
+        for j, m in enumerate(measures):
+            i = engine.MEASURES.index(m)
+            stats[1 + 2 * i] = row[k + 1 + 2 * j] or 0.0
+            stats[2 + 2 * i] = row[k + 2 + 2 * j] or 0
+        partial[tuple(row[:k])] = stats
+    return partial
+
+
+def execute(db, group_by: list, metrics: list, filters: dict, max_groups: int = None):
+    """Chạy query, trả về partial {key: vector thống kê} như dashboard_engine.accumulate"""
+    max_groups = max_groups or ANALYTICS_MAX_GROUPS
+    sql, params = compile_query(group_by, metrics, filters, max_groups, db.bind.dialect.name)
+    try:
+        rows = db.execute(text(sql), params).fetchall()
+    except Exception as e:
+        raise _timeout_error(e)
+    return _partial(rows, group_by, metrics, max_groups)
+
+
+async def execute_async(db, group_by: list, metrics: list, filters: dict, max_groups: int = None):
+    """Như execute trên AsyncSession (số dòng <= max_groups, chuyển sang partial ngay trên event loop)"""
+    max_groups = max_groups or ANALYTICS_MAX_GROUPS
+    sql, params = compile_query(group_by, metrics, filters, max_groups, db.bind.dialect.name)
+    try:
+        rows = (await db.execute(text(sql), params)).fetchall()
+    except Exception as e:
+        raise _timeout_error(e)
+    return _partial(rows, group_by, metrics, max_groups)
+
+
+def run_query(db, group_by: list, metrics: list, filters: dict, order_by: str = None,
+              limit: int = None, max_groups: int = None):
+    """Query tự do: alias cột = tên dimension / metric"""
+    if order_by:
+        name = order_by.lstrip("-")
+        if name not in group_by and name not in metrics:
+            raise QueryError(f"order_by must be one of group_by or metrics: {group_by + metrics}")
+
+    start = time.perf_counter()
+    partial = execute(db, group_by, metrics, filters, max_groups)
+    section = ("query", "query", [(d, d) for d in group_by], [(m, m) for m in metrics], True)
+    rows = engine.finalize_section(section, partial)
+
+    if order_by:
+        name, descending = order_by.lstrip("-"), order_by.startswith("-")
+        present = [r for r in rows if r[name] is not None]
+        present.sort(key=lambda r: r[name], reverse=descending)
+        rows = present + [r for r in rows if r[name] is None]
+
+    total = len(rows)
+    if limit is not None:
+        rows = rows[:limit]
+    return {
+        "group_by": group_by,
+        "metrics": metrics,
+        "filters": filters,
+        "total_groups": total,
+        "rows": rows,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def run_preset(db, name: str, filters: dict):
+    if name not in PRESETS:
+        raise QueryError(f"Unknown preset '{name}', allowed: {sorted(PRESETS)}")
+    section = PRESETS[name]
+    group_by = [d for _, d in section[2]]
+    metrics = [m for _, m in section[3]]
+    return engine.finalize_section(section, execute(db, group_by, metrics, filters))
+
+
+def dashboard_queries(month=None, year=None):
+    """(section, group_by, metrics, filters) cho KPI và từng section của dashboard"""
+    filters = {}
+    if month:
+        filters["Month"] = [month]
+    if year:
+        filters["Year"] = [year]
+
+    queries = [("kpi", [], ["count", "default_rate", "avg_credit_score", "avg_loan_amount"], filters)]
+    for section in engine.SECTIONS:
+        queries.append((section[1], [d for _, d in section[2]], [m for _, m in section[3]], filters))
+    return queries
+
+
+def get_dashboard_data(db, month=None, year=None):
+    """Dashboard dựng từ các preset: mỗi section 1 câu aggregate (DASHBOARD_SOURCE=query)"""
+    partials = {}
+    for name, group_by, metrics, filters in dashboard_queries(month, year):
+        with timed(f"dashboard.query.{name}"):
+            partials[name] = execute(db, group_by, metrics, filters)
+    return engine.build_dashboard(partials)
+
+
+async def get_dashboard_data_async(db, month=None, year=None):
+    partials = {}
+    for name, group_by, metrics, filters in dashboard_queries(month, year):
+        with timed(f"dashboard.query.{name}"):
+            partials[name] = await execute_async(db, group_by, metrics, filters)
+    return await engine.in_executor(engine.build_dashboard, partials)
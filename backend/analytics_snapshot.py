@@ -0,0 +1,333 @@
+"""
+Snapshot dạng cột của bảng loans cho dashboard (DASHBOARD_SOURCE=snapshot).
+
+- Load bảng loans 1 lần (đọc theo khúc id), giữ trong RAM:
+    + dimension: mã hóa từ điển (dictionary encoding) -> mảng uint8/uint16/int32
+      (age_group, loan_amount_group đọc từ cột lưu sẵn trong bảng loans)
+    + measure: float32, NULL = NaN
+    + bitmap index (np.packbits) cho từng giá trị Year / Month + bitmap các dòng còn sống
+- Mỗi section = 1 lần np.bincount trên mã nhóm ghép, rồi finalize như dashboard_engine
+- create_loan / bulk / delete_loan cập nhật snapshot tăng dần, không load lại
+- ANALYTICS_SNAPSHOT_MAX_AGE (giây, 0 = không hết hạn): load lại định kỳ khi chạy
+  nhiều worker (ghi ở worker khác không tới được snapshot của worker này)
+"""
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+import dashboard_engine as engine
+
+ANALYTICS_SNAPSHOT_MAX_AGE = float(os.getenv("ANALYTICS_SNAPSHOT_MAX_AGE", "0"))
+LOAD_CHUNK_SIZE = 100000
+
+DIMENSIONS = list(dict.fromkeys(
+    [d for section in engine.SECTIONS for _, d in section[2]] + ["Year", "Month"]
+))
+SOURCE_COLUMNS = engine.source_columns(extra_dimensions=("Year", "Month"))
+
+
+def _code_dtype(cardinality: int):
+    if cardinality <= np.iinfo(np.uint8).max:
+        return np.uint8
+    if cardinality <= np.iinfo(np.uint16).max:
+        return np.uint16
+    return np.int32
+
+
+def _set_bits(bitmap, positions, on: bool = True):
+    bits = (np.uint8(128) >> (positions & 7).astype(np.uint8)).astype(np.uint8)
+    if on:
+        np.bitwise_or.at(bitmap, positions >> 3, bits)
+    else:
+        np.bitwise_and.at(bitmap, positions >> 3, ~bits)
+
+
+class _Dictionary:
+    """
+    Giá trị -> mã nhỏ liên tục, theo thứ tự xuất hiện đầu tiên (NULL cũng là 1 giá trị).
+    Tra theo engine.collation_key: 'Central' / 'central' cùng 1 mã, values giữ cách viết đầu tiên.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def lookup(self, value):
+        return self.index.get(engine.collation_key(value))
+
+    def code(self, value):
+        key = engine.collation_key(value)
+        code = self.index.get(key)
+        if code is None:
+            code = self.index[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def encode(self, values) -> np.ndarray:
+        codes, uniques = engine._factorize(values)
+        lookup = np.array([self.code(u) for u in uniques], dtype=np.int64)
+        return lookup[codes] if len(lookup) else np.zeros(0, dtype=np.int64)
+
+
+class LoanSnapshot:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded_at = None
+        self.load_seconds = None
+        self.stale = False
+        self._reset()
+
+    def _reset(self):
+        self.size = 0
+        self.capacity = 0
+        self.deleted = 0
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.dictionaries = {d: _Dictionary() for d in DIMENSIONS}
+        self.codes = {d: np.zeros(0, dtype=np.uint8) for d in DIMENSIONS}
+        self.measures = {m: np.zeros(0, dtype=np.float32) for m in engine.MEASURES}
+        self.null_counts = {m: 0 for m in engine.MEASURES}
+        self.bitmaps = {"Year": [], "Month": []}
+        self.alive = np.zeros(0, dtype=np.uint8)
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def invalidate(self):
+        """Đánh dấu cần load lại ở lần query kế tiếp"""
+        self.stale = True
+
+    # --- lưu trữ -------------------------------------------------------------
+
+    def _grow(self, needed: int):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2, 1024)
+        nbytes = (capacity + 7) // 8
+
+        def resized(array, length, fill=0):
+            out = np.full(length, fill, dtype=array.dtype)
+            out[:len(array)] = array
+            return out
+
+        self.ids = resized(self.ids, capacity)
+        for d in DIMENSIONS:
+            self.codes[d] = resized(self.codes[d], capacity)
+        for m in engine.MEASURES:
+            self.measures[m] = resized(self.measures[m], capacity, np.nan)
+        for d in self.bitmaps:
+            self.bitmaps[d] = [resized(b, nbytes) for b in self.bitmaps[d]]
+        self.alive = resized(self.alive, nbytes)
+        self.capacity = capacity
+
+    def _widen_codes(self):
+        for d in DIMENSIONS:
+            dtype = _code_dtype(len(self.dictionaries[d].values))
+            if np.dtype(dtype).itemsize > self.codes[d].dtype.itemsize:
+                self.codes[d] = self.codes[d].astype(dtype)
+
+    def _append_columns(self, ids, columns, build_bitmaps: bool = True):
+        n = len(ids)
+        if n == 0:
+            return
+        start, end = self.size, self.size + n
+        self._grow(end)
+
+        encoded = {d: self.dictionaries[d].encode(engine.dimension_values(columns, d)) for d in DIMENSIONS}
+        self._widen_codes()
+        self.ids[start:end] = ids
+        for d in DIMENSIONS:
+            self.codes[d][start:end] = encoded[d]
+        for m in engine.MEASURES:
+            values = columns[m].astype(np.float32)
+            self.measures[m][start:end] = values
+            self.null_counts[m] += int(np.isnan(values).sum())
+        self.size = end
+
+        if build_bitmaps:
+            positions = np.arange(start, end, dtype=np.int64)
+            nbytes = (self.capacity + 7) // 8
+            for d, bitmaps in self.bitmaps.items():
+                while len(bitmaps) < len(self.dictionaries[d].values):
+                    bitmaps.append(np.zeros(nbytes, dtype=np.uint8))
+                for code in np.unique(encoded[d]):
+                    _set_bits(bitmaps[code], positions[encoded[d] == code])
+            _set_bits(self.alive, positions)
+
+    def _build_bitmaps(self):
+        nbytes = (self.capacity + 7) // 8
+
+        def packed(flags):
+            out = np.zeros(nbytes, dtype=np.uint8)
+            bits = np.packbits(flags)
+            out[:len(bits)] = bits
+            return out
+
+        for d in self.bitmaps:
+            codes = self.codes[d][:self.size]
+            self.bitmaps[d] = [packed(codes == c) for c in range(len(self.dictionaries[d].values))]
+        self.alive = packed(np.ones(self.size, dtype=bool))
+
+    # --- load / cập nhật -----------------------------------------------------
+
+    def load(self, db, chunk_size: int = LOAD_CHUNK_SIZE):
+        """Đọc toàn bộ bảng loans theo từng khúc id"""
+        sql = text(
+            f"SELECT id, {', '.join(SOURCE_COLUMNS)} FROM loans "
+            "WHERE id > :last_id ORDER BY id LIMIT :limit"
+        )
+        start = time.perf_counter()
+        with self._lock:
+            self._reset()
+            last_id = 0
+            while True:
+                rows = db.execute(sql, {"last_id": last_id, "limit": chunk_size}).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                columns = engine.columns_from_rows(SOURCE_COLUMNS, [tuple(r[1:]) for r in rows])
+                self._append_columns(np.array([r[0] for r in rows], dtype=np.int64), columns,
+                                     build_bitmaps=False)
+            self._grow(max(self.size, 1))
+            self._build_bitmaps()
+            self.loaded_at = time.time()
+            self.load_seconds = time.perf_counter() - start
+            self.stale = False
+
+    def append(self, rows: list):
+        """Thêm các loan vừa ghi (dict theo cột bảng loans); id thiếu -> -1"""
+        with self._lock:
+            if not self.loaded or not rows:
+                return
+            ids = np.array([r.get("id") or -1 for r in rows], dtype=np.int64)
+            columns = engine.columns_from_rows(
+                SOURCE_COLUMNS, [tuple(r.get(c) for c in SOURCE_COLUMNS) for r in rows]
+            )
+            self._append_columns(ids, columns)
+
+    def remove(self, loan_id: int):
+        with self._lock:
+            if not self.loaded:
+                return
+            positions = np.flatnonzero(self.ids[:self.size] == loan_id)
+            if len(positions) == 0:
+                # Loan được thêm mà snapshot không biết id (bulk insert) -> load lại
+                self.stale = True
+                return
+            _set_bits(self.alive, positions, on=False)
+            for m in engine.MEASURES:
+                self.null_counts[m] -= int(np.isnan(self.measures[m][positions]).sum())
+                self.measures[m][positions] = np.nan
+            self.ids[positions] = 0
+            self.deleted += len(positions)
+
+    # --- query -----------------------------------------------------------------
+
+    def _filter_bitmap(self, dimension, value):
+        code = self.dictionaries[dimension].lookup(value)
+        if code is None:
+            return np.zeros_like(self.alive)
+        return self.bitmaps[dimension][code]
+
+    def _selection(self, month=None, year=None):
+        """None = tất cả dòng, ngược lại mảng vị trí các dòng thỏa filter"""
+        bitmap = self.alive if self.deleted else None
+        for dimension, value in (("Month", month), ("Year", year)):
+            if value:
+                b = self._filter_bitmap(dimension, value)
+                bitmap = b if bitmap is None else bitmap & b
+        if bitmap is None:
+            return None
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.size))
+
+    def _partial(self, rows, dimensions, measures, cache):
+        def take(array):
+            return array[:self.size] if rows is None else array[rows]
+
+        codes = None
+        cardinalities = [max(len(self.dictionaries[d].values), 1) for d in dimensions]
+        for d, card in zip(dimensions, cardinalities):
+            c = take(self.codes[d]).astype(np.int64)
+            codes = c if codes is None else codes * card + c
+        if codes is None:
+            codes = np.zeros(self.size if rows is None else len(rows), dtype=np.int64)
+        if len(codes) == 0:
+            return {}
+
+        k = int(np.prod(cardinalities)) if dimensions else 1
+        # Nhóm theo thứ tự mã (= thứ tự xuất hiện đầu tiên của từng giá trị trong
+        # bảng); section không ORDER BY vốn không có thứ tự cố định
+        counts = np.bincount(codes, minlength=k)
+        present = np.flatnonzero(counts)
+
+        stats = np.zeros((len(present), engine.STATS_SIZE))
+        stats[:, 0] = counts[present]
+        for i, m in enumerate(engine.MEASURES):
+            if m not in measures:
+                continue
+            if m not in cache:
+                values = take(self.measures[m]).astype(np.float64)
+                valid = ~np.isnan(values)
+                cache[m] = (np.where(valid, values, 0.0), None if self.null_counts[m] == 0 else valid)
+            weights, valid = cache[m]
+            stats[:, 1 + 2 * i] = np.bincount(codes, weights=weights, minlength=k)[present]
+            stats[:, 2 + 2 * i] = (counts if valid is None else np.bincount(codes, weights=valid, minlength=k))[present]
+
+        keys = []
+        for code in present:
+            key = []
+            for d, card in zip(reversed(dimensions), reversed(cardinalities)):
+                code, idx = divmod(int(code), card)
+                key.append(self.dictionaries[d].values[idx])
+            keys.append(tuple(reversed(key)))
+        return {key: stats[j] for j, key in enumerate(keys)}
+
+    def compute_partials(self, month=None, year=None):
+        with self._lock:
+            rows = self._selection(month, year)
+            cache = {}
+            partials = {"kpi": self._partial(rows, [], engine.KPI_MEASURES, cache)}
+            for section in engine.SECTIONS:
+                dimensions = [d for _, d in section[2]]
+                partials[section[1]] = self._partial(rows, dimensions, engine.section_measures(section), cache)
+            return partials
+
+    def ensure_loaded(self, db):
+        expired = (
+            ANALYTICS_SNAPSHOT_MAX_AGE > 0 and self.loaded
+            and time.time() - self.loaded_at > ANALYTICS_SNAPSHOT_MAX_AGE
+        )
+        if not self.loaded or self.stale or expired:
+            with self._lock:
+                if not self.loaded or self.stale or expired:
+                    self.load(db)
+
+    def get_dashboard_data(self, db, month=None, year=None):
+        self.ensure_loaded(db)
+        return engine.build_dashboard(self.compute_partials(month, year))
+
+    def memory_bytes(self) -> int:
+        total = self.ids.nbytes + self.alive.nbytes
+        total += sum(a.nbytes for a in self.codes.values())
+        total += sum(a.nbytes for a in self.measures.values())
+        total += sum(b.nbytes for bitmaps in self.bitmaps.values() for b in bitmaps)
+        return total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "stale": self.stale,
+                "rows": self.size - self.deleted,
+                "deleted": self.deleted,
+                "capacity": self.capacity,
+                "memory_bytes": self.memory_bytes(),
+                "load_seconds": self.load_seconds,
+                "cardinality": {d: len(self.dictionaries[d].values) for d in DIMENSIONS},
+            }
+
+
+snapshot = LoanSnapshot()
@@ -0,0 +1,101 @@
+"""
+So sánh các backend suy luận (MODEL_FORMAT) với model gốc (Pipeline trong pickle):
+- tương đương số học trên toàn bộ dump: max |diff| xác suất, số nhãn lệch,
+  số xác suất lệch sau khi làm tròn 4 chữ số (như response của API)
+- latency p50/p99 khi chấm 1 dòng và throughput khi chấm cả dump theo batch
+
+Cần export trước (backend thiếu artifact thì bỏ qua):
+
+    cd backend && python model_registry.py export-native
+    cd backend && python model_registry.py export-onnx
+    cd backend && python -m benchmarks.bench_backends
+
+Thoát với mã 1 nếu có backend lệch quá --tol so với model gốc.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+import model_loader
+import model_registry
+from benchmarks.sample_data import load_dump_rows, loan_features
+
+BACKENDS = ("pickle", "native", "onnx")
+
+
+def load_backend(fmt):
+    if not all(os.path.exists(p) for p in model_registry.artifact_paths(fmt)):
+        return None
+    return model_registry.load_version(model_registry.BASE_VERSION, fmt)
+
+
+def score(loaded, records):
+    """Xác suất class 1 theo đúng đường model_loader dùng khi serve"""
+    if loaded.encoder is not None:
+        return loaded.booster.inplace_predict(loaded.encoder.encode_batch(records))
+    return loaded.model.predict_proba(model_loader._build_frame(records))[:, 1]
+
+
+def latency(loaded, records, repeat):
+    timings = []
+    for i in range(repeat):
+        record = records[i % len(records)]
+        start = time.perf_counter()
+        score(loaded, [record])
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1e6
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def throughput(loaded, records, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(records), batch_size):
+        score(loaded, records[i:i + batch_size])
+    return len(records) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--tol", type=float, default=1e-5, help="max |diff| xác suất cho phép")
+    args = parser.parse_args()
+
+    records = [loan_features(r) for r in load_dump_rows()]
+    pipeline = model_registry.load_pickle_model()
+    expected = pipeline.predict_proba(model_loader._build_frame(records))[:, 1]
+    print(f"rows: {len(records)}  batch size: {args.batch_size}")
+
+    failed = False
+    for fmt in BACKENDS:
+        loaded = load_backend(fmt)
+        if loaded is None:
+            print(f"{fmt:>7}: skipped (artifact not exported)")
+            continue
+
+        actual = np.concatenate([
+            score(loaded, records[i:i + args.batch_size])
+            for i in range(0, len(records), args.batch_size)
+        ])
+        max_diff = float(np.abs(expected - actual).max())
+        label_diff = int(((expected > 0.5) != (actual > 0.5)).sum())
+        rounded_diff = int((np.round(expected, 4) != np.round(actual, 4)).sum())
+        ok = max_diff <= args.tol and label_diff == 0
+        failed |= not ok
+
+        score(loaded, records[:1])
+        p50, p99 = latency(loaded, records, args.repeat)
+        rows_per_sec = throughput(loaded, records, args.batch_size)
+        print(f"{fmt:>7}: max abs diff {max_diff:.3g} | label diff {label_diff} | "
+              f"rounded diff {rounded_diff} | {'OK' if ok else 'FAIL'}")
+        print(f"{'':>7}  single-row p50 {p50:8.1f} us | p99 {p99:8.1f} us | "
+              f"batch {rows_per_sec:10.0f} rows/s")
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
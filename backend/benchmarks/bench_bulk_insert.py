@@ -0,0 +1,52 @@
+"""
+So sánh nhập N hồ sơ bằng crud.create_loan từng dòng với crud.bulk_create_loans
+(executemany theo chunk), trên SQLite.
+
+    cd backend && python -m benchmarks.bench_bulk_insert --rows 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import migrations
+import schemas
+from benchmarks.sample_data import create_sqlite_db, load_dump_rows, loan_features
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=crud.BULK_CHUNK_SIZE)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_bulk_insert.db"))
+    args = parser.parse_args()
+
+    dump = load_dump_rows()
+    rows = []
+    for i in range(args.rows):
+        source = dump[i % len(dump)]
+        rows.append(dict(loan_features(source), prediction=source["prediction"], probability=source["probability"]))
+
+    engine = create_sqlite_db(args.db, 0)
+    migrations.upgrade(engine)
+    db = sessionmaker(bind=engine)()
+
+    start = time.perf_counter()
+    for row in rows:
+        crud.create_loan(db, schemas.LoanCreate(**row))
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    report = crud.bulk_create_loans(db, rows, chunk_size=args.chunk_size)
+    bulk = time.perf_counter() - start
+
+    print(f"create_loan x{args.rows}: {single:8.2f} s | {args.rows / single:10.1f} rows/s")
+    print(f"bulk (chunk {args.chunk_size}): {bulk:8.2f} s | {report['inserted'] / bulk:10.1f} rows/s"
+          f" | failed {report['failed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Chi phí của drift_monitor trên đường /loans/predict: thời gian observe mỗi hồ
+sơ (1 hồ sơ / lần gọi như request đơn, và cả batch), kích thước sketch sau N
+hồ sơ (không đổi theo N) và thời gian tính báo cáo PSI / KS.
+
+    cd backend && python -m benchmarks.bench_drift --records 100000
+"""
+import argparse
+import json
+import time
+
+import drift_monitor
+from benchmarks.sample_data import load_dump_rows
+from benchmarks.synthetic import sample_requests
+from model_loader import features_from_loan
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    # Baseline từ dump (như baseline_from_loans nhưng không cần DB)
+    rows = load_dump_rows()
+    edges = {}
+    for column in drift_monitor.NUMERIC_FEATURES + [drift_monitor.PROBABILITY]:
+        edges[column] = drift_monitor.quantile_edges([float(r[column]) for r in rows])
+    baseline = drift_monitor.DriftSketches.with_edges(edges)
+    for row in rows:
+        baseline.observe(features_from_loan(row), row["probability"])
+
+    monitor = drift_monitor.DriftMonitor(state_path="/dev/null", persist_interval=0)
+    monitor.set_baseline(baseline, "dump")
+
+    records = [{k: v for k, v in r.items() if k not in ("prediction", "probability")}
+               for r in sample_requests(min(args.records, 5000), seed=3)]
+    results = [{"probability": 0.5}] * len(records)
+    n = args.records
+
+    for label, batch in (("single", 1), ("batch", args.batch_size)):
+        start = time.perf_counter()
+        done = 0
+        while done < n:
+            i = done % len(records)
+            chunk = records[i:i + batch]
+            monitor.observe(chunk, results[:len(chunk)])
+            done += len(chunk)
+        elapsed = time.perf_counter() - start
+        size = len(json.dumps(monitor.live.to_dict()))
+        print(f"{label:>6}: {elapsed / done * 1e6:6.2f} us/record | live n={monitor.live.n} | sketch {size} bytes")
+
+    start = time.perf_counter()
+    report = monitor.report()
+    print(f"report: {(time.perf_counter() - start) * 1000:.2f} ms | top {report['top']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Chi phí của explain=true (TreeSHAP qua booster.predict(pred_contribs=True))
+so với chấm điểm thường, không qua cache:
+- kiểm tra xác suất suy từ tổng đóng góp khớp fast path trên toàn bộ dump
+- latency p50/p99 khi chấm 1 dòng, và thời gian / dòng theo kích thước batch
+
+    cd backend && python -m benchmarks.bench_explain
+"""
+import argparse
+import time
+
+import numpy as np
+
+import model_loader
+from benchmarks.sample_data import load_dump_rows, loan_features
+
+
+def latency(fn, loaded, records, repeat):
+    timings = []
+    for i in range(repeat):
+        record = records[i % len(records)]
+        start = time.perf_counter()
+        fn([record], loaded)
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1e6
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def per_row_us(fn, loaded, records, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(records), batch_size):
+        fn(records[i:i + batch_size], loaded)
+    return (time.perf_counter() - start) / len(records) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--batch-sizes", default="1,16,64,512")
+    args = parser.parse_args()
+
+    records = [loan_features(r) for r in load_dump_rows()]
+    loaded = model_loader.get_loaded_model()
+    if not model_loader.explanations_supported(loaded):
+        raise SystemExit(f"Explanations are not supported for MODEL_FORMAT={loaded.format}")
+
+    scored = model_loader._score_fast(records, loaded)
+    explained = model_loader._explain(records, loaded)
+    max_diff = max(abs(a["probability"] - b["probability"]) for a, b in zip(scored, explained))
+    label_diff = sum(a["prediction"] != b["prediction"] for a, b in zip(scored, explained))
+    print(f"rows: {len(records)}  max rounded prob diff: {max_diff:.4f}  label diff: {label_diff}")
+
+    for name, fn in (("predict", model_loader._score_fast), ("explain", model_loader._explain)):
+        fn(records[:1], loaded)
+        p50, p99 = latency(fn, loaded, records, args.repeat)
+        print(f"{name:>8}: single-row p50 {p50:8.1f} us | p99 {p99:8.1f} us")
+
+    print("\nbatch size | predict us/row | explain us/row | added us/row")
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        base = per_row_us(model_loader._score_fast, loaded, records, batch_size)
+        explain = per_row_us(model_loader._explain, loaded, records, batch_size)
+        print(f"{batch_size:>10} | {base:14.1f} | {explain:14.1f} | {explain - base:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
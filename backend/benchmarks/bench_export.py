@@ -0,0 +1,82 @@
+"""
+Đo peak RSS khi xuất toàn bộ bảng loans trên SQLite nhiều triệu dòng:
+loan_export (stream theo chunk) so với crud.get_loans (.all()).
+Mỗi chế độ chạy trong process riêng để ru_maxrss không lẫn nhau.
+
+    cd backend && python -m benchmarks.bench_export --rows 2000000 --formats csv,ndjson,parquet
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def peak_rss_mb() -> float:
+    # Linux: ru_maxrss tính bằng KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode: str):
+    import crud
+    import loan_export
+    import models
+    from database import SessionLocal
+
+    base = peak_rss_mb()
+    start = time.perf_counter()
+    size = 0
+    if mode == "all":
+        db = SessionLocal()
+        size = len(crud.get_loans(db))
+        db.close()
+    else:
+        for part in loan_export.export_stream(mode, lambda db: db.query(models.Loan)):
+            size += len(part)
+    print(json.dumps({
+        "mode": mode,
+        "seconds": time.perf_counter() - start,
+        "size": size,
+        "base_rss_mb": base,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--formats", default="csv,ndjson,parquet")
+    parser.add_argument("--with-all", action="store_true", help="đo thêm crud.get_loans (.all())")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_export.db"))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child)
+
+    from benchmarks.sample_data import create_sqlite_db
+
+    print(f"building {args.rows} rows in {args.db} ...")
+    create_sqlite_db(args.db, args.rows)
+
+    modes = args.formats.split(",") + (["all"] if args.with_all else [])
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{args.db}")
+    for mode in modes:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_export", "--child", mode],
+            env=env, capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            # .all() trên bảng lớn có thể bị OOM killer dừng (returncode -9)
+            print(f"{mode:>8}: failed (returncode {out.returncode})")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{mode:>8}: {r['seconds']:7.1f} s | {r['size']:>12} {'rows' if mode == 'all' else 'bytes'} | "
+              f"RSS {r['base_rss_mb']:7.1f} -> {r['peak_rss_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
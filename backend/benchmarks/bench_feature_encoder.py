@@ -0,0 +1,65 @@
+"""
+So sánh đường pandas (DataFrame + ColumnTransformer) với fast path
+(FeatureEncoder -> booster.inplace_predict):
+- kiểm tra xác suất giống hệt nhau (bit-identical) trên toàn bộ dump
+- latency p50/p99 khi chấm 1 dòng
+
+    cd backend && python -m benchmarks.bench_feature_encoder
+"""
+import argparse
+import time
+
+import numpy as np
+
+import model_loader
+from benchmarks.sample_data import load_dump_rows, loan_features
+
+
+def pandas_proba(records):
+    X = model_loader._build_frame(records)
+    return model_loader.get_model().predict_proba(X)[:, 1]
+
+
+def fast_proba(records):
+    loaded = model_loader.get_loaded_model()
+    return loaded.booster.inplace_predict(loaded.encoder.encode_batch(records))
+
+
+def latency(fn, records, repeat):
+    timings = []
+    for i in range(repeat):
+        record = records[i % len(records)]
+        start = time.perf_counter()
+        fn([record])
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1e6
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    records = [loan_features(r) for r in load_dump_rows()]
+    if model_loader.get_loaded_model().encoder is None:
+        raise SystemExit("Model has no FeatureEncoder (unsupported pipeline)")
+
+    expected = pandas_proba(records)
+    actual = fast_proba(records)
+    print(f"rows: {len(records)}  bit-identical: {np.array_equal(expected, actual)}"
+          f"  max abs diff: {np.abs(expected - actual).max():.3g}")
+
+    single_ok = all(
+        np.array_equal(pandas_proba([r]), fast_proba([r])) for r in records[:500]
+    )
+    print(f"single-row bit-identical (first 500): {single_ok}")
+
+    for name, fn in (("pandas", pandas_proba), ("fast path", fast_proba)):
+        fn(records[:1])
+        p50, p99 = latency(fn, records, args.repeat)
+        print(f"{name:>10}: p50 {p50:9.1f} us | p99 {p99:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+GROUP BY age_group / loan_amount_group của dashboard: biểu thức CASE tính trên
+từng dòng (age là chuỗi -> phải ép kiểu) so với cột age_group /
+loan_amount_group lưu sẵn có index (migration 4). In query plan (EXPLAIN) và
+thời gian median của từng câu, cùng toàn bộ dashboard DASHBOARD_SOURCE=query / scan.
+
+    cd backend && python -m benchmarks.synthetic --rows 1000000 --db /tmp/loans_1m.db
+    cd backend && python -m benchmarks.bench_group_columns --db /tmp/loans_1m.db
+
+Với MySQL: --database-url mysql+pymysql://...
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+import analytics_query
+import dashboard_engine
+import database
+import migrations
+
+# Biểu thức của dashboard trước migration 4 ("age + 0" để so sánh số với cột chuỗi)
+CASE_SQL = {
+    "age_group": (
+        "CASE WHEN age + 0 < 25 THEN '<25' "
+        "WHEN age + 0 BETWEEN 25 AND 34 THEN '25-34' "
+        "WHEN age + 0 BETWEEN 35 AND 44 THEN '35-44' "
+        "WHEN age + 0 BETWEEN 45 AND 54 THEN '45-54' "
+        "WHEN age + 0 BETWEEN 55 AND 64 THEN '55-64' "
+        "WHEN age + 0 BETWEEN 65 AND 74 THEN '65-74' "
+        "ELSE '>74' END"
+    ),
+    "loan_amount_group": (
+        "CASE WHEN loan_amount < 300000 THEN '<300k' "
+        "WHEN loan_amount >= 300000 AND loan_amount < 900000 THEN '300k-900k' "
+        "WHEN loan_amount >= 900000 AND loan_amount <= 2000000 THEN '900k-2M' "
+        "ELSE '>2M' END"
+    ),
+}
+FILTERS = [("all", "1=1", {}), ("month", "Month = :month", {"month": "October"})]
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def group_sql(expr: str, section: str, where: str) -> str:
+    """Câu aggregate của section dashboard như analytics_query.compile_query"""
+    columns = [f"{expr} AS g0", "COUNT(*) AS n"]
+    for m in dashboard_engine.section_measures(analytics_query.PRESETS[section]):
+        columns += [f"SUM({m}) AS sum_{m}", f"COUNT({m}) AS cnt_{m}"]
+    return f"SELECT {', '.join(columns)} FROM loans WHERE {where} GROUP BY g0"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=None, help="file SQLite")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{args.db}"
+    engine = create_engine(url, **database.engine_options(url))
+    columns = {c["name"]: c["type"] for c in inspect(engine).get_columns("loans")}
+    persisted = "age_group" in columns
+    print(f"{url} | age {columns['age']} | term {columns['term']} | persisted groups: {persisted}")
+
+    with engine.connect() as conn:
+        for dimension, section in (("age_group", "age_group"), ("loan_amount_group", "loan_amount_group")):
+            variants = [("CASE", CASE_SQL[dimension])] + ([("column", dimension)] if persisted else [])
+            for label, where, params in FILTERS:
+                for name, expr in variants:
+                    sql = group_sql(expr, section, where)
+                    plan, used = migrations.explain(engine, sql, params)
+                    ms = median_ms(lambda: conn.execute(text(sql), params).fetchall(), args.repeat)
+                    print(f"\n== {dimension} ({label}, {name}): {ms:.1f} ms | index={used}\n{plan}")
+
+    db = sessionmaker(bind=engine)()
+    try:
+        for label, month in (("all", None), ("month", "October")):
+            query_ms = median_ms(lambda: analytics_query.get_dashboard_data(db, month), args.repeat)
+            scan_ms = median_ms(lambda: dashboard_engine.get_dashboard_data(db, month), args.repeat)
+            print(f"\ndashboard ({label}): query {query_ms:.1f} ms | scan {scan_ms:.1f} ms")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark cold start của model: mỗi lần chạy là 1 process Python mới,
+đo thời gian từ lúc khởi động tới khi model load xong và chấm được 1 dòng.
+
+    cd backend && python model_registry.py export-native
+    cd backend && python -m benchmarks.bench_model_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+t0 = time.perf_counter()
+from model_registry import ModelRegistry
+registry = ModelRegistry({fmt!r})
+registry.warmup()
+print(json.dumps({{"load": registry.load_seconds, "ready": time.perf_counter() - t0}}))
+"""
+
+
+def cold_start(fmt):
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(fmt=fmt)],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    total = time.perf_counter() - start
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process"] = total
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--formats", default="pickle,native")
+    args = parser.parse_args()
+
+    for fmt in args.formats.split(","):
+        runs = [cold_start(fmt) for _ in range(args.runs)]
+        print(
+            f"{fmt:>8}: load {statistics.median(r['load'] for r in runs) * 1000:8.1f} ms"
+            f" | import+load+warmup {statistics.median(r['ready'] for r in runs) * 1000:8.1f} ms"
+            f" | whole process {statistics.median(r['process'] for r in runs) * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+So sánh latency của /loans/page giữa OFFSET/LIMIT và keyset (after_id)
+ở trang đầu và trang sâu, trên SQLite.
+
+    cd backend && python -m benchmarks.bench_pagination --size 100 --deep-page 10000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from fastapi import Response
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.sample_data import create_sqlite_db
+from routers.loans import read_loans_page
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("--deep-page", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_pagination.db"))
+    args = parser.parse_args()
+
+    n_rows = args.size * args.deep_page
+    print(f"building {n_rows} rows in {args.db} ...")
+    engine = create_sqlite_db(args.db, n_rows)
+    db = sessionmaker(bind=engine)()
+
+    def page_args(**kwargs):
+        params = dict(page=1, size=args.size, id=None, year=None, month=None, sort_id="asc",
+                      after_id=None, before_id=None, cursor=None, db=db)
+        params.update(kwargs)
+        return params
+
+    for page in (1, args.deep_page):
+        offset = (page - 1) * args.size
+        # id cuối của trang trước, client có sẵn từ X-Next-Cursor
+        after_id = db.execute(
+            text("SELECT id FROM loans ORDER BY id LIMIT 1 OFFSET :o"), {"o": offset - 1}
+        ).scalar() if offset else 0
+
+        offset_ms = timed(lambda: read_loans_page(Response(), **page_args(page=page)), args.repeat)
+        keyset_ms = timed(lambda: read_loans_page(Response(), **page_args(after_id=after_id)), args.repeat)
+        print(f"page {page:>6}: offset {offset_ms:8.2f} ms | keyset {keyset_ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark throughput (rows/sec) của model_loader.predict_batch theo batch size,
+so với gọi model_loader.predict từng dòng.
+
+    cd backend && python -m benchmarks.bench_predict_batch --rows 5000
+"""
+import argparse
+import time
+
+import model_loader
+from benchmarks.sample_data import load_dump_rows, loan_features
+
+
+def run(records, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(records), batch_size):
+        model_loader.predict_batch(records[i:i + batch_size])
+    return len(records) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch-sizes", default="1,10,100,1000,5000")
+    parser.add_argument("--single-rows", type=int, default=300,
+                        help="số dòng chạy qua predict() từng dòng để so sánh")
+    args = parser.parse_args()
+
+    records = [loan_features(r) for r in load_dump_rows()]
+    while len(records) < args.rows:
+        records = records + records
+    records = records[:args.rows]
+
+    # Tắt cache để đo đúng chi phí chấm điểm
+    model_loader.prediction_cache.max_entries = 0
+    model_loader.predict_batch(records[:10])  # warmup
+
+    single = records[:args.single_rows]
+    start = time.perf_counter()
+    for r in single:
+        model_loader.predict(r)
+    print(f"{'predict() per row':>20}: {len(single) / (time.perf_counter() - start):12.1f} rows/sec")
+
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        rows_per_sec = run(records, batch_size)
+        print(f"{'batch_size=' + str(batch_size):>20}: {rows_per_sec:12.1f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+So sánh dashboard trên analytics_snapshot (cột trong RAM) với đường SQL
+(dashboard_engine: 1 lần SELECT + NumPy) và bảng loan_rollups, trên SQLite.
+Đo thời gian load, bộ nhớ snapshot và latency query (không filter / theo tháng).
+
+    cd backend && python -m benchmarks.bench_snapshot --rows 1000000
+    cd backend && python -m benchmarks.bench_snapshot --rows 10000000 --skip-sql
+"""
+import argparse
+import os
+import resource
+import statistics
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+import dashboard_engine
+import rollups
+from analytics_snapshot import LoanSnapshot
+from benchmarks.sample_data import create_sqlite_db
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def run(n_rows, args):
+    path = os.path.join(tempfile.gettempdir(), f"bench_snapshot_{n_rows}.db")
+    if not (args.reuse and os.path.exists(path)):
+        print(f"building {n_rows} rows in {path} ...")
+        create_sqlite_db(path, n_rows).dispose()
+    from sqlalchemy import create_engine
+    engine = create_engine(f"sqlite:///{path}")
+    db = sessionmaker(bind=engine)()
+
+    import models
+    models.LoanRollup.__table__.create(engine, checkfirst=True)
+    rollups.rebuild(db)
+    db.commit()
+
+    snapshot = LoanSnapshot()
+    before = rss_mb()
+    start = time.perf_counter()
+    snapshot.load(db)
+    load_s = time.perf_counter() - start
+    print(f"[{n_rows} rows] snapshot load {load_s:.1f} s | arrays {snapshot.memory_bytes() / 2 ** 20:.1f} MB"
+          f" | RSS +{rss_mb() - before:.1f} MB | peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    for label, month in (("all", None), ("month", "October")):
+        # Đường SQL đưa mọi dòng vào list Python, ở 10M dòng cần vài GB RAM -> --skip-sql
+        sql_ms = float("nan") if args.skip_sql else timed(
+            lambda: dashboard_engine.get_dashboard_data(db, month), args.sql_repeat
+        )
+        rollup_ms = timed(lambda: rollups.get_dashboard_data(db, month), args.repeat)
+        snap_ms = timed(lambda: snapshot.get_dashboard_data(db, month), args.repeat)
+        print(f"  {label:>5}: sql {sql_ms:9.1f} ms | rollup {rollup_ms:7.1f} ms | snapshot {snap_ms:7.1f} ms")
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sql-repeat", type=int, default=1)
+    parser.add_argument("--skip-sql", action="store_true")
+    parser.add_argument("--reuse", action="store_true", help="dùng lại file SQLite đã tạo")
+    args = parser.parse_args()
+    for n_rows in args.rows:
+        run(n_rows, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Throughput nhập loan qua đường POST /loans/ với 1, 10, 100 client đồng thời:
+- sync: mỗi request crud.create_loan (commit + refresh riêng)
+- write-behind: request chỉ xếp hàng (write_behind.WriteBehindQueue), worker
+  group commit; đo cả tốc độ nhận (accepted/s) và tốc độ ghi xong (persisted/s,
+  tính đến khi ticket cuối cùng được commit)
+
+Mỗi client là 1 thread, không qua HTTP để chỉ đo phần ghi.
+
+    cd backend && python -m benchmarks.bench_write_behind --requests 2000
+
+Với MySQL: --database-url mysql+pymysql://... (ghi thật vào bảng loans).
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import database
+import migrations
+import schemas
+import write_behind
+from benchmarks.sample_data import create_sqlite_db, load_dump_rows, loan_features
+
+
+def make_loans(n):
+    dump = load_dump_rows()
+    loans = []
+    for i in range(n):
+        source = dump[i % len(dump)]
+        loans.append(schemas.LoanCreate(**dict(
+            loan_features(source), prediction=source["prediction"], probability=source["probability"]
+        )))
+    return loans
+
+
+def run_clients(clients, loans, handle):
+    """clients thread cùng lấy loan từ 1 iterator chung, trả về (giây, số lỗi)"""
+    work = iter(loans)
+    errors = [0]
+
+    def client():
+        for loan in work:
+            try:
+                handle(loan)
+            except Exception:
+                errors[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        for future in [pool.submit(client) for _ in range(clients)]:
+            future.result()
+    return time.perf_counter() - start, errors[0]
+
+
+def bench_sync(Session, clients, loans):
+    def handle(loan):
+        db = Session()
+        try:
+            crud.create_loan(db, loan)
+        finally:
+            db.close()
+
+    elapsed, errors = run_clients(clients, loans, handle)
+    return {"accepted_per_sec": (len(loans) - errors) / elapsed,
+            "persisted_per_sec": (len(loans) - errors) / elapsed, "errors": errors}
+
+
+def bench_write_behind(Session, clients, loans, spool, batch_size, max_wait_ms):
+    queue = write_behind.WriteBehindQueue(spool, max_queue=len(loans), batch_size=batch_size,
+                                          max_wait_ms=max_wait_ms, session_factory=Session)
+    queue.start()
+    tickets = []
+    try:
+        start = time.perf_counter()
+        accepted, errors = run_clients(clients, loans, lambda loan: tickets.append(queue.submit(loan)))
+        for ticket in tickets:
+            ticket.done.wait()
+        persisted = time.perf_counter() - start
+    finally:
+        queue.stop()
+
+    ok = sum(t.status == "persisted" for t in tickets)
+    return {"accepted_per_sec": len(tickets) / accepted, "persisted_per_sec": ok / persisted,
+            "errors": errors + len(tickets) - ok, "commits": queue.commits}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000, help="số loan mỗi lần chạy")
+    parser.add_argument("--clients", default="1,10,100")
+    parser.add_argument("--batch-size", type=int, default=write_behind.WRITE_BEHIND_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=write_behind.WRITE_BEHIND_MAX_WAIT_MS)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_write_behind.db"))
+    args = parser.parse_args()
+
+    url = args.database_url
+    if url is None:
+        create_sqlite_db(args.db, 0)
+        url = f"sqlite:///{args.db}"
+    engine = create_engine(url, **database.engine_options(url))
+    migrations.upgrade(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    spool = os.path.join(tempfile.gettempdir(), "bench_write_behind.jsonl")
+
+    loans = make_loans(args.requests)
+    print(f"{args.requests} loans/run | group size <= {args.batch_size} | window {args.max_wait_ms} ms")
+    print("clients | mode         | accepted/s | persisted/s | errors | commits")
+    for clients in (int(c) for c in args.clients.split(",")):
+        sync = bench_sync(Session, clients, loans)
+        wb = bench_write_behind(Session, clients, loans, spool, args.batch_size, args.max_wait_ms)
+        print(f"{clients:>7} | sync         | {sync['accepted_per_sec']:10.0f} | "
+              f"{sync['persisted_per_sec']:11.0f} | {sync['errors']:6d} | {args.requests - sync['errors']:7d}")
+        print(f"{clients:>7} | write-behind | {wb['accepted_per_sec']:10.0f} | "
+              f"{wb['persisted_per_sec']:11.0f} | {wb['errors']:6d} | {wb['commits']:7d}")
+
+
+if __name__ == "__main__":
+    main()
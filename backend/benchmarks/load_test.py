@@ -0,0 +1,98 @@
+"""
+Load test /dashboard, /loans/page, /loans/count với DB_ASYNC=0 và DB_ASYNC=1
+trên cùng một file SQLite (mỗi chế độ chạy trong process riêng vì database.py
+đọc biến môi trường lúc import).
+
+    cd backend && python -m benchmarks.load_test --rows 200000 --concurrency 50 --requests 2000
+
+Với MySQL: đặt DATABASE_URL=mysql+pymysql://... và bỏ --rows (dùng dữ liệu có sẵn).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ENDPOINTS = [
+    "/dashboard?month=October",
+    "/loans/page?size=100&sort_id=asc",
+    "/loans/count",
+]
+
+
+async def run_load(endpoints, concurrency: int, total: int):
+    import httpx
+
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    latencies, errors = [], 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        counter = iter(range(total))
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                start = time.perf_counter()
+                r = await client.get(endpoints[i % len(endpoints)])
+                latencies.append(time.perf_counter() - start)
+                if r.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "async": os.getenv("DB_ASYNC") == "1",
+        "requests": total,
+        "errors": errors,
+        "requests_per_sec": total / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def child(args):
+    result = asyncio.run(run_load(ENDPOINTS, args.concurrency, args.requests))
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "load_test.db"))
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args)
+
+    env = dict(os.environ, MODEL_WARMUP="0", DASHBOARD_CACHE_SIZE="0")
+    if "DATABASE_URL" not in os.environ:
+        from benchmarks.sample_data import create_sqlite_db
+
+        print(f"building {args.rows} rows in {args.db} ...")
+        create_sqlite_db(args.db, args.rows)
+        env["DATABASE_URL"] = f"sqlite:///{args.db}"
+
+    for mode in ("0", "1"):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.load_test", "--child",
+             "--concurrency", str(args.concurrency), "--requests", str(args.requests)],
+            env=dict(env, DB_ASYNC=mode), capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"DB_ASYNC={mode}: {result['requests_per_sec']:8.1f} req/s | "
+              f"p50 {result['p50_ms']:7.2f} ms | p99 {result['p99_ms']:7.2f} ms | "
+              f"errors {result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Đọc dữ liệu mẫu từ file dump MySQL (database/loan_prediction_loans.sql)
+để chạy benchmark mà không cần MySQL.
+"""
+import ast
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUMP_PATH = os.path.join(BASE_DIR, "database", "loan_prediction_loans.sql")
+
+INSERT_PREFIX = "INSERT INTO `loans` VALUES "
+
+
+def dump_columns(path: str = DUMP_PATH) -> list:
+    """Lấy danh sách cột theo đúng thứ tự trong CREATE TABLE của dump"""
+    columns = []
+    in_table = False
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("CREATE TABLE `loans`"):
+                in_table = True
+                continue
+            if in_table:
+                line = line.strip()
+                if not line.startswith("`"):
+                    break
+                columns.append(line.split("`")[1])
+    return columns
+
+
+def load_dump_rows(path: str = DUMP_PATH) -> list:
+    """Trả về list[dict] các dòng loans trong dump"""
+    columns = dump_columns(path)
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.startswith(INSERT_PREFIX):
+                continue
+            values = line[len(INSERT_PREFIX):].rstrip().rstrip(";").replace("NULL", "None")
+            for row in ast.literal_eval("[" + values + "]"):
+                rows.append(dict(zip(columns, row)))
+    return rows
+
+
+def loan_features(row: dict) -> dict:
+    """Chuyển 1 dòng trong bảng loans về dạng input của /loans/predict (schemas.LoanBase)"""
+    features = {
+        k: v for k, v in row.items()
+        if k not in ("id", "Month", "Year", "prediction", "probability")
+    }
+    features["loan_limit"] = "cf" if features.get("loan_limit") else "ncf"
+    for k in ("age", "term"):
+        if features.get(k) is not None:
+            features[k] = float(features[k])
+    return features
+
+
+def create_sqlite_db(path: str, n_rows: int, rows: list = None, chunk_size: int = 20000):
+    """
+    Tạo file SQLite có bảng loans (schema từ models.py) với n_rows dòng,
+    lặp lại các dòng của dump và đánh id liên tục từ 1 (age_group /
+    loan_amount_group điền bằng migrations.backfill_loan_groups).
+    """
+    from sqlalchemy import create_engine
+
+    import migrations
+    import models
+    from database import Base
+
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+
+    rows = rows or load_dump_rows()
+    table = models.Loan.__table__
+    with engine.begin() as conn:
+        for start in range(0, n_rows, chunk_size):
+            chunk = []
+            for i in range(start, min(start + chunk_size, n_rows)):
+                row = dict(rows[i % len(rows)])
+                row["id"] = i + 1
+                chunk.append(row)
+            conn.execute(table.insert(), chunk)
+        migrations.backfill_loan_groups(conn)
+    return engine
@@ -0,0 +1,233 @@
+"""
+Benchmark end-to-end qua FastAPI app (httpx.ASGITransport, có chạy lifespan):
+sinh dữ liệu giả lập (benchmarks/synthetic.py) vào SQLite rồi bắn các kịch bản
+/dashboard, /loans/page, /loans/count, /loans/predict, POST /loans/ với từng mức
+concurrency. Mỗi (kịch bản, concurrency) chạy trong process riêng để peak RSS
+không lẫn nhau. Kết quả ghi ra JSON để so sánh giữa các lần chạy.
+
+    cd backend && python -m benchmarks.suite --rows 100000 --concurrency 1,10,50 --out run.json
+    cd backend && python -m benchmarks.suite --rows 100000 --out new.json --compare run.json
+
+Với MySQL: --database-url mysql+pymysql://... --rows 0 (dùng dữ liệu có sẵn;
+POST /loans/ ghi thật vào bảng). --env KEY=VALUE để đổi cấu hình app
+(VD --env DASHBOARD_SOURCE=snapshot --env WRITE_BEHIND=1; cache dashboard
+mặc định tắt, bật bằng --env DASHBOARD_CACHE_SIZE=64).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+SCENARIOS = ["dashboard", "loans_page", "loans_count", "predict", "create_loan"]
+MONTHS = [None, "September", "October", "November"]
+
+
+def peak_rss_mb() -> float:
+    # Linux: ru_maxrss tính bằng KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))]
+
+
+def make_request(scenario: str, i: int, bodies: list, max_page: int):
+    """(method, url, json body) của request thứ i trong kịch bản"""
+    rnd = random.Random(i)
+    if scenario == "dashboard":
+        month = MONTHS[i % len(MONTHS)]
+        return "GET", "/dashboard" + (f"?month={month}" if month else ""), None
+    if scenario == "loans_page":
+        return "GET", f"/loans/page?page={rnd.randint(1, max_page)}&size=100&sort_id=desc", None
+    if scenario == "loans_count":
+        return "GET", "/loans/count", None
+    body = bodies[i % len(bodies)]
+    if scenario == "predict":
+        return "POST", "/loans/predict", {k: v for k, v in body.items() if k not in ("prediction", "probability")}
+    return "POST", "/loans/", body
+
+
+async def run_scenario(scenario: str, concurrency: int, total: int, warmup: int, max_page: int):
+    import httpx
+
+    from benchmarks.synthetic import sample_requests
+
+    bodies = sample_requests(min(total + warmup, 5000), seed=7)
+    base_rss = peak_rss_mb()
+
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for i in range(warmup):
+                method, url, body = make_request(scenario, total + i, bodies, max_page)
+                await client.request(method, url, json=body)
+
+            latencies, statuses = [], {}
+            counter = iter(range(total))
+
+            async def worker():
+                for i in counter:
+                    method, url, body = make_request(scenario, i, bodies, max_page)
+                    start = time.perf_counter()
+                    r = await client.request(method, url, json=body)
+                    latencies.append(time.perf_counter() - start)
+                    statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+    latencies_ms = sorted(t * 1000 for t in latencies)
+    ok = sum(c for s, c in statuses.items() if s < 400)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": total - ok,
+        "status_codes": {str(s): c for s, c in sorted(statuses.items())},
+        "elapsed_seconds": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies_ms, 50), 3),
+            "p95": round(percentile(latencies_ms, 95), 3),
+            "p99": round(percentile(latencies_ms, 99), 3),
+            "mean": round(sum(latencies_ms) / len(latencies_ms), 3),
+            "max": round(latencies_ms[-1], 3),
+        },
+        "base_rss_mb": round(base_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def child(args):
+    result = asyncio.run(run_scenario(args.scenario, args.child_concurrency, args.requests,
+                                      args.warmup, args.max_page))
+    print(json.dumps(result))
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results: dict, baseline_path: str):
+    """In thay đổi throughput / p99 so với file JSON của lần chạy trước"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    print(f"\ncompared with {baseline_path}")
+    print(f"{'scenario':>12} {'conc':>5} | {'rps':>9} {'Δ':>8} | {'p99 ms':>9} {'Δ':>8} | {'peak MB':>8}")
+    for r in results["results"]:
+        old = baseline.get((r["scenario"], r["concurrency"]))
+        if old is None:
+            continue
+        d_rps = (r["throughput_rps"] / old["throughput_rps"] - 1) * 100 if old["throughput_rps"] else float("nan")
+        d_p99 = (r["latency_ms"]["p99"] / old["latency_ms"]["p99"] - 1) * 100 if old["latency_ms"]["p99"] else float("nan")
+        print(f"{r['scenario']:>12} {r['concurrency']:>5} | {r['throughput_rps']:9.1f} {d_rps:+7.1f}% | "
+              f"{r['latency_ms']['p99']:9.2f} {d_p99:+7.1f}% | {r['peak_rss_mb']:8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000, help="số dòng giả lập (0 = dùng DB có sẵn)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,10,50")
+    parser.add_argument("--requests", type=int, default=500, help="số request đo mỗi (kịch bản, concurrency)")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_suite.db"))
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE truyền cho app")
+    parser.add_argument("--out", default=None, help="ghi kết quả JSON ra file")
+    parser.add_argument("--compare", default=None, help="file JSON của lần chạy trước")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--child-concurrency", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--max-page", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args)
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {sorted(unknown)} (choose from {SCENARIOS})")
+
+    url = args.database_url or f"sqlite:///{args.db}"
+    if args.rows > 0:
+        from benchmarks.synthetic import create_database
+
+        if args.database_url is None and os.path.exists(args.db):
+            os.remove(args.db)
+        print(f"generating {args.rows} synthetic rows into {url} ...", file=sys.stderr)
+        create_database(url, args.rows, args.seed).dispose()
+
+    # Mặc định tắt cache dashboard để đo đúng đường query; bật lại bằng --env
+    env = dict(os.environ, MODEL_WARMUP="0", LOG_LEVEL="WARNING", DATABASE_URL=url, DASHBOARD_CACHE_SIZE="0")
+    env.update(kv.split("=", 1) for kv in args.env)
+    max_page = max(1, args.rows // 100) if args.rows > 0 else 100
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "rows": args.rows,
+            "database": url.split("://", 1)[0],
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "env": dict(kv.split("=", 1) for kv in args.env),
+        },
+        "results": [],
+    }
+
+    for scenario in scenarios:
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.suite", "--child", "--scenario", scenario,
+                 "--child-concurrency", str(concurrency), "--requests", str(args.requests),
+                 "--warmup", str(args.warmup), "--max-page", str(max_page)],
+                env=env, capture_output=True, text=True,
+            )
+            if out.returncode != 0:
+                print(f"{scenario} x{concurrency}: FAILED\n{out.stderr[-2000:]}", file=sys.stderr)
+                results["results"].append({"scenario": scenario, "concurrency": concurrency, "failed": True})
+                continue
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            results["results"].append(r)
+            print(f"{scenario:>12} x{concurrency:<4} {r['throughput_rps']:9.1f} req/s | "
+                  f"p50 {r['latency_ms']['p50']:8.2f} | p95 {r['latency_ms']['p95']:8.2f} | "
+                  f"p99 {r['latency_ms']['p99']:8.2f} ms | peak {r['peak_rss_mb']:6.0f} MB | "
+                  f"errors {r['errors']}", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        results["results"] = [r for r in results["results"] if not r.get("failed")]
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
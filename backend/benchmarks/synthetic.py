@@ -0,0 +1,153 @@
+"""
+Sinh dữ liệu loans giả lập theo phân phối từng cột của dump
+(database/loan_prediction_loans.sql), từ 1K đến 10M dòng, rồi nạp vào SQLite
+(hoặc DB bất kỳ qua --database-url) để benchmark không cần MySQL.
+
+- Cột ít giá trị (<= CATEGORICAL_MAX_DISTINCT, kể cả Credit_Score,
+  rate_of_interest, probability): lấy mẫu theo đúng tần suất trong dump
+- Cột số liên tục (income, loan_amount, LTV): nội suy ngược từ phân vị của dump
+- prediction = probability > 0.5 như model; age_group / loan_amount_group suy
+  ra như crud.normalize_loans; các cột còn lại sinh độc lập nhau
+
+    cd backend && python -m benchmarks.synthetic --rows 1000000 --db /tmp/loans_1m.db
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import dashboard_engine
+from benchmarks.sample_data import load_dump_rows, loan_features
+
+CATEGORICAL_MAX_DISTINCT = 500
+QUANTILES = 1001
+LOAD_CHUNK_SIZE = 50000
+# Cột suy ra từ cột khác, không lấy mẫu
+DERIVED_COLUMNS = ("id", "prediction", "age_group", "loan_amount_group")
+
+
+def fit_profile(rows: list = None) -> dict:
+    """Phân phối từng cột: {"values", "probs"} (rời rạc) hoặc {"quantiles", "integer"} (liên tục)"""
+    rows = rows or load_dump_rows()
+    profile = {}
+    for column in rows[0]:
+        if column in DERIVED_COLUMNS:
+            continue
+        values = [r[column] for r in rows]
+        distinct, counts = np.unique(np.array(values, dtype=object).astype(str), return_counts=True)
+        if len(distinct) <= CATEGORICAL_MAX_DISTINCT:
+            # Giữ giá trị gốc (đúng kiểu) thay vì chuỗi của np.unique
+            by_text = {str(v): v for v in values}
+            profile[column] = {
+                "values": [by_text[d] for d in distinct],
+                "probs": (counts / counts.sum()).tolist(),
+            }
+        else:
+            numeric = np.array(values, dtype=float)
+            profile[column] = {
+                "quantiles": np.quantile(numeric, np.linspace(0, 1, QUANTILES)).tolist(),
+                "integer": all(isinstance(v, int) for v in values),
+            }
+    return profile
+
+
+def _sample_column(spec: dict, n: int, rng: np.random.Generator) -> list:
+    if "values" in spec:
+        values = np.empty(len(spec["values"]), dtype=object)
+        values[:] = spec["values"]
+        return values[rng.choice(len(values), size=n, p=spec["probs"])].tolist()
+
+    quantiles = np.asarray(spec["quantiles"])
+    sampled = np.interp(rng.random(n), np.linspace(0, 1, len(quantiles)), quantiles)
+    if spec["integer"]:
+        return np.rint(sampled).astype(np.int64).tolist()
+    return np.round(sampled, 6).tolist()
+
+
+def generate(n_rows: int, profile: dict = None, seed: int = 0, chunk_size: int = LOAD_CHUNK_SIZE):
+    """Sinh n_rows dòng loans (dict theo cột bảng loans, chưa có id) theo từng chunk"""
+    profile = profile or fit_profile()
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, chunk_size):
+        n = min(chunk_size, n_rows - start)
+        columns = {column: _sample_column(spec, n, rng) for column, spec in profile.items()}
+        columns["prediction"] = [int(p > 0.5) for p in columns["probability"]]
+        # Dump lưu age / term dạng chuỗi -> đổi về kiểu cột của bảng loans
+        columns["age"] = [None if v is None else float(v) for v in columns["age"]]
+        columns["term"] = [None if v is None else int(float(v)) for v in columns["term"]]
+        columns["age_group"] = dashboard_engine.age_group(columns["age"]).tolist()
+        columns["loan_amount_group"] = dashboard_engine.loan_amount_group(columns["loan_amount"]).tolist()
+        names = list(columns)
+        yield [dict(zip(names, values)) for values in zip(*(columns[c] for c in names))]
+
+
+def sample_requests(n: int, seed: int = 1, profile: dict = None) -> list:
+    """n hồ sơ giả lập ở dạng body của POST /loans/ (features + prediction/probability)"""
+    rows = next(generate(n, profile, seed, chunk_size=n))
+    return [
+        dict(loan_features(row), prediction=row["prediction"], probability=row["probability"])
+        for row in rows
+    ]
+
+
+def create_database(url: str, n_rows: int, seed: int = 0, chunk_size: int = LOAD_CHUNK_SIZE):
+    """Tạo schema (migrations), nạp n_rows dòng giả lập rồi dựng loan_rollups; trả về engine"""
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+
+    import database
+    import migrations
+    import models
+    import rollups
+
+    engine = create_engine(url, **database.engine_options(url))
+    if url.startswith("sqlite"):
+        # Chỉ dùng khi nạp dữ liệu benchmark: bỏ journal / fsync cho nhanh
+        @event.listens_for(engine, "connect")
+        def _fast_load(dbapi_connection, _):
+            dbapi_connection.execute("PRAGMA journal_mode=OFF")
+            dbapi_connection.execute("PRAGMA synchronous=OFF")
+
+    database.Base.metadata.create_all(engine)
+    migrations.upgrade(engine)
+
+    profile = fit_profile()
+    table = models.Loan.__table__
+    for chunk in generate(n_rows, profile, seed, chunk_size):
+        with engine.begin() as conn:
+            conn.execute(table.insert(), chunk)
+
+    db = sessionmaker(bind=engine)()
+    try:
+        rollups.rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+    engine.dispose()
+    return create_engine(url, **database.engine_options(url))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "loans_synthetic.db"))
+    parser.add_argument("--database-url", default=None, help="ghi vào DB có sẵn thay vì file SQLite mới")
+    args = parser.parse_args()
+
+    url = args.database_url
+    if url is None:
+        if os.path.exists(args.db):
+            os.remove(args.db)
+        url = f"sqlite:///{args.db}"
+
+    start = time.perf_counter()
+    create_database(url, args.rows, args.seed).dispose()
+    elapsed = time.perf_counter() - start
+    print(f"{args.rows} rows -> {url} in {elapsed:.1f} s ({args.rows / elapsed:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
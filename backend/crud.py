@@ -2,338 +2,252 @@ from sqlalchemy.orm import Session
 from collections import defaultdict
 import traceback
 from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy import func, select, text
+from pydantic import ValidationError
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
 import models
 import schemas
+import dashboard_engine
+import rollups
+import analytics_query
+from analytics_snapshot import snapshot
+from facets import facet_index
+from dashboard_cache import dashboard_cache
+from database import SessionLocal
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Nguồn dữ liệu dashboard:
+# - "rollup": bảng loan_rollups
+# - "scan": quét bảng loans (dashboard_engine)
+# - "snapshot": bản sao dạng cột trong RAM (analytics_snapshot.py)
+# - "query": mỗi section 1 câu aggregate qua analytics_query
+DASHBOARD_SOURCE = os.getenv("DASHBOARD_SOURCE", "rollup")
+
+# Tập cột của bảng loans, tính 1 lần khi import
+LOAN_COLUMNS = {col.name for col in models.Loan.__table__.columns}
+
+# Số dòng / transaction khi nhập hàng loạt (POST /loans/bulk)
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+
+def normalize_loans(records: list) -> list:
+    """
+    Chuẩn hóa nhiều hồ sơ cùng lúc (dùng chung cho create_loan và bulk):
+    đổi tên cột co-applicant, chuẩn hóa Gender / loan_limit / age / term, tính
+    age_group / loan_amount_group, gán Month/Year hiện tại, bỏ các key không có
+    trong bảng loans.
+    """
+    df = pd.DataFrame.from_records(records).astype(object)
+    if "co-applicant_credit_type" in df.columns and "co_applicant_credit_type" not in df.columns:
+        df = df.rename(columns={"co-applicant_credit_type": "co_applicant_credit_type"})
+    df = df[[c for c in df.columns if c in LOAN_COLUMNS]]
+
+    # CHUẨN HÓA GENDER ("female" phải xét trước vì chứa chuỗi "male")
+    if "Gender" in df.columns:
+        g = df["Gender"].astype(str).str.lower()
+        df["Gender"] = np.select(
+            [g.str.contains("female"), g.str.contains("male")], ["Female", "Male"], default="Sex Not Av"
+        ).astype(object)
+
+    # Chuẩn hóa loan_limit: cf -> 500000, ncf -> 0, chuỗi số -> float, còn lại NULL
+    if "loan_limit" in df.columns:
+        v = df["loan_limit"]
+        is_str = v.map(lambda x: isinstance(x, str)).astype(bool)
+        if is_str.any():
+            s = v[is_str].str.strip().str.lower()
+            parsed = s.map({"cf": 500000.0, "ncf": 0.0}).fillna(pd.to_numeric(s, errors="coerce"))
+            df.loc[is_str, "loan_limit"] = parsed.astype(object)
+
+    # age (số thực) / term (số nguyên) theo kiểu cột; giá trị không phải số -> NULL
+    missing = pd.Series(np.nan, index=df.index)
+    age = pd.to_numeric(df["age"], errors="coerce") if "age" in df.columns else missing
+    if "age" in df.columns:
+        df["age"] = age
+    if "term" in df.columns:
+        df["term"] = pd.to_numeric(df["term"], errors="coerce").round().astype("Int64")
+
+    # Nhóm tuổi / khoản vay tính 1 lần lúc ghi, dashboard GROUP BY thẳng trên cột
+    amount = pd.to_numeric(df["loan_amount"], errors="coerce") if "loan_amount" in df.columns else missing
+    df["age_group"] = dashboard_engine.age_group(age)
+    df["loan_amount_group"] = dashboard_engine.loan_amount_group(amount)
 
-def create_loan(db: Session, loan: schemas.LoanCreate):
-    try:
-        loan_data = loan.model_dump()
-    except AttributeError:
-        loan_data = loan.dict()
-
-    if "co-applicant_credit_type" in loan_data and "co_applicant_credit_type" not in loan_data:
-        loan_data["co_applicant_credit_type"] = loan_data.pop("co-applicant_credit_type")
-
-    allowed_columns = {col.name for col in models.Loan.__table__.columns}
-    filtered_data = {k: v for k, v in loan_data.items() if k in allowed_columns}
-    # CHUẨN HÓA GENDER 
-    if "Gender" in filtered_data:
-        g = str(filtered_data["Gender"]).lower()
-        if "male" in g:
-            filtered_data["Gender"] = "Male"
-        elif "female" in g:
-            filtered_data["Gender"] = "Female"
-        else:
-            filtered_data["Gender"] = "Sex Not Av"
-    # Ghi nhận Month/Year hiện tại vào CSDL
-    filtered_data["Month"] = datetime.now().strftime("%B")
-    filtered_data["Year"] = datetime.now().year
     # Ghi nhận Month/Year hiện tại vào CSDL
-    filtered_data["Month"] = datetime.now().strftime("%B")  # VD: "September"
-    filtered_data["Year"] = datetime.now().year
-    # Chuẩn hóa loan_limit
-    if "loan_limit" in filtered_data:
-        v = filtered_data["loan_limit"]
-        if isinstance(v, str):
-            vl = v.strip().lower()
-            if vl == "cf":
-                filtered_data["loan_limit"] = 500000.0
-            elif vl == "ncf":
-                filtered_data["loan_limit"] = 0.0
-            else:
-                try:
-                    filtered_data["loan_limit"] = float(v)
-                except ValueError:
-                    filtered_data["loan_limit"] = None
+    now = datetime.now()
+    df["Month"] = now.strftime("%B")  # VD: "September"
+    df["Year"] = now.year
 
-    db_loan = models.Loan(**filtered_data)
-    db.add(db_loan)
-    db.commit()
-    db.refresh(db_loan)
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict("records")
 
-    return db_loan
 
+def _after_commit(fn, *args):
+    """
+    Cập nhật snapshot / facet index sau khi đã commit: lỗi ở đây chỉ log và đánh
+    dấu load lại, không ném ra (caller sẽ coi như INSERT lỗi rồi ghi lại lần nữa)
+    """
+    try:
+        fn(*args)
+    except Exception as e:
+        logger.exception("In-memory index update failed after commit: %s", e)
+        snapshot.invalidate()
+        facet_index.invalidate()
 
-def safe_limit(val):
-    """Chuyển giá trị loan_limit về float an toàn"""
+
+def _loan_data(loan: schemas.LoanCreate) -> dict:
     try:
-        return float(val)
-    except Exception:
-        return 0.0
+        return loan.model_dump()
+    except AttributeError:
+        return loan.dict()
 
-from sqlalchemy import text
-from typing import Optional
 
-def get_dashboard_data(db: Session, month: Optional[str] = None, year: Optional[int] = None):
-    data = {}
-    # 0. WHERE DYNAMIC (FILTER)
-    conditions = ["1=1"]
-    params = {}
+def create_loan(db: Session, loan: schemas.LoanCreate):
+    filtered_data = normalize_loans([_loan_data(loan)])[0]
 
-    if month:
-        conditions.append("Month = :month")
-        params["month"] = month   
+    db_loan = models.Loan(**filtered_data)
+    db.add(db_loan)
+    rollups.apply_rows(db, [filtered_data], +1)
+    with timed("db.commit"):
+        db.commit()
+    dashboard_cache.invalidate()
+    db.refresh(db_loan)
+    _after_commit(snapshot.append, [dict(filtered_data, id=db_loan.id)])
+    _after_commit(facet_index.add, [filtered_data])
+
+    return db_loan
 
-    if year:
-        conditions.append("Year = :year")
-        params["year"] = year  
 
-    where_clause = " AND ".join(conditions)
+def _validation_error(e: ValidationError):
+    return e.errors(include_url=False, include_context=False)
 
-    # I. KPI DASHBOARD
-    kpi = {}
 
-    # 1. Total Loans
-    sql_total_loans = f"""
-        SELECT COUNT(id) AS total_loans
-        FROM loans
-        WHERE {where_clause};
+def insert_loan_rows(db: Session, rows: list, with_ids: bool = False):
     """
-    row = db.execute(text(sql_total_loans), params).fetchone()
-    kpi["total_loans"] = int(row.total_loans or 0)
-
-    # 2. Avg Credit Score
-    sql_avg_cs = f"""
-        SELECT AVG(Credit_Score) AS avg_credit_score
-        FROM loans
-        WHERE {where_clause};
+    INSERT nhiều dòng đã chuẩn hóa (normalize_loans) + cập nhật rollups trong
+    1 transaction rồi commit. with_ids=True trả về id theo thứ tự dòng nếu
+    dialect hỗ trợ executemany ... RETURNING (SQLite, MariaDB), ngược lại None.
+    Chỉ ném lỗi khi INSERT / COMMIT lỗi (các dòng chưa được ghi).
     """
-    row = db.execute(text(sql_avg_cs), params).fetchone()
-    kpi["avg_credit_score"] = float(row.avg_credit_score) if row.avg_credit_score is not None else None
-
-    # 3. Avg Loan Amount
-    sql_avg_la = f"""
-        SELECT AVG(loan_amount) AS avg_loan_amount
-        FROM loans
-        WHERE {where_clause};
+    table = models.Loan.__table__
+    ids = None
+    if with_ids and db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        result = db.execute(table.insert().returning(table.c.id, sort_by_parameter_order=True), rows)
+        ids = [row[0] for row in result]
+    else:
+        db.execute(table.insert(), rows)
+    rollups.apply_rows(db, rows, +1)
+    with timed("db.commit"):
+        db.commit()
+    _after_commit(snapshot.append, rows if ids is None else [dict(r, id=i) for r, i in zip(rows, ids)])
+    _after_commit(facet_index.add, rows)
+    return ids
+
+
+def bulk_create_loans(db: Session, rows: list, score: bool = False, chunk_size: int = BULK_CHUNK_SIZE):
     """
-    row = db.execute(text(sql_avg_la), params).fetchone()
-    kpi["avg_loan_amount"] = float(row.avg_loan_amount) if row.avg_loan_amount is not None else None
-
-    # 4. Default Rate (%)
-    sql_default_rate = f"""
-        SELECT (SUM(prediction) / COUNT(*)) * 100 AS default_rate_percent
-        FROM loans
-        WHERE {where_clause};
+    Nhập nhiều hồ sơ: validate từng dòng, (tùy chọn) chấm điểm cả lô trong 1 lần
+    gọi model, chuẩn hóa vector hóa rồi INSERT executemany theo từng chunk
+    (mỗi chunk 1 transaction, kèm cập nhật loan_rollups).
+    Trả về số dòng đã ghi, lỗi theo index dòng và tốc độ rows/sec.
     """
-    row = db.execute(text(sql_default_rate), params).fetchone()
-    kpi["default_rate_percent"] = float(row.default_rate_percent) if row.default_rate_percent is not None else 0.0
-
-    # 5. Model accuracy (cố định)
-    kpi["model_accuracy"] = 93.40
+    from model_loader import predict_batch
+
+    start = time.perf_counter()
+    errors = {}
+    valid_idx, valid_rows = [], []
+
+    with timed("validation"):
+        for i, row in enumerate(rows):
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError("row must be an object")
+                if "co-applicant_credit_type" in row and "co_applicant_credit_type" not in row:
+                    row = {**row, "co_applicant_credit_type": row["co-applicant_credit_type"]}
+                valid_rows.append(schemas.LoanBulkRow(**row).dict())
+                valid_idx.append(i)
+            except ValidationError as e:
+                errors[i] = _validation_error(e)
+            except ValueError as e:
+                errors[i] = str(e)
+
+    if score and valid_rows:
+        # Dữ liệu nhập không phải traffic /predict -> không đưa vào drift monitor
+        for row, result in zip(valid_rows, predict_batch(valid_rows, observe_drift=False)):
+            if "error" in result:
+                row["_error"] = f"prediction failed: {result['error']}"
+            else:
+                row["prediction"] = result["prediction"]
+                row["probability"] = result["probability"]
+
+    ready_idx, ready_rows = [], []
+    for i, row in zip(valid_idx, valid_rows):
+        if row.get("_error"):
+            errors[i] = row["_error"]
+        elif row.get("prediction") is None or row.get("probability") is None:
+            errors[i] = "prediction and probability are required unless score=true"
+        else:
+            ready_idx.append(i)
+            ready_rows.append(row)
+
+    inserted = 0
+    for offset in range(0, len(ready_rows), chunk_size):
+        chunk_idx = ready_idx[offset:offset + chunk_size]
+        chunk = normalize_loans(ready_rows[offset:offset + chunk_size])
+        try:
+            insert_loan_rows(db, chunk)
+            inserted += len(chunk)
+        except Exception as e:
+            db.rollback()
+            logger.warning("Bulk insert error: %s", e)
+            for i in chunk_idx:
+                errors[i] = f"database error: {e.__class__.__name__}"
+
+    if inserted:
+        dashboard_cache.invalidate()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "received": len(rows),
+        "inserted": inserted,
+        "failed": len(errors),
+        "scored": bool(score),
+        "errors": [{"index": i, "error": errors[i]} for i in sorted(errors)],
+        "elapsed_seconds": round(elapsed, 4),
+        "rows_per_sec": round(inserted / elapsed, 1) if elapsed > 0 else None,
+    }
 
-    data["kpi"] = kpi
 
-    # II. DEMOGRAPHICS
+def safe_limit(val):
+    """Chuyển giá trị loan_limit về float an toàn"""
+    try:
+        return float(val)
+    except Exception:
+        return 0.0
 
-    data["demographics"] = {}
+from typing import Optional
 
-    # 2.1 Gender
-    sql_gender = f"""
-        SELECT
-            Gender,
-            COUNT(*) AS total_loans,
-            SUM(prediction) AS default_count,
-            (SUM(prediction) / COUNT(*)) * 100 AS default_rate_percent,
-            AVG(probability) AS avg_probability
-        FROM loans
-        WHERE {where_clause}
-        GROUP BY Gender;
-    """
-    data["demographics"]["gender"] = [
-        dict(row._mapping)
-        for row in db.execute(text(sql_gender), params).fetchall()
-    ]
-
-    # 2.2 Age Group
-    sql_age = f"""
-        SELECT
-            CASE
-                WHEN age < 25 THEN '<25'
-                WHEN age BETWEEN 25 AND 34 THEN '25-34'
-                WHEN age BETWEEN 35 AND 44 THEN '35-44'
-                WHEN age BETWEEN 45 AND 54 THEN '45-54'
-                WHEN age BETWEEN 55 AND 64 THEN '55-64'
-                WHEN age BETWEEN 65 AND 74 THEN '65-74'
-                ELSE '>74'
-            END AS age_group,
-            COUNT(*) AS total_loans,
-            (SUM(prediction) / COUNT(*)) * 100 AS default_rate_percent,
-            AVG(Credit_Score) AS avg_credit_score
-        FROM loans
-        WHERE {where_clause}
-        GROUP BY age_group
-        ORDER BY
-            CASE
-                WHEN age_group = '<25' THEN 1
-                WHEN age_group = '25-34' THEN 2
-                WHEN age_group = '35-44' THEN 3
-                WHEN age_group = '45-54' THEN 4
-                WHEN age_group = '55-64' THEN 5
-                WHEN age_group = '65-74' THEN 6
-                WHEN age_group = '>74' THEN 7
-            END;
-    """
-    data["demographics"]["age_group"] = [
-        dict(row._mapping)
-        for row in db.execute(text(sql_age), params).fetchall()
-    ]
-
-    # 2.3 Region
-    sql_region = f"""
-        SELECT
-            Region,
-            COUNT(*) AS total_loans,
-            AVG(probability) AS avg_probability,
-            (SUM(prediction) / COUNT(*)) * 100 AS default_rate_percent
-        FROM loans
-        WHERE {where_clause}
-        GROUP BY Region;
-    """
-    data["demographics"]["region"] = [
-        dict(row._mapping)
-        for row in db.execute(text(sql_region), params).fetchall()
-    ]
-
-    # -------------------------
-    # III. LOAN CHARACTERISTICS
-    # -------------------------
-    data["loan_characteristics"] = {}
-
-    # 3.1 Loan Type
-    sql_loan_type = f"""
-        SELECT
-            loan_type,
-            COUNT(*) AS total_loans,
-            (SUM(prediction) / COUNT(*)) * 100 AS default_rate_percent,
-            AVG(rate_of_interest) AS avg_interest_rate
-        FROM loans
-        WHERE {where_clause}
-        GROUP BY loan_type
-        ORDER BY loan_type;
-    """
-    data["loan_characteristics"]["loan_type"] = [
-        dict(row._mapping)
-        for row in db.execute(text(sql_loan_type), params).fetchall()
-    ]
-
-    # 3.2 Loan Purpose
-    sql_purpose = f"""
-        SELECT
-            loan_purpose AS purpose,
-            COUNT(*) AS loan_count,
-            (SUM(prediction) / COUNT(*)) * 100 AS default_rate_percent,
-            AVG(probability) AS avg_probability
-        FROM loans
-        WHERE {where_clause}
-        GROUP BY loan_purpose
-        ORDER BY loan_purpose;
-    """
-    data["loan_characteristics"]["purpose"] = [
-        dict(row._mapping)
-        for row in db.execute(text(sql_purpose), params).fetchall()
-    ]
-
-    # 3.3 Interest Rate vs Default
-    sql_interest = f"""
-        SELECT
-            rate_of_interest,
-            AVG(probability) AS avg_probability,
-            (SUM(prediction) / COUNT(*)) * 100 AS default_rate_percent
-        FROM loans
-        WHERE {where_clause}
-        GROUP BY rate_of_interest
-        ORDER BY rate_of_interest;
-    """
-    data["loan_characteristics"]["interest_rate"] = [
-        dict(row._mapping)
-        for row in db.execute(text(sql_interest), params).fetchall()
-    ]
-
-    # 3.4 Loan Amount Group
-    sql_amount_group = f"""
-        SELECT
-            CASE
-                WHEN loan_amount < 300000 THEN '<300k'
-                WHEN loan_amount >= 300000 AND loan_amount < 900000 THEN '300k-900k'
-                WHEN loan_amount >= 900000 AND loan_amount <= 2000000 THEN '900k-2M'
-                ELSE '>2M'
-            END AS loan_amount_group,
-            COUNT(*) AS total_loans,
-            AVG(loan_amount) AS avg_loan_amount,
-            (SUM(prediction) / COUNT(*)) * 100 AS default_rate_percent,
-            AVG(probability) AS avg_probability
-        FROM loans
-        WHERE {where_clause}
-        GROUP BY loan_amount_group
-        ORDER BY
-            CASE
-                WHEN loan_amount_group = '<300k' THEN 1
-                WHEN loan_amount_group = '300k-900k' THEN 2
-                WHEN loan_amount_group = '900k-2M' THEN 3
-                WHEN loan_amount_group = '>2M' THEN 4
-            END;
-    """
-    data["loan_characteristics"]["loan_amount_group"] = [
-        dict(row._mapping)
-        for row in db.execute(text(sql_amount_group), params).fetchall()
-    ]
-
-    # -------------------------
-    # IV. COLLATERAL & APPLICATION
-    # -------------------------
-    data["collateral_application"] = {}
-
-    # 4.1 Submission Method
-    sql_submission = f"""
-        SELECT
-            submission_of_application AS submission,
-            approv_in_adv AS pre_approval,
-            (SUM(prediction) / COUNT(*)) * 100 AS default_rate_percent,
-            AVG(probability) AS avg_probability
-        FROM loans
-        WHERE {where_clause}
-        GROUP BY submission_of_application, approv_in_adv
-        ORDER BY submission_of_application, pre_approval;
-    """
-    data["collateral_application"]["submission_method"] = [
-        dict(row._mapping)
-        for row in db.execute(text(sql_submission), params).fetchall()
-    ]
-
-    # 4.2 Occupancy Type
-    sql_occupancy = f"""
-        SELECT
-            occupancy_type,
-            (SUM(prediction) / COUNT(*)) * 100 AS default_rate_percent,
-            AVG(probability) AS avg_probability
-        FROM loans
-        WHERE {where_clause}
-        GROUP BY occupancy_type;
+def get_dashboard_data(db: Session, month: Optional[str] = None, year: Optional[int] = None):
     """
-    data["collateral_application"]["occupancy_type"] = [
-        dict(row._mapping)
-        for row in db.execute(text(sql_occupancy), params).fetchall()
-    ]
-
-    # 4.3 Secured_by
-    sql_secured = f"""
-        SELECT
-            Secured_by,
-            (SUM(prediction) / COUNT(*)) * 100 AS default_rate_percent,
-            AVG(loan_amount) AS avg_loan_amount
-        FROM loans
-        WHERE {where_clause}
-        GROUP BY Secured_by;
+    Mặc định đọc từ bảng tổng hợp loan_rollups (xem rollups.py);
+    DASHBOARD_SOURCE=scan thì tính trong 1 lần quét bảng loans (dashboard_engine),
+    DASHBOARD_SOURCE=snapshot thì tính trên snapshot dạng cột trong RAM,
+    DASHBOARD_SOURCE=query thì chạy các preset của analytics_query.
+    - Không filter: trả full DB
+    - Có month/year: lọc theo Month, Year
     """
-    data["collateral_application"]["secured_by"] = [
-        dict(row._mapping)
-        for row in db.execute(text(sql_secured), params).fetchall()
-    ]
-
-    return data
-
+    with timed(f"dashboard.{DASHBOARD_SOURCE}"):
+        if DASHBOARD_SOURCE == "rollup":
+            return rollups.get_dashboard_data(db, month, year)
+        if DASHBOARD_SOURCE == "snapshot":
+            return snapshot.get_dashboard_data(db, month, year)
+        if DASHBOARD_SOURCE == "query":
+            return analytics_query.get_dashboard_data(db, month, year)
+        return dashboard_engine.get_dashboard_data(db, month, year)
 
 
 def get_empty_data():
@@ -353,7 +267,76 @@ def get_empty_data():
         "model_accuracy": 93.40,
     }
 
+# --- Bản async (DB_ASYNC=1): chỉ I/O đi qua AsyncSession (aiomysql / aiosqlite),
+# phần pandas / NumPy (normalize_loans, rollups, dashboard, snapshot, facet index)
+# chạy trong thread pool bằng engine.in_executor để không chặn event loop
+async def create_loan_async(db, loan: schemas.LoanCreate):
+    filtered_data = (await dashboard_engine.in_executor(normalize_loans, [_loan_data(loan)]))[0]
+
+    db_loan = models.Loan(**filtered_data)
+    db.add(db_loan)
+    await rollups.apply_rows_async(db, [filtered_data], +1)
+    with timed("db.commit"):
+        await db.commit()
+    dashboard_cache.invalidate()
+    await db.refresh(db_loan)
+    await dashboard_engine.in_executor(_after_commit, snapshot.append, [dict(filtered_data, id=db_loan.id)])
+    await dashboard_engine.in_executor(_after_commit, facet_index.add, [filtered_data])
+
+    return db_loan
+
+async def delete_loan_async(db, loan_id: int):
+    loan = (await db.scalars(select(models.Loan).where(models.Loan.id == loan_id))).first()
+    if not loan:
+        return None
+
+    row = loan_to_dict(loan)
+    await rollups.apply_rows_async(db, [row], -1)
+    await db.delete(loan)
+    with timed("db.commit"):
+        await db.commit()
+    dashboard_cache.invalidate()
+    await dashboard_engine.in_executor(_after_commit, snapshot.remove, loan_id)
+    await dashboard_engine.in_executor(_after_commit, facet_index.remove, [row])
+    return loan
+
+def _snapshot_dashboard(month: Optional[str] = None, year: Optional[int] = None):
+    """Chạy trong executor; session sync chỉ dùng khi snapshot phải load lại"""
+    with SessionLocal() as db:
+        return snapshot.get_dashboard_data(db, month, year)
+
+async def get_dashboard_data_async(db, month: Optional[str] = None, year: Optional[int] = None):
+    with timed(f"dashboard.{DASHBOARD_SOURCE}"):
+        if DASHBOARD_SOURCE == "rollup":
+            return await rollups.get_dashboard_data_async(db, month, year)
+        if DASHBOARD_SOURCE == "snapshot":
+            return await dashboard_engine.in_executor(_snapshot_dashboard, month, year)
+        if DASHBOARD_SOURCE == "query":
+            return await analytics_query.get_dashboard_data_async(db, month, year)
+        return await dashboard_engine.get_dashboard_data_async(db, month, year)
+
+async def count_loans_async(db):
+    return await db.scalar(select(func.count()).select_from(models.Loan))
+
 def get_user_by_username(db: Session, username: str):
     return db.query(models.Employee).filter(models.Employee.username == username).first()
+def loan_to_dict(loan: models.Loan) -> dict:
+    return {col.name: getattr(loan, col.name) for col in models.Loan.__table__.columns}
+
+def delete_loan(db: Session, loan_id: int):
+    loan = db.query(models.Loan).filter(models.Loan.id == loan_id).first()
+    if not loan:
+        return None
+
+    row = loan_to_dict(loan)
+    rollups.apply_rows(db, [row], -1)
+    db.delete(loan)
+    with timed("db.commit"):
+        db.commit()
+    dashboard_cache.invalidate()
+    _after_commit(snapshot.remove, loan_id)
+    _after_commit(facet_index.remove, [row])
+    return loan
+
 def get_loans(db: Session):
     return db.query(models.Loan).all()
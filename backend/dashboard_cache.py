@@ -0,0 +1,124 @@
+"""
+Cache response của /dashboard theo (month, year).
+
+- Mỗi lần ghi (create_loan / delete_loan) gọi invalidate() để tăng generation,
+  entry của generation cũ không còn được dùng.
+- ETag là hash nội dung JSON nên If-None-Match -> 304 luôn đúng, kể cả khi chạy
+  nhiều worker (mỗi worker có cache riêng).
+- DASHBOARD_CACHE_SIZE: số entry tối đa (LRU), DASHBOARD_CACHE_TTL: giây, 0 = không hết hạn
+  (nên đặt > 0 khi chạy nhiều worker vì ghi ở worker khác không invalidate được).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from metrics import Histogram
+
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "64"))
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "0"))
+
+
+class DashboardCache:
+    def __init__(self, max_entries: int = DASHBOARD_CACHE_SIZE, ttl: float = DASHBOARD_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.recompute_ms = Histogram([5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000])
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def _lookup(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        generation, expires_at, data, etag = entry
+        if generation != self.generation or (self.ttl > 0 and expires_at < time.monotonic()):
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return data, etag
+
+    def _begin(self, key):
+        with self._lock:
+            found = self._lookup(key) if self.max_entries > 0 else None
+            if found is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return found, self.generation
+
+    def _store(self, key, generation, data, elapsed):
+        self.recompute_ms.observe(elapsed * 1000)
+        data = jsonable_encoder(data)
+        payload = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+        etag = f'W/"{hashlib.sha1(payload).hexdigest()}"'
+
+        with self._lock:
+            # Có ghi xảy ra trong lúc tính -> không lưu kết quả có thể đã cũ
+            if generation == self.generation and self.max_entries > 0:
+                self._data[key] = (generation, time.monotonic() + self.ttl, data, etag)
+                self._data.move_to_end(key)
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+        return data, etag
+
+    def get(self, key, compute):
+        """Trả về (data, etag); tính lại bằng compute() nếu chưa có trong cache"""
+        found, generation = self._begin(key)
+        if found is not None:
+            return found
+        start = time.perf_counter()
+        data = compute()
+        return self._store(key, generation, data, time.perf_counter() - start)
+
+    async def get_async(self, key, compute):
+        """Như get() nhưng compute là coroutine function"""
+        found, generation = self._begin(key)
+        if found is not None:
+            return found
+        start = time.perf_counter()
+        data = await compute()
+        return self._store(key, generation, data, time.perf_counter() - start)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "generation": self.generation,
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "recompute_ms": self.recompute_ms.snapshot(),
+            }
+
+
+dashboard_cache = DashboardCache()
+
+
+def etag_response(request: Request, response: Response, data, etag: str):
+    """Gắn ETag; trả 304 rỗng nếu client gửi If-None-Match trùng"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return data
@@ -0,0 +1,436 @@
+"""
+Engine tổng hợp dashboard: đọc bảng loans MỘT lần (1 câu SELECT theo cột)
+rồi tính toàn bộ KPI + các breakdown bằng NumPy.
+
+Mỗi section được mô tả bằng dimension (cột group by) và metric (count,
+default rate, avg...). Kết quả trung gian là "partial": dict
+key -> vector thống kê [n, sum_m1, cnt_m1, sum_m2, cnt_m2, ...] nên có thể
+cộng dồn / gộp trước khi finalize ra đúng format response cũ.
+
+Giá trị chuỗi được group / so sánh theo collation_key như collation
+utf8mb4_unicode_ci của bảng loans trên MySQL ('Central' và 'central' là 1 nhóm),
+nhãn của nhóm là cách viết gặp đầu tiên.
+
+Bản *_async (DB_ASYNC=1): chỉ I/O đi qua AsyncSession, phần NumPy chạy bằng
+in_executor để không chặn event loop.
+"""
+import asyncio
+import functools
+import unicodedata
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+MODEL_ACCURACY = 93.40
+
+# Cột đo lường dùng cho SUM / AVG
+MEASURES = ["prediction", "probability", "Credit_Score", "loan_amount", "rate_of_interest"]
+STATS_SIZE = 1 + 2 * len(MEASURES)
+
+AGE_GROUPS = ["<25", "25-34", "35-44", "45-54", "55-64", "65-74", ">74"]
+LOAN_AMOUNT_GROUPS = ["<300k", "300k-900k", "900k-2M", ">2M"]
+
+
+def age_group(age):
+    """Giống CASE WHEN age < 25 ... ELSE '>74' (NULL rơi vào ELSE)"""
+    a = pd.to_numeric(pd.Series(age, dtype=object), errors="coerce").to_numpy(dtype=float)
+    conditions = [
+        a < 25,
+        (a >= 25) & (a <= 34),
+        (a >= 35) & (a <= 44),
+        (a >= 45) & (a <= 54),
+        (a >= 55) & (a <= 64),
+        (a >= 65) & (a <= 74),
+    ]
+    return np.select(conditions, AGE_GROUPS[:-1], default=AGE_GROUPS[-1]).astype(object)
+
+
+def loan_amount_group(amount):
+    """Giống CASE WHEN loan_amount < 300000 ... ELSE '>2M'"""
+    a = np.asarray(amount, dtype=float)
+    conditions = [
+        a < 300000,
+        (a >= 300000) & (a < 900000),
+        (a >= 900000) & (a <= 2000000),
+    ]
+    return np.select(conditions, LOAN_AMOUNT_GROUPS[:-1], default=LOAN_AMOUNT_GROUPS[-1]).astype(object)
+
+
+# Cùng phép chia nhóm bằng SQL (NULL rơi vào ELSE): backfill cột lưu sẵn, hoặc
+# tính tại chỗ khi bảng loans chưa có cột (DB import từ dump, trước migration 4)
+GROUP_SQL = {
+    "age_group": (
+        "CASE WHEN age < 25 THEN '<25' "
+        "WHEN age BETWEEN 25 AND 34 THEN '25-34' "
+        "WHEN age BETWEEN 35 AND 44 THEN '35-44' "
+        "WHEN age BETWEEN 45 AND 54 THEN '45-54' "
+        "WHEN age BETWEEN 55 AND 64 THEN '55-64' "
+        "WHEN age BETWEEN 65 AND 74 THEN '65-74' "
+        "ELSE '>74' END"
+    ),
+    "loan_amount_group": (
+        "CASE WHEN loan_amount < 300000 THEN '<300k' "
+        "WHEN loan_amount >= 300000 AND loan_amount < 900000 THEN '300k-900k' "
+        "WHEN loan_amount >= 900000 AND loan_amount <= 2000000 THEN '900k-2M' "
+        "ELSE '>2M' END"
+    ),
+}
+
+
+# dimension -> (cột nguồn, hàm suy ra hoặc None, thứ tự cố định hoặc None)
+# age_group / loan_amount_group được lưu sẵn trong bảng loans (crud.normalize_loans)
+DIMENSIONS = {
+    "Gender": ("Gender", None, None),
+    "age_group": ("age_group", None, AGE_GROUPS),
+    "Region": ("Region", None, None),
+    "loan_type": ("loan_type", None, None),
+    "loan_purpose": ("loan_purpose", None, None),
+    "rate_of_interest": ("rate_of_interest", None, None),
+    "loan_amount_group": ("loan_amount_group", None, LOAN_AMOUNT_GROUPS),
+    "submission_of_application": ("submission_of_application", None, None),
+    "approv_in_adv": ("approv_in_adv", None, None),
+    "occupancy_type": ("occupancy_type", None, None),
+    "Secured_by": ("Secured_by", None, None),
+    "Year": ("Year", None, None),
+    "Month": ("Month", None, None),
+}
+
+# metric -> (phép tính, cột đo lường)
+METRICS = {
+    "count": ("count", None),
+    "default_count": ("sum", "prediction"),
+    "default_rate": ("rate", "prediction"),
+    "avg_probability": ("avg", "probability"),
+    "avg_credit_score": ("avg", "Credit_Score"),
+    "avg_loan_amount": ("avg", "loan_amount"),
+    "avg_interest_rate": ("avg", "rate_of_interest"),
+}
+
+# (nhóm, tên section, [(alias, dimension)], [(alias, metric)], có ORDER BY hay không)
+SECTIONS = [
+    ("demographics", "gender",
+     [("Gender", "Gender")],
+     [("total_loans", "count"), ("default_count", "default_count"),
+      ("default_rate_percent", "default_rate"), ("avg_probability", "avg_probability")],
+     False),
+    ("demographics", "age_group",
+     [("age_group", "age_group")],
+     [("total_loans", "count"), ("default_rate_percent", "default_rate"),
+      ("avg_credit_score", "avg_credit_score")],
+     True),
+    ("demographics", "region",
+     [("Region", "Region")],
+     [("total_loans", "count"), ("avg_probability", "avg_probability"),
+      ("default_rate_percent", "default_rate")],
+     False),
+    ("loan_characteristics", "loan_type",
+     [("loan_type", "loan_type")],
+     [("total_loans", "count"), ("default_rate_percent", "default_rate"),
+      ("avg_interest_rate", "avg_interest_rate")],
+     True),
+    ("loan_characteristics", "purpose",
+     [("purpose", "loan_purpose")],
+     [("loan_count", "count"), ("default_rate_percent", "default_rate"),
+      ("avg_probability", "avg_probability")],
+     True),
+    ("loan_characteristics", "interest_rate",
+     [("rate_of_interest", "rate_of_interest")],
+     [("avg_probability", "avg_probability"), ("default_rate_percent", "default_rate")],
+     True),
+    ("loan_characteristics", "loan_amount_group",
+     [("loan_amount_group", "loan_amount_group")],
+     [("total_loans", "count"), ("avg_loan_amount", "avg_loan_amount"),
+      ("default_rate_percent", "default_rate"), ("avg_probability", "avg_probability")],
+     True),
+    ("collateral_application", "submission_method",
+     [("submission", "submission_of_application"), ("pre_approval", "approv_in_adv")],
+     [("default_rate_percent", "default_rate"), ("avg_probability", "avg_probability")],
+     True),
+    ("collateral_application", "occupancy_type",
+     [("occupancy_type", "occupancy_type")],
+     [("default_rate_percent", "default_rate"), ("avg_probability", "avg_probability")],
+     False),
+    ("collateral_application", "secured_by",
+     [("Secured_by", "Secured_by")],
+     [("default_rate_percent", "default_rate"), ("avg_loan_amount", "avg_loan_amount")],
+     False),
+]
+
+# KPI tính trên toàn bộ dòng (không group)
+KPI_MEASURES = ["prediction", "Credit_Score", "loan_amount"]
+
+
+def build_where(month: Optional[str] = None, year: Optional[int] = None):
+    conditions = ["1=1"]
+    params = {}
+
+    if month:
+        conditions.append("Month = :month")
+        params["month"] = month
+
+    if year:
+        conditions.append("Year = :year")
+        params["year"] = year
+
+    return " AND ".join(conditions), params
+
+
+def section_measures(section):
+    measures = []
+    for _, metric in section[3]:
+        column = METRICS[metric][1]
+        if column and column not in measures:
+            measures.append(column)
+    return measures
+
+
+def source_columns(extra_dimensions=()):
+    """Cột cần SELECT cho các section (cộng thêm dimension phụ nếu có)"""
+    dimensions = [d for section in SECTIONS for _, d in section[2]] + list(extra_dimensions)
+    columns = []
+    for dimension in dimensions:
+        source = DIMENSIONS[dimension][0]
+        if source not in columns:
+            columns.append(source)
+    for m in MEASURES:
+        if m not in columns:
+            columns.append(m)
+    return columns
+
+
+async def in_executor(fn, *args):
+    """Chạy fn(*args) trong thread pool mặc định của event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+
+
+def scan_query(month: Optional[str] = None, year: Optional[int] = None):
+    """(tên cột, câu SELECT, params) của lần quét bảng loans"""
+    where_clause, params = build_where(month, year)
+    names = source_columns()
+    return names, text(f"SELECT {', '.join(names)} FROM loans WHERE {where_clause}"), params
+
+
+def fetch_columns(db: Session, month: Optional[str] = None, year: Optional[int] = None):
+    """1 lần quét bảng loans, trả về dict cột -> mảng NumPy"""
+    names, sql, params = scan_query(month, year)
+    rows = db.execute(sql, params).fetchall()
+    return columns_from_rows(names, rows)
+
+
+def columns_from_rows(names, rows):
+    if rows:
+        values = list(zip(*rows))
+    else:
+        values = [()] * len(names)
+
+    columns = {}
+    for name, col in zip(names, values):
+        if name in MEASURES:
+            columns[name] = np.array(col, dtype=float)
+        else:
+            columns[name] = np.array(col, dtype=object)
+    return columns
+
+
+def dimension_values(columns, dimension):
+    source, derive, _ = DIMENSIONS[dimension]
+    values = columns[source]
+    if derive is not None:
+        values = derive(values)
+    return values
+
+
+def collation_key(value):
+    """
+    Khóa so sánh giống utf8mb4_unicode_ci: không phân biệt hoa thường / dấu,
+    bỏ khoảng trắng cuối (PAD SPACE). Giá trị không phải chuỗi giữ nguyên.
+    """
+    if not isinstance(value, str):
+        return value
+    folded = unicodedata.normalize("NFKD", value.rstrip(" ").casefold())
+    return "".join(ch for ch in folded if not unicodedata.combining(ch))
+
+
+def group_key(key: tuple) -> tuple:
+    return tuple(group_key(v) if isinstance(v, tuple) else collation_key(v) for v in key)
+
+
+def _factorize(values):
+    """Mã nhóm theo collation_key, nhãn = cách viết gặp đầu tiên của mỗi nhóm"""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    uniques = [None if _is_null(u) else _to_python(u) for u in uniques]
+
+    index, labels, remap = {}, [], []
+    for u in uniques:
+        code = index.setdefault(collation_key(u), len(labels))
+        if code == len(labels):
+            labels.append(u)
+        remap.append(code)
+    if len(labels) == len(uniques):
+        return codes, uniques
+    return np.asarray(remap, dtype=np.int64)[codes], labels
+
+
+def _is_null(v):
+    return v is None or (isinstance(v, float) and np.isnan(v))
+
+
+def _to_python(v):
+    return v.item() if isinstance(v, np.generic) else v
+
+
+def accumulate(columns, dimensions, measures=MEASURES, row_count=None):
+    """
+    Group các dòng theo dimensions, trả về partial {key tuple: vector thống kê}
+    theo thứ tự xuất hiện đầu tiên (giống GROUP BY không ORDER BY).
+    """
+    if row_count is None:
+        row_count = len(next(iter(columns.values()))) if columns else 0
+
+    if dimensions:
+        codes = np.zeros(row_count, dtype=np.int64)
+        uniques_per_dim = []
+        for dimension in dimensions:
+            dim_codes, uniques = _factorize(dimension_values(columns, dimension))
+            codes = codes * max(len(uniques), 1) + dim_codes
+            uniques_per_dim.append(uniques)
+        codes, combined = pd.factorize(codes)
+        keys = []
+        for c in combined:
+            key = []
+            for uniques in reversed(uniques_per_dim):
+                c, idx = divmod(int(c), max(len(uniques), 1))
+                key.append(uniques[idx])
+            keys.append(tuple(reversed(key)))
+    else:
+        codes = np.zeros(row_count, dtype=np.int64)
+        keys = [()] if row_count else []
+
+    k = len(keys)
+    stats = np.zeros((k, STATS_SIZE))
+    if k == 0:
+        return {}
+
+    stats[:, 0] = np.bincount(codes, minlength=k)
+    for i, m in enumerate(MEASURES):
+        if m not in measures:
+            continue
+        values = columns[m]
+        mask = ~np.isnan(values)
+        stats[:, 1 + 2 * i] = np.bincount(codes, weights=np.where(mask, values, 0.0), minlength=k)
+        stats[:, 2 + 2 * i] = np.bincount(codes, weights=mask, minlength=k)
+
+    return {key: stats[j] for j, key in enumerate(keys)}
+
+
+def merge_partials(target, partial):
+    return merge_items(target, partial.items())
+
+
+def merge_items(target, items):
+    """Cộng các (key, stats) vào target; key cùng group_key gộp vào nhãn đã có trong target"""
+    labels = {group_key(key): key for key in target}
+    for key, stats in items:
+        label = labels.setdefault(group_key(key), key)
+        if label in target:
+            target[label] = target[label] + stats
+        else:
+            target[label] = np.array(stats, dtype=float)
+    return target
+
+
+def metric_value(metric, stats):
+    kind, column = METRICS[metric]
+    n = stats[0]
+    if kind == "count":
+        return int(n)
+
+    i = MEASURES.index(column)
+    total, cnt = stats[1 + 2 * i], stats[2 + 2 * i]
+    if cnt == 0:
+        return None
+    if kind == "sum":
+        return int(total) if column == "prediction" else float(total)
+    if kind == "rate":
+        return float(total / n * 100)
+    return float(total / cnt)
+
+
+def _sort_key(dimensions):
+    def key(item):
+        out = []
+        for value, dimension in zip(item[0], dimensions):
+            order = DIMENSIONS[dimension][2]
+            if order is not None:
+                out.append((True, order.index(value)))
+            else:
+                # NULL đứng đầu như ORDER BY của MySQL, chuỗi theo collation
+                out.append((value is not None, collation_key(value) if value is not None else 0))
+        return out
+    return key
+
+
+def finalize_section(section, partial):
+    _, _, keys, metrics, ordered = section
+    dimensions = [d for _, d in keys]
+    items = list(partial.items())
+    if ordered:
+        items.sort(key=_sort_key(dimensions))
+
+    out = []
+    for key, stats in items:
+        if stats[0] == 0:
+            continue
+        row = {alias: value for (alias, _), value in zip(keys, key)}
+        for alias, metric in metrics:
+            row[alias] = metric_value(metric, stats)
+        out.append(row)
+    return out
+
+
+def finalize_kpi(stats):
+    if stats is None:
+        stats = np.zeros(STATS_SIZE)
+    default_rate = metric_value("default_rate", stats)
+    return {
+        "total_loans": int(stats[0]),
+        "avg_credit_score": metric_value("avg_credit_score", stats),
+        "avg_loan_amount": metric_value("avg_loan_amount", stats),
+        "default_rate_percent": default_rate if default_rate is not None else 0.0,
+        "model_accuracy": MODEL_ACCURACY,
+    }
+
+
+def compute_partials(columns):
+    """Tính partial cho KPI và từng section từ các cột đã fetch"""
+    partials = {"kpi": accumulate(columns, [], KPI_MEASURES)}
+    for section in SECTIONS:
+        dimensions = [d for _, d in section[2]]
+        partials[section[1]] = accumulate(columns, dimensions, section_measures(section))
+    return partials
+
+
+def build_dashboard(partials):
+    data = {"kpi": finalize_kpi(partials.get("kpi", {}).get(()))}
+    for section in SECTIONS:
+        group, name = section[0], section[1]
+        data.setdefault(group, {})[name] = finalize_section(section, partials.get(name, {}))
+    return data
+
+
+def dashboard_from_rows(names, rows):
+    return build_dashboard(compute_partials(columns_from_rows(names, rows)))
+
+
+def get_dashboard_data(db: Session, month: Optional[str] = None, year: Optional[int] = None):
+    columns = fetch_columns(db, month, year)
+    return build_dashboard(compute_partials(columns))
+
+
+async def get_dashboard_data_async(db, month: Optional[str] = None, year: Optional[int] = None):
+    names, sql, params = scan_query(month, year)
+    rows = (await db.execute(sql, params)).fetchall()
+    return await in_executor(dashboard_from_rows, names, rows)
@@ -1,3 +1,4 @@
+import logging
 import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
@@ -7,17 +8,60 @@ from urllib.parse import quote_plus
 dotenv_path = os.path.join(os.path.dirname(__file__), ".env")
 load_dotenv(dotenv_path)
 
+logger = logging.getLogger(__name__)
+
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = quote_plus(os.getenv("DB_PASSWORD", "@Obama123"))  # ← ĐÃ ESCAPE
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "3306")
 DB_NAME = os.getenv("DB_NAME", "loan_prediction")
 
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL ghi đè toàn bộ (VD: sqlite:///loans.db khi test / benchmark)
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+)
+
+# Cấu hình pool / log SQL qua biến môi trường
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+
+# DB_ASYNC=1: các route DB chính chạy trên AsyncSession (routers/async_routes.py)
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+
+logger.info("Connecting to: %s", SQLALCHEMY_DATABASE_URL.replace(DB_PASSWORD, "****"))
+
+
+def engine_options(url: str) -> dict:
+    options = {"echo": DB_ECHO}
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_pre_ping=True,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    else:
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+
+def async_url(url: str) -> str:
+    """Đổi driver sync sang driver async tương ứng (aiomysql / aiosqlite)"""
+    if url.startswith("mysql+pymysql://"):
+        return "mysql+aiomysql://" + url[len("mysql+pymysql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
 
-print("Connecting to:", SQLALCHEMY_DATABASE_URL.replace(DB_PASSWORD, "****"))  # Debug
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True, echo=True)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_url(SQLALCHEMY_DATABASE_URL))
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -27,5 +71,23 @@ def get_db():
         yield db
     finally:
         db.close()
-print("DEBUG DB_USER =", os.getenv("DB_USER"))
-print("DEBUG DB_PASSWORD =", os.getenv("DB_PASSWORD"))
+
+
+# Engine async được tạo lazy: chỉ cần cài aiomysql / aiosqlite khi DB_ASYNC=1
+async_engine = None
+AsyncSessionLocal = None
+
+def get_async_sessionmaker():
+    global async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        options = engine_options(ASYNC_DATABASE_URL)
+        options.pop("connect_args", None)
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, **options)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return AsyncSessionLocal
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
@@ -0,0 +1,496 @@
+"""
+Theo dõi drift của traffic dự đoán: phân phối input của /loans/predict (và
+xác suất model trả về) so với baseline, giữ bằng sketch kích thước cố định.
+
+- Cột số (income, Credit_Score, LTV, rate_of_interest, ...) và probability:
+  histogram với biên bin cố định = phân vị của baseline, thêm 1 bin NULL
+- Cột phân loại: đếm theo giá trị, tối đa DRIFT_MAX_CATEGORIES giá trị / cột
+  (phần dư gộp vào OTHER)
+- Sketch cộng được với nhau (merge), bộ nhớ O(số cột x số bin) không phụ thuộc
+  lượng traffic; mỗi hồ sơ chỉ tốn vài bisect + tăng bộ đếm
+- Baseline dựng từ bảng loans (đọc theo khúc id) hoặc chốt từ traffic hiện tại.
+  Bảng loans lưu giá trị đã chuẩn hóa (VD Gender "Joint" -> "Sex Not Av") nên
+  baseline từ loans lệch nhẹ ở các cột đó; POST /monitoring/drift/baseline?source=live
+  để chốt lại từ traffic thật
+- GET /monitoring/drift: PSI từng cột, KS (từ CDF của histogram) cho cột số
+- Sketch được lưu ra DRIFT_STATE_PATH mỗi DRIFT_PERSIST_INTERVAL giây và lúc
+  shutdown, load lại khi khởi động (chưa có file thì dựng baseline từ loans)
+
+Cấu hình:
+- DRIFT_MONITOR=0: tắt
+- DRIFT_SAMPLE_RATE: tỉ lệ hồ sơ được đưa vào sketch (mặc định 1.0)
+- DRIFT_BINS: số bin của cột số (mặc định 20)
+- DRIFT_PSI_WARN / DRIFT_PSI_ALERT: ngưỡng PSI (mặc định 0.1 / 0.25)
+- DRIFT_MIN_SAMPLES: số hồ sơ tối thiểu trước khi đánh giá (mặc định 200)
+"""
+import bisect
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+import schemas
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DRIFT_MONITOR = os.getenv("DRIFT_MONITOR", "1") == "1"
+DRIFT_STATE_PATH = os.getenv("DRIFT_STATE_PATH", os.path.join(BASE_DIR, "spool", "drift_state.json"))
+DRIFT_PERSIST_INTERVAL = float(os.getenv("DRIFT_PERSIST_INTERVAL", "60"))
+DRIFT_SAMPLE_RATE = float(os.getenv("DRIFT_SAMPLE_RATE", "1.0"))
+DRIFT_BINS = int(os.getenv("DRIFT_BINS", "20"))
+DRIFT_MAX_CATEGORIES = int(os.getenv("DRIFT_MAX_CATEGORIES", "100"))
+DRIFT_PSI_WARN = float(os.getenv("DRIFT_PSI_WARN", "0.1"))
+DRIFT_PSI_ALERT = float(os.getenv("DRIFT_PSI_ALERT", "0.25"))
+DRIFT_MIN_SAMPLES = int(os.getenv("DRIFT_MIN_SAMPLES", "200"))
+
+BASELINE_CHUNK_SIZE = 50000
+# Số dòng lấy mẫu (cách đều theo id) để tính biên bin
+EDGE_SAMPLE_SIZE = 50000
+# Tỉ lệ tối thiểu của 1 bin khi tính PSI (tránh log(0))
+PSI_EPSILON = 1e-4
+
+NULL, OTHER = "null", "__other__"
+
+_FIELDS = schemas.LoanBase.model_fields
+NUMERIC_FEATURES = [name for name, field in _FIELDS.items() if field.annotation == Optional[float]]
+CATEGORICAL_FEATURES = [name for name, field in _FIELDS.items() if field.annotation == Optional[str]]
+PROBABILITY = "probability"
+
+
+class Histogram:
+    """Đếm theo bin cố định: bin i = [edges[i-1], edges[i]), bin cuối = NULL / NaN"""
+
+    def __init__(self, edges: list, counts: list = None):
+        self.edges = list(edges)
+        self.counts = list(counts) if counts is not None else [0] * (len(self.edges) + 2)
+
+    def add(self, value):
+        if value is None or value != value:
+            self.counts[-1] += 1
+        else:
+            self.counts[bisect.bisect_right(self.edges, value)] += 1
+
+    def add_array(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        null = np.isnan(values)
+        bins = np.searchsorted(self.edges, values[~null], side="right")
+        counts = np.bincount(bins, minlength=len(self.edges) + 1)
+        for i, n in enumerate(counts):
+            self.counts[i] += int(n)
+        self.counts[-1] += int(null.sum())
+
+    def merge(self, other: "Histogram"):
+        if other.edges != self.edges:
+            raise ValueError("Cannot merge histograms with different bin edges")
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+
+    def empty_copy(self) -> "Histogram":
+        return Histogram(self.edges)
+
+    def to_dict(self):
+        return {"edges": self.edges, "counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data["edges"], data["counts"])
+
+
+class CategoryCounts:
+    """Đếm theo giá trị; quá max_values giá trị khác nhau thì gộp vào OTHER"""
+
+    def __init__(self, counts: dict = None, max_values: int = DRIFT_MAX_CATEGORIES):
+        self.counts = dict(counts or {})
+        self.max_values = max_values
+
+    def _key(self, value) -> str:
+        key = NULL if value is None else str(value)
+        if key not in self.counts and len(self.counts) >= self.max_values:
+            return OTHER
+        return key
+
+    def add(self, value, n: int = 1):
+        key = self._key(value)
+        self.counts[key] = self.counts.get(key, 0) + n
+
+    def merge(self, other: "CategoryCounts"):
+        for value, n in other.counts.items():
+            self.add(None if value == NULL else value, n)
+
+    def empty_copy(self) -> "CategoryCounts":
+        return CategoryCounts(max_values=self.max_values)
+
+    def to_dict(self):
+        return {"counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data["counts"])
+
+
+class DriftSketches:
+    """Sketch của mọi feature + probability cho 1 tập hồ sơ (baseline hoặc traffic)"""
+
+    def __init__(self, numeric: dict, categorical: dict, n: int = 0):
+        self.numeric = numeric
+        self.categorical = categorical
+        self.n = n
+        # Tham chiếu sẵn list biên / list đếm (được sửa tại chỗ) cho vòng lặp nóng
+        self._slots = [(c, h.edges, h.counts) for c, h in numeric.items()]
+        self._category_slots = [(c, v.counts, v.max_values) for c, v in categorical.items()]
+
+    @classmethod
+    def with_edges(cls, edges: dict):
+        return cls({c: Histogram(e) for c, e in edges.items()},
+                   {c: CategoryCounts() for c in CATEGORICAL_FEATURES})
+
+    def observe(self, features: dict, probability):
+        """Như Histogram.add / CategoryCounts.add cho từng cột, viết gọn cho đường request"""
+        get = features.get
+        for column, edges, counts in self._slots:
+            value = probability if column == PROBABILITY else get(column)
+            if value is None or value != value:
+                counts[-1] += 1
+            else:
+                counts[bisect.bisect_right(edges, value)] += 1
+        for column, counts, max_values in self._category_slots:
+            value = get(column)
+            key = NULL if value is None else str(value)
+            n = counts.get(key)
+            if n is None:
+                n = 0
+                if len(counts) >= max_values:
+                    key = OTHER
+                    n = counts.get(OTHER, 0)
+            counts[key] = n + 1
+        self.n += 1
+
+    def merge(self, other: "DriftSketches"):
+        for column, hist in self.numeric.items():
+            hist.merge(other.numeric[column])
+        for column, counts in self.categorical.items():
+            counts.merge(other.categorical[column])
+        self.n += other.n
+
+    def empty_copy(self) -> "DriftSketches":
+        return DriftSketches({c: h.empty_copy() for c, h in self.numeric.items()},
+                             {c: v.empty_copy() for c, v in self.categorical.items()})
+
+    def to_dict(self):
+        return {
+            "n": self.n,
+            "numeric": {c: h.to_dict() for c, h in self.numeric.items()},
+            "categorical": {c: v.to_dict() for c, v in self.categorical.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls({c: Histogram.from_dict(h) for c, h in data["numeric"].items()},
+                   {c: CategoryCounts.from_dict(v) for c, v in data["categorical"].items()},
+                   data["n"])
+
+
+# --- so sánh phân phối ---------------------------------------------------------
+
+def psi(expected: list, actual: list) -> float:
+    """Population Stability Index giữa 2 vector đếm cùng thứ tự bin"""
+    e = np.asarray(expected, dtype=float)
+    a = np.asarray(actual, dtype=float)
+    if e.sum() == 0 or a.sum() == 0:
+        return float("nan")
+    e = np.clip(e / e.sum(), PSI_EPSILON, None)
+    a = np.clip(a / a.sum(), PSI_EPSILON, None)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def ks(expected: list, actual: list) -> float:
+    """KS xấp xỉ: max |CDF| tại các biên bin (bỏ bin NULL), là cận dưới của KS thật"""
+    e = np.asarray(expected[:-1], dtype=float)
+    a = np.asarray(actual[:-1], dtype=float)
+    if e.sum() == 0 or a.sum() == 0:
+        return float("nan")
+    return float(np.max(np.abs(np.cumsum(e) / e.sum() - np.cumsum(a) / a.sum())))
+
+
+def _status(value: float, enough: bool) -> str:
+    if not enough or math.isnan(value):
+        return "insufficient_data"
+    if value >= DRIFT_PSI_ALERT:
+        return "drift"
+    if value >= DRIFT_PSI_WARN:
+        return "warn"
+    return "ok"
+
+
+def _round(value: float):
+    return None if math.isnan(value) else round(value, 6)
+
+
+def compare(baseline: DriftSketches, live: DriftSketches, min_samples: int = DRIFT_MIN_SAMPLES) -> dict:
+    enough = live.n >= min_samples
+    features = {}
+    for column, base in baseline.numeric.items():
+        current = live.numeric[column].counts
+        value = psi(base.counts, current)
+        features[column] = {
+            "type": "numeric", "psi": _round(value), "ks": _round(ks(base.counts, current)),
+            "null_rate": current[-1] / live.n if live.n else None, "status": _status(value, enough),
+        }
+    for column, base in baseline.categorical.items():
+        current = live.categorical[column].counts
+        keys = sorted(set(base.counts) | set(current))
+        value = psi([base.counts.get(k, 0) for k in keys], [current.get(k, 0) for k in keys])
+        features[column] = {
+            "type": "categorical", "psi": _round(value),
+            "unseen": sorted(k for k in current if k not in base.counts),
+            "status": _status(value, enough),
+        }
+    return features
+
+
+# --- baseline từ bảng loans ------------------------------------------------------
+
+def quantile_edges(values: np.ndarray, bins: int = DRIFT_BINS) -> list:
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return []
+    return np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1])).tolist()
+
+
+def _stored_to_input(column: str, value):
+    """Giá trị lưu trong bảng loans -> giá trị như input của /loans/predict"""
+    from model_loader import features_from_loan
+
+    return features_from_loan({column: value}).get(column)
+
+
+def baseline_from_loans(db, chunk_size: int = BASELINE_CHUNK_SIZE, bins: int = DRIFT_BINS) -> DriftSketches:
+    """2 lần đọc bảng loans: mẫu cách đều theo id để lấy biên bin, rồi đếm theo khúc id"""
+    numeric = NUMERIC_FEATURES + [PROBABILITY]
+    total = db.execute(text("SELECT COUNT(*) FROM loans")).scalar() or 0
+    step = max(1, total // EDGE_SAMPLE_SIZE)
+    sample = db.execute(text(f"SELECT {', '.join(numeric)} FROM loans WHERE id % :step = 0"),
+                        {"step": step}).fetchall()
+    sample = np.array(sample, dtype=float).reshape(-1, len(numeric))
+    sketches = DriftSketches.with_edges({c: quantile_edges(sample[:, i], bins) for i, c in enumerate(numeric)})
+
+    columns = numeric + CATEGORICAL_FEATURES
+    sql = text(f"SELECT id, {', '.join(columns)} FROM loans WHERE id > :last_id ORDER BY id LIMIT :limit")
+    mapped = {c: {} for c in CATEGORICAL_FEATURES}
+    last_id = 0
+    while True:
+        rows = db.execute(sql, {"last_id": last_id, "limit": chunk_size}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        frame = pd.DataFrame([tuple(r[1:]) for r in rows], columns=columns)
+        for column in numeric:
+            sketches.numeric[column].add_array(pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=float))
+        for column in CATEGORICAL_FEATURES:
+            cache = mapped[column]
+            for value, n in frame[column].value_counts(dropna=False).items():
+                value = None if pd.isna(value) else value
+                if value not in cache:
+                    cache[value] = _stored_to_input(column, value)
+                sketches.categorical[column].add(cache[value], int(n))
+        sketches.n += len(rows)
+    return sketches
+
+
+class DriftMonitor:
+    def __init__(self, state_path: str = DRIFT_STATE_PATH, persist_interval: float = DRIFT_PERSIST_INTERVAL,
+                 sample_rate: float = DRIFT_SAMPLE_RATE):
+        self.state_path = state_path
+        self.persist_interval = persist_interval
+        self.sample_rate = sample_rate
+        self.baseline = None
+        self.baseline_info = {}
+        self.live = None
+        self.live_since = None
+        self.observed = 0
+        self.saved_at = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # --- ghi nhận traffic -------------------------------------------------------
+
+    def observe(self, records: list, results: list):
+        """Gọi sau mỗi lần chấm điểm; bỏ qua khi chưa có baseline (chưa có biên bin)"""
+        if self.live is None:
+            return
+        with timed("drift"), self._lock:
+            # Đọc live trong lock: promote_live có thể vừa biến sketch cũ thành baseline
+            live = self.live
+            for features, result in zip(records, results):
+                if "error" in result:
+                    continue
+                if self.sample_rate < 1 and random.random() >= self.sample_rate:
+                    continue
+                live.observe(features, result.get("probability"))
+                self.observed += 1
+            self._dirty = True
+
+    # --- baseline ----------------------------------------------------------------
+
+    def set_baseline(self, sketches: DriftSketches, source: str):
+        """Baseline mới -> traffic bắt đầu đếm lại với cùng biên bin"""
+        with self._lock:
+            self._replace_baseline(sketches, source)
+
+    def _replace_baseline(self, sketches: DriftSketches, source: str):
+        self.baseline = sketches
+        self.baseline_info = {"source": source, "built_at": time.time(), "n": sketches.n}
+        self.live = sketches.empty_copy()
+        self.live_since = time.time()
+        self._dirty = True
+
+    def build_baseline(self, db):
+        with timed("drift.baseline"):
+            sketches = baseline_from_loans(db)
+        self.set_baseline(sketches, "loans")
+        logger.info("Drift baseline built from %d loans", sketches.n)
+        return self.baseline_info
+
+    def promote_live(self):
+        """Chốt traffic đã ghi nhận làm baseline (VD sau khi đã xác nhận model mới ổn)"""
+        with self._lock:
+            if self.live is None or self.live.n == 0:
+                raise ValueError("No live traffic recorded yet")
+            self._replace_baseline(self.live, "live")
+            return self.baseline_info
+
+    def reset(self):
+        with self._lock:
+            if self.live is not None:
+                self.live = self.live.empty_copy()
+                self.live_since = time.time()
+                self._dirty = True
+
+    # --- đọc ---------------------------------------------------------------------
+
+    def report(self, min_samples: int = DRIFT_MIN_SAMPLES) -> dict:
+        with self._lock:
+            if self.baseline is None:
+                return {"ready": False, "baseline": None, "live": None, "features": {}}
+            features = compare(self.baseline, self.live, min_samples)
+            live = {"n": self.live.n, "since": self.live_since}
+        ranked = sorted((f for f in features if features[f]["psi"] is not None),
+                        key=lambda f: features[f]["psi"], reverse=True)
+        return {
+            "ready": True,
+            "baseline": self.baseline_info,
+            "live": live,
+            "min_samples": min_samples,
+            "thresholds": {"psi_warn": DRIFT_PSI_WARN, "psi_alert": DRIFT_PSI_ALERT},
+            "drifted": [f for f in ranked if features[f]["status"] == "drift"],
+            "top": ranked[:5],
+            "features": features,
+        }
+
+    def sketches(self) -> dict:
+        with self._lock:
+            return {
+                "baseline": self.baseline.to_dict() if self.baseline else None,
+                "live": self.live.to_dict() if self.live else None,
+            }
+
+    def stats(self):
+        return {
+            "ready": self.baseline is not None,
+            "observed": self.observed,
+            "live_n": self.live.n if self.live else 0,
+            "sample_rate": self.sample_rate,
+            "saved_at": self.saved_at,
+        }
+
+    # --- lưu / load -----------------------------------------------------------------
+
+    def save(self):
+        with self._lock:
+            if not self._dirty or self.baseline is None:
+                return
+            state = {
+                "baseline": self.baseline.to_dict(), "baseline_info": self.baseline_info,
+                "live": self.live.to_dict(), "live_since": self.live_since,
+            }
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+        self.saved_at = time.time()
+
+    def load(self) -> bool:
+        """Load baseline + cộng dồn sketch traffic đã lưu; False nếu chưa có file"""
+        if not os.path.exists(self.state_path):
+            return False
+        with open(self.state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        baseline = DriftSketches.from_dict(state["baseline"])
+        live = DriftSketches.from_dict(state["live"])
+        if set(baseline.numeric) != set(NUMERIC_FEATURES + [PROBABILITY]) \
+                or set(baseline.categorical) != set(CATEGORICAL_FEATURES):
+            logger.warning("Drift state in %s has a different feature set, ignoring it", self.state_path)
+            return False
+        with self._lock:
+            self.baseline, self.baseline_info = baseline, state["baseline_info"]
+            self.live, self.live_since = live, state["live_since"]
+        logger.info("Drift state loaded from %s (%d live samples)", self.state_path, live.n)
+        return True
+
+    def start(self, session_factory):
+        """Load state đã lưu (hoặc dựng baseline từ loans ở thread nền) + thread lưu định kỳ"""
+        def build():
+            db = session_factory()
+            try:
+                self.build_baseline(db)
+            except Exception as e:
+                logger.exception("Drift baseline error: %s", e)
+            finally:
+                db.close()
+
+        def persist():
+            while not self._stop.wait(self.persist_interval):
+                try:
+                    self.save()
+                except Exception as e:
+                    logger.warning("Drift state save error: %s", e)
+
+        try:
+            loaded = self.load()
+        except Exception as e:
+            logger.warning("Drift state load error, rebuilding baseline: %s", e)
+            loaded = False
+        self._stop.clear()
+        targets = [(persist, "drift-persist")] if self.persist_interval > 0 else []
+        if not loaded:
+            targets.append((build, "drift-baseline"))
+        for target, name in targets:
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.save()
+        except Exception as e:
+            logger.warning("Drift state save error: %s", e)
+
+
+monitor = DriftMonitor()
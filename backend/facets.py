@@ -0,0 +1,218 @@
+"""
+Facet index: giá trị khác nhau + số dòng của mọi cột phân loại trong bảng loans
+(các cột String, Year và term), giữ trong RAM cho dropdown filter / form dự đoán.
+
+- Dựng 1 lần bằng 1 câu GROUP BY trên tất cả cột phân loại (đọc theo khúc),
+  cộng dồn số dòng theo từng cột bằng NumPy
+- Đếm theo dashboard_engine.collation_key như collation của bảng loans trên MySQL
+  ('North' / 'north' là 1 giá trị), nhãn là cách viết gặp đầu tiên
+- create_loan / bulk / write-behind / delete_loan cập nhật tăng dần (add / remove)
+- Response JSON được serialize sẵn, chỉ serialize lại sau khi có thay đổi
+  -> /facets và /dashboard/filters không chạm DB
+- FACETS_MAX_AGE (giây, 0 = không hết hạn): dựng lại định kỳ khi chạy nhiều
+  worker (ghi ở worker khác không tới được index của worker này)
+"""
+import calendar
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import String, text
+
+import models
+from dashboard_engine import collation_key
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+FACETS_MAX_AGE = float(os.getenv("FACETS_MAX_AGE", "0"))
+BUILD_FETCH_SIZE = 50000
+
+FACET_COLUMNS = [
+    c.name for c in models.Loan.__table__.columns
+    if isinstance(c.type, String) or c.name in ("Year", "term")
+]
+MONTH_ORDER = {collation_key(name): i for i, name in enumerate(calendar.month_name) if name}
+
+
+class FacetIndex:
+    def __init__(self, columns: list = FACET_COLUMNS):
+        self.columns = list(columns)
+        # Giá trị từ normalize_loans có thể khác kiểu cột: đổi như DB lưu để khớp
+        # với khóa đọc từ GROUP BY
+        table = models.Loan.__table__
+        self._convert = {c: str if isinstance(table.c[c].type, String) else int for c in self.columns}
+        # cột -> {collation_key: số dòng} và {collation_key: nhãn}
+        self.counts = {c: {} for c in self.columns}
+        self.labels = {c: {} for c in self.columns}
+        self.total = 0
+        self.built_at = None
+        self.build_seconds = None
+        self.version = 0
+        self._payload = None
+        self._lock = threading.RLock()
+        self._build_thread = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.built_at is not None
+
+    def build(self, db, fetch_size: int = BUILD_FETCH_SIZE):
+        """1 câu GROUP BY theo mọi cột phân loại, rồi cộng số dòng về từng cột"""
+        names = ", ".join(self.columns)
+        sql = text(f"SELECT {names}, COUNT(*) FROM loans GROUP BY {names}")
+        start = time.perf_counter()
+        with self._lock, timed("facets.build"):
+            counts = {c: {} for c in self.columns}
+            labels = {c: {} for c in self.columns}
+            total = 0
+            result = db.execute(sql)
+            while True:
+                rows = result.fetchmany(fetch_size)
+                if not rows:
+                    break
+                weights = np.array([r[-1] for r in rows], dtype=np.int64)
+                total += int(weights.sum())
+                for i, column in enumerate(self.columns):
+                    _accumulate(counts[column], labels[column], [r[i] for r in rows], weights)
+
+            self.counts, self.labels, self.total = counts, labels, total
+            self.built_at = time.time()
+            self.build_seconds = time.perf_counter() - start
+            self._changed()
+
+    def build_async(self, session_factory):
+        """Dựng nền lúc startup; request tới trước khi xong sẽ chờ ở lock"""
+        def run():
+            db = session_factory()
+            try:
+                self.ensure_built(db)
+            except Exception as e:
+                logger.exception("Facet build error: %s", e)
+            finally:
+                db.close()
+
+        if self._build_thread is None:
+            self._build_thread = threading.Thread(target=run, name="facet-build", daemon=True)
+            self._build_thread.start()
+
+    def invalidate(self):
+        """Đánh dấu cần dựng lại ở lần đọc kế tiếp (ensure_built)"""
+        with self._lock:
+            self.built_at = None
+
+    def ensure_built(self, db):
+        if not self.loaded or (FACETS_MAX_AGE > 0 and time.time() - self.built_at > FACETS_MAX_AGE):
+            with self._lock:
+                if not self.loaded or (FACETS_MAX_AGE > 0 and time.time() - self.built_at > FACETS_MAX_AGE):
+                    self.build(db)
+
+    def _apply(self, rows: list, sign: int):
+        with self._lock:
+            if not self.loaded or not rows:
+                return
+            for column in self.columns:
+                counts, labels, convert = self.counts[column], self.labels[column], self._convert[column]
+                for row in rows:
+                    value = row.get(column)
+                    if value is not None:
+                        value = convert(value)
+                    key = collation_key(value)
+                    n = counts.get(key, 0) + sign
+                    if n > 0:
+                        counts[key] = n
+                        labels.setdefault(key, value)
+                    else:
+                        counts.pop(key, None)
+                        labels.pop(key, None)
+            self.total += sign * len(rows)
+            self._changed()
+
+    def add(self, rows: list):
+        """Các loan vừa ghi (dict theo cột bảng loans)"""
+        self._apply(rows, +1)
+
+    def remove(self, rows: list):
+        self._apply(rows, -1)
+
+    def _changed(self):
+        self.version += 1
+        self._payload = None
+
+    # --- đọc -------------------------------------------------------------------
+
+    def _sorted_values(self, column: str) -> list:
+        """Year / Month theo thời gian, cột khác theo số dòng giảm dần"""
+        labels = self.labels[column]
+        items = [(labels[k], n) for k, n in self.counts[column].items()]
+        if column == "Year":
+            key = lambda item: (item[0] is None, item[0] or 0)
+        elif column == "Month":
+            key = lambda item: (MONTH_ORDER.get(collation_key(item[0]), 13), str(item[0]))
+        else:
+            key = lambda item: (-item[1], str(item[0]))
+        return [{"value": value, "count": count} for value, count in sorted(items, key=key)]
+
+    def facets(self, columns: list = None) -> dict:
+        with self._lock:
+            return {
+                "total": self.total,
+                "version": self.version,
+                "columns": {c: self._sorted_values(c) for c in (columns or self.columns)},
+            }
+
+    def payload(self) -> bytes:
+        """JSON của facets() cho mọi cột, serialize lại chỉ khi index thay đổi"""
+        payload = self._payload
+        if payload is None:
+            with self._lock:
+                payload = self._payload = json.dumps(self.facets(), default=str).encode()
+        return payload
+
+    def filters(self) -> dict:
+        """Year / Month đang có dữ liệu cho dropdown của dashboard"""
+        with self._lock:
+            return {
+                "years": [v["value"] for v in self._sorted_values("Year") if v["value"] is not None],
+                "months": [v["value"] for v in self._sorted_values("Month") if v["value"] is not None],
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "built_at": self.built_at,
+                "build_seconds": self.build_seconds,
+                "total": self.total,
+                "version": self.version,
+                "columns": len(self.columns),
+                "values": sum(len(c) for c in self.counts.values()),
+            }
+
+
+def _accumulate(counts: dict, labels: dict, values: list, weights: np.ndarray):
+    """
+    counts[collation_key(value)] += tổng weights theo từng value (NULL giữ là None),
+    labels giữ cách viết gặp đầu tiên của mỗi khóa
+    """
+    array = np.array(values, dtype=object)
+    is_null = np.array([v is None for v in values], dtype=bool)
+    if is_null.any():
+        counts[None] = counts.get(None, 0) + int(weights[is_null].sum())
+        labels[None] = None
+        array, weights = array[~is_null], weights[~is_null]
+    if len(array) == 0:
+        return
+    uniques, first, inverse = np.unique(array, return_index=True, return_inverse=True)
+    sums = np.bincount(inverse, weights=weights)
+    for i in np.argsort(first, kind="stable"):
+        value = uniques[i]
+        key = collation_key(value)
+        labels.setdefault(key, value)
+        counts[key] = counts.get(key, 0) + int(sums[i])
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,148 @@
+"""
+Xuất bảng loans dạng stream (GET /loans/export): đọc bằng server-side cursor
+theo từng chunk cố định rồi encode ngay thành CSV / NDJSON / Parquet, nên bộ
+nhớ không tăng theo kích thước bảng.
+
+Parquet cần pyarrow (tùy chọn); mỗi chunk được ghi thành 1 row group.
+"""
+import csv
+import io
+import json
+import os
+
+import models
+from database import SessionLocal
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+COLUMNS = list(models.Loan.__table__.columns)
+COLUMN_NAMES = [c.name for c in COLUMNS]
+
+
+def has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def iter_chunks(build_query, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    build_query(db) trả về Query đã filter; chạy trong session riêng vì
+    generator còn chạy sau khi request handler đã return.
+    """
+    db = SessionLocal()
+    try:
+        query = (
+            build_query(db)
+            .with_entities(*COLUMNS)
+            .order_by(models.Loan.id.asc())
+            .yield_per(chunk_size)  # stream_results -> SSCursor với MySQL
+        )
+        chunk = []
+        for row in query:
+            chunk.append(tuple(row))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        db.close()
+
+
+def csv_stream(chunks):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMN_NAMES)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def ndjson_stream(chunks):
+    for chunk in chunks:
+        yield "".join(
+            json.dumps(dict(zip(COLUMN_NAMES, row)), default=str) + "\n" for row in chunk
+        ).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """File giả cho ParquetWriter: giữ phần đã ghi tới lần drain() kế tiếp, tell() vẫn đúng vị trí tuyệt đối"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    from sqlalchemy import Float, Integer
+
+    fields = []
+    for column in COLUMNS:
+        if isinstance(column.type, Integer):
+            fields.append(pa.field(column.name, pa.int64()))
+        elif isinstance(column.type, Float):
+            fields.append(pa.field(column.name, pa.float64()))
+        else:
+            fields.append(pa.field(column.name, pa.string()))
+    return pa.schema(fields)
+
+
+def parquet_stream(chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            table = pa.Table.from_arrays(
+                [pa.array(list(col), type=field.type) for col, field in zip(columns, schema)],
+                schema=schema,
+            )
+            writer.write_table(table)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+STREAMS = {"csv": csv_stream, "ndjson": ndjson_stream, "parquet": parquet_stream}
+
+
+def export_stream(fmt: str, build_query, chunk_size: int = EXPORT_CHUNK_SIZE):
+    return STREAMS[fmt](iter_chunks(build_query, chunk_size))
@@ -1,39 +1,155 @@
-from fastapi import FastAPI, Depends
+import logging
+import os
+
+# Cấu hình log trước khi import các module khác (database log lúc import)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+
+from fastapi import FastAPI, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 import traceback
 from fastapi import HTTPException
 
-from database import Base, engine, get_db, SessionLocal
-from routers import loans
+from database import Base, engine, get_db, SessionLocal, DB_ASYNC
+from routers import loans, analytics, models_admin, dashboard, monitoring
+from model_registry import registry
 import models
 import crud
-from fastapi.responses import RedirectResponse
+import migrations
+from dashboard_cache import dashboard_cache, etag_response
+from analytics_snapshot import snapshot
+from facets import facet_index
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse
+import metrics
+import model_loader
+import write_behind
+import drift_monitor
+from prediction_batcher import batcher
 
-Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 app = FastAPI(title="Loan Prediction API", version="1.1")
 
+# DB_ASYNC=1: các route DB chạy trên AsyncSession; đăng ký trước để được match
+# trước route sync cùng path
+if DB_ASYNC:
+    from routers import async_routes
+    app.include_router(async_routes.router)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor", "ETag"],
 )
+# Thêm sau CORS để bọc ngoài cùng: đo cả thời gian của các middleware khác
+app.add_middleware(metrics.TimingMiddleware)
+
+
+def collect_runtime_metrics():
+    """Các bộ đếm sẵn có (cache, batcher, shadow) cho /metrics"""
+    families = []
+    for name, cache in (("prediction", model_loader.prediction_cache),
+                        ("explanation", model_loader.explanation_cache),
+                        ("dashboard", dashboard_cache)):
+        stats = cache.stats()
+        families.append((f"{name}_cache_hits_total", "counter", f"{name} cache hits", {(): stats["hits"]}))
+        families.append((f"{name}_cache_misses_total", "counter", f"{name} cache misses", {(): stats["misses"]}))
+        families.append((f"{name}_cache_entries", "gauge", f"{name} cache size", {(): stats["size"]}))
+    families.append(("predict_batches_total", "counter", "Micro-batches run by the prediction batcher",
+                     {(): batcher.batches}))
+    families.append(("shadow_dropped_total", "counter", "Shadow samples dropped because the queue was full",
+                     {(): model_loader.shadow_dropped}))
+    wb = write_behind.writer.stats()
+    families.append(("write_behind_queue_depth", "gauge", "Loans waiting for group commit",
+                     {(): wb["queue_depth"]}))
+    families.append(("write_behind_persisted_total", "counter", "Loans persisted by group commit",
+                     {(): wb["persisted"]}))
+    families.append(("write_behind_rejected_total", "counter", "Loans rejected because the queue was full",
+                     {(): wb["rejected"]}))
+    facets = facet_index.stats()
+    families.append(("facet_values", "gauge", "Distinct categorical values held by the facet index",
+                     {(): facets["values"]}))
+    if drift_monitor.DRIFT_MONITOR and drift_monitor.monitor.baseline is not None:
+        report = drift_monitor.monitor.report()
+        families.append(("drift_psi", "gauge", "PSI of live prediction inputs against the drift baseline",
+                         {(("feature", name),): f["psi"] for name, f in report["features"].items()
+                          if f["psi"] is not None}))
+        families.append(("drift_live_samples", "gauge", "Predictions in the current drift window",
+                         {(): report["live"]["n"]}))
+    families.append(("model_ready", "gauge", "1 when the active model is loaded",
+                     {(("version", registry.version or ""),): int(registry.ready)}))
+    return families
+
+
+metrics.register_collector(collect_runtime_metrics)
+
+# Model được load nền lúc startup, request đầu tiên không phải chờ unpickle
+@app.on_event("startup")
+def warmup_model():
+    if os.getenv("MODEL_WARMUP", "1") == "1":
+        registry.warmup_async()
+    # MODEL_WATCH_INTERVAL > 0: đổi version khi models/ACTIVE_VERSION thay đổi
+    registry.watch_async()
+    # WRITE_BEHIND=1: ghi lại các loan còn trong spool rồi chạy worker group commit
+    if write_behind.WRITE_BEHIND:
+        write_behind.writer.start()
+    # Facet index (giá trị filter) dựng nền bằng 1 câu GROUP BY
+    facet_index.build_async(SessionLocal)
+    # Drift monitor: load sketch đã lưu hoặc dựng baseline từ loans ở thread nền
+    if drift_monitor.DRIFT_MONITOR:
+        drift_monitor.monitor.start(SessionLocal)
+
+@app.on_event("shutdown")
+def flush_write_behind():
+    write_behind.writer.stop()
+    if drift_monitor.DRIFT_MONITOR:
+        drift_monitor.monitor.stop()
 
 @app.get("/")
 def root():
     return {"message": "Backend connected successfully"}
 
+# Định dạng text của Prometheus: histogram theo công đoạn / route + các bộ đếm
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/live")
+def liveness():
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+def readiness():
+    status = registry.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
 @app.get("/dashboard")
-def get_dashboard(month: str | None = None, year: int | None = None, db: Session = Depends(get_db)):
+def get_dashboard(request: Request, response: Response, month: str | None = None, year: int | None = None, db: Session = Depends(get_db)):
     """
     - Không filter: trả full DB
     - Có month/year: lọc theo Month, Year
+    - Cache theo (month, year), hỗ trợ ETag / If-None-Match -> 304
     """
-    return crud.get_dashboard_data(db, month, year)
+    data, etag = dashboard_cache.get((month, year), lambda: crud.get_dashboard_data(db, month, year))
+    return etag_response(request, response, data, etag)
+
+@app.get("/dashboard/cache")
+def get_dashboard_cache_stats():
+    return dashboard_cache.stats()
+
+# Trạng thái snapshot dạng cột (DASHBOARD_SOURCE=snapshot)
+@app.get("/dashboard/snapshot")
+def get_dashboard_snapshot_stats():
+    return snapshot.stats()
 
 
 @app.post("/login")
@@ -63,5 +179,9 @@ async def redirect_loans():
     return RedirectResponse(url="/loans/")
 
 app.include_router(loans.router)
+app.include_router(analytics.router)
+app.include_router(models_admin.router)
+app.include_router(dashboard.router)
+app.include_router(monitoring.router)
 
 
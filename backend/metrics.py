@@ -0,0 +1,189 @@
+"""
+Bộ đếm / histogram nhẹ, dùng chung cho các thống kê runtime của backend,
+và bề mặt đo đạc cho /metrics (định dạng text của Prometheus):
+
+- timed("stage"): context manager / decorator đo từng công đoạn
+  (validation, preprocessing, inference, dashboard.*, db.commit)
+- TimingMiddleware: thời gian mỗi request theo method / route / status
+- debug_sampled(): chọn mẫu DEBUG_SAMPLE_RATE request để log ở hot path
+"""
+import bisect
+import os
+import random
+import threading
+import time
+from functools import wraps
+
+
+class Histogram:
+    """Histogram bucket cố định (kiểu Prometheus: bucket cộng dồn theo le)"""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        cumulative, buckets = 0, {}
+        for le, c in zip(self.buckets, counts):
+            cumulative += c
+            buckets[str(le)] = cumulative
+        buckets["+Inf"] = count
+        return {"buckets": buckets, "count": count, "sum": total}
+
+
+# --- Instrumentation: histogram có label, xuất dạng Prometheus ở /metrics ------
+# Đo bằng giây như quy ước Prometheus; observe() chỉ là bisect + cộng dưới lock.
+
+STAGE_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# Xác suất ghi log 1 request ở hot path (thay cho print vô điều kiện); 0 = tắt
+DEBUG_SAMPLE_RATE = float(os.getenv("DEBUG_SAMPLE_RATE", "0"))
+
+
+class LabeledHistogram:
+    """Một họ histogram cùng tên, mỗi bộ giá trị label 1 Histogram"""
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> Histogram:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, child in sorted(self._children.items()):
+            labels = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values)]
+            snap = child.snapshot()
+            for le, count in snap["buckets"].items():
+                bucket_labels = ",".join(labels + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+            suffix = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {snap['sum']}")
+            lines.append(f"{self.name}_count{suffix} {snap['count']}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_families = []
+# Hàm trả về list (tên, kiểu, help, {label tuple: giá trị}) cho các số đếm sẵn có
+_collectors = []
+
+
+def histogram(name: str, help: str, labelnames=(), buckets=STAGE_BUCKETS) -> LabeledHistogram:
+    family = LabeledHistogram(name, help, labelnames, buckets)
+    _families.append(family)
+    return family
+
+
+def register_collector(collect):
+    _collectors.append(collect)
+
+
+def render() -> str:
+    lines = []
+    for family in _families:
+        lines += family.render()
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in samples.items():
+                suffix = "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}" if labels else ""
+                lines.append(f"{name}{suffix} {value}")
+    return "\n".join(lines) + "\n"
+
+
+stage_seconds = histogram(
+    "loan_stage_duration_seconds", "Duration of request stages", ("stage",)
+)
+http_seconds = histogram(
+    "http_request_duration_seconds", "HTTP request duration by route", ("method", "route", "status")
+)
+
+
+class timed:
+    """
+    Đo 1 công đoạn vào stage_seconds{stage=...}; dùng làm context manager
+    (with timed("inference"): ...) hoặc decorator (@timed("db.commit")).
+    """
+
+    __slots__ = ("hist", "start")
+
+    def __init__(self, stage: str):
+        self.hist = stage_seconds.labels(stage)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start)
+        return False
+
+    def __call__(self, func):
+        hist = self.hist
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - start)
+        return wrapper
+
+
+class TimingMiddleware:
+    """Middleware ASGI đo mỗi request theo route template (không theo path thật)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_seconds.labels(scope["method"], route, str(status[0])).observe(time.perf_counter() - start)
+
+
+def debug_sampled() -> bool:
+    """True với xác suất DEBUG_SAMPLE_RATE; kiểm tra trước khi dựng message để khi tắt không tốn gì"""
+    return DEBUG_SAMPLE_RATE > 0 and random.random() < DEBUG_SAMPLE_RATE
@@ -0,0 +1,229 @@
+"""
+Migration schema có đánh version (thay cho Base.metadata.create_all).
+
+Mỗi migration chạy một lần, được ghi vào bảng schema_migrations, và viết
+idempotent (kiểm tra trước khi tạo) để chạy được cả trên DB mới lẫn DB đã
+import từ file dump.
+
+    cd backend && python migrations.py upgrade
+    cd backend && python migrations.py status
+    cd backend && python migrations.py explain
+    cd backend && python migrations.py backfill   # tính lại age_group / loan_amount_group
+"""
+import logging
+import sys
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.schema import CreateTable
+
+import models
+import rollups
+from dashboard_engine import GROUP_SQL
+from database import Base
+
+logger = logging.getLogger(__name__)
+
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(200)),
+    Column("applied_at", DateTime),
+)
+
+
+def _create_base_tables(conn):
+    Base.metadata.create_all(bind=conn)
+
+
+def _create_indexes(conn, table, names):
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name in names and index.name not in existing:
+            index.create(bind=conn)
+
+
+def _add_loan_filter_indexes(conn):
+    _create_indexes(conn, models.Loan.__table__, {"ix_loans_year_month_id", "ix_loans_month_id"})
+
+
+def _create_loan_rollups(conn):
+    models.LoanRollup.__table__.create(bind=conn, checkfirst=True)
+    rollups.rebuild(conn)
+
+
+BACKFILL_CHUNK_SIZE = 50000
+# Chuỗi số (VD "69.5", " 360 "); chuỗi khác -> NULL khi đổi kiểu cột
+NUMERIC_REGEXP = "^ *-?[0-9]+([.][0-9]*)? *$"
+
+
+def backfill_loan_groups(conn, chunk_size: int = BACKFILL_CHUNK_SIZE):
+    """Tính age_group / loan_amount_group cho mọi dòng loans, mỗi câu UPDATE 1 khoảng id"""
+    low, high = conn.execute(text("SELECT MIN(id), MAX(id) FROM loans")).one()
+    if low is None:
+        return 0
+    assignments = ", ".join(f"{column} = {expr}" for column, expr in GROUP_SQL.items())
+    sql = text(f"UPDATE loans SET {assignments} WHERE id >= :start AND id < :stop")
+    updated = 0
+    for start in range(low, high + 1, chunk_size):
+        updated += conn.execute(sql, {"start": start, "stop": start + chunk_size}).rowcount
+    return updated
+
+
+def _rebuild_sqlite_loans(conn, existing):
+    """SQLite không ALTER được kiểu cột: tạo lại bảng loans rồi chép dữ liệu (ép kiểu age / term)"""
+    table = models.Loan.__table__
+    conn.execute(text("ALTER TABLE loans RENAME TO loans_old"))
+    for name in [index["name"] for index in inspect(conn).get_indexes("loans_old")]:
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    # Chỉ tạo bảng, index tạo sau khi đã chép xong dữ liệu
+    conn.execute(CreateTable(table))
+
+    numeric = "(trim({0}) GLOB '[0-9]*' OR trim({0}) GLOB '-[0-9]*')"
+    expressions = {
+        "age": f"CASE WHEN {numeric.format('age')} THEN CAST(age AS REAL) END",
+        "term": f"CASE WHEN {numeric.format('term')} THEN CAST(ROUND(CAST(term AS REAL)) AS INTEGER) END",
+    }
+    names = [c.name for c in table.columns if c.name in existing]
+    select_list = ", ".join(expressions.get(name, name) for name in names)
+    conn.execute(text(f"INSERT INTO loans ({', '.join(names)}) SELECT {select_list} FROM loans_old"))
+    conn.execute(text("DROP TABLE loans_old"))
+
+
+def _alter_loans(conn, existing):
+    """MySQL: chuỗi không phải số -> NULL, '360.0' -> '360', rồi MODIFY kiểu + ADD cột nhóm"""
+    table = models.Loan.__table__
+    changes = []
+    for column in ("age", "term"):
+        if isinstance(existing[column]["type"], String):
+            conn.execute(text(f"UPDATE loans SET {column} = NULL WHERE {column} NOT REGEXP :pattern"),
+                         {"pattern": NUMERIC_REGEXP})
+            if column == "term":
+                conn.execute(text("UPDATE loans SET term = CAST(ROUND(term) AS CHAR) WHERE term LIKE '%.%'"))
+            changes.append(f"MODIFY {column} {table.c[column].type.compile(dialect=conn.dialect)} NULL")
+    for column in GROUP_SQL:
+        if column not in existing:
+            changes.append(f"ADD COLUMN {column} {table.c[column].type.compile(dialect=conn.dialect)} NULL")
+    if changes:
+        conn.execute(text(f"ALTER TABLE loans {', '.join(changes)}"))
+
+
+def _typed_loan_columns(conn):
+    existing = {c["name"]: c for c in inspect(conn).get_columns("loans")}
+    needs_change = any(isinstance(existing[c]["type"], String) for c in ("age", "term")) \
+        or any(c not in existing for c in GROUP_SQL)
+    if needs_change:
+        if conn.dialect.name == "sqlite":
+            _rebuild_sqlite_loans(conn, existing)
+        else:
+            _alter_loans(conn, existing)
+
+    count = backfill_loan_groups(conn)
+    logger.info("Backfilled age_group / loan_amount_group for %s loans", count)
+    _create_indexes(conn, models.Loan.__table__, {ix.name for ix in models.Loan.__table__.indexes})
+    rollups.rebuild(conn)
+
+
+def _rebuild_loan_rollups(conn):
+    # Dòng rollups cũ tách 'Central' / 'central' thành 2 nhóm (so khác collation của MySQL)
+    rollups.rebuild(conn)
+
+
+# (version, mô tả, hàm upgrade) - chỉ thêm mới vào cuối, không sửa migration cũ
+MIGRATIONS = [
+    (1, "Create base tables", _create_base_tables),
+    (2, "Add (Year, Month, id) and (Month, id) indexes on loans", _add_loan_filter_indexes),
+    (3, "Create loan_rollups and build it from loans", _create_loan_rollups),
+    (4, "Numeric age / term, persisted age_group / loan_amount_group with indexes", _typed_loan_columns),
+    (5, "Rebuild loan_rollups with case-insensitive keys", _rebuild_loan_rollups),
+]
+
+
+def applied_versions(conn):
+    migration_metadata.create_all(bind=conn)
+    return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def upgrade(engine):
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+
+    for version, description, fn in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.now(),
+            ))
+        logger.info("Applied migration %s: %s", version, description)
+
+
+def status(engine):
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+    return [(version, description, version in applied) for version, description, _ in MIGRATIONS]
+
+
+# Các query nóng cần dùng index: (tên, SQL, params)
+HOT_QUERIES = [
+    ("dashboard (month + year)",
+     "SELECT prediction, probability FROM loans WHERE Month = :month AND Year = :year",
+     {"month": "October", "year": 2025}),
+    ("dashboard (month)",
+     "SELECT prediction, probability FROM loans WHERE Month = :month",
+     {"month": "October"}),
+    ("loans page (year + month, keyset)",
+     "SELECT id FROM loans WHERE Year = :year AND Month = :month AND id > :after_id "
+     "ORDER BY id LIMIT 300",
+     {"year": 2025, "month": "October", "after_id": 0}),
+    ("dashboard age_group",
+     "SELECT age_group, COUNT(*), SUM(prediction), COUNT(prediction), SUM(Credit_Score), COUNT(Credit_Score) "
+     "FROM loans GROUP BY age_group",
+     {}),
+    ("dashboard loan_amount_group",
+     "SELECT loan_amount_group, COUNT(*), SUM(loan_amount), COUNT(loan_amount), SUM(prediction), "
+     "COUNT(prediction), SUM(probability), COUNT(probability) FROM loans GROUP BY loan_amount_group",
+     {}),
+]
+
+
+def explain(engine, sql, params):
+    """Trả về (plan dạng text, tên index được dùng hoặc None)"""
+    dialect = engine.dialect.name
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        rows = [dict(r._mapping) for r in conn.execute(text(prefix + sql), params)]
+
+    if dialect == "sqlite":
+        plan = "\n".join(r["detail"] for r in rows)
+        used = next((ix.name for ix in models.Loan.__table__.indexes if ix.name in plan), None)
+    else:
+        plan = "\n".join(str(r) for r in rows)
+        used = next((r.get("key") for r in rows if r.get("key")), None)
+    return plan, used
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    from database import engine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "upgrade":
+        upgrade(engine)
+    elif command == "status":
+        for version, description, applied in status(engine):
+            print(f"{version:>3} {'applied' if applied else 'pending':>8}  {description}")
+    elif command == "explain":
+        for name, sql, params in HOT_QUERIES:
+            plan, used = explain(engine, sql, params)
+            print(f"== {name}: index={used}\n{plan}\n")
+    elif command == "backfill":
+        with engine.begin() as conn:
+            count = backfill_loan_groups(conn)
+            rollups.rebuild(conn)
+        print(f"Backfilled age_group / loan_amount_group for {count} loans, rebuilt loan_rollups")
+    else:
+        print("Usage: python migrations.py [upgrade|status|explain|backfill]")
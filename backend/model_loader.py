@@ -1,69 +1,401 @@
-import joblib
 import pandas as pd
 import numpy as np
+import logging
 import os
-import os
+import time
+import json
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from model_registry import registry
+from metrics import debug_sampled, timed
+import drift_monitor
+
+logger = logging.getLogger(__name__)
+
+PREDICT_CACHE_SIZE = int(os.getenv("PREDICT_CACHE_SIZE", "10000"))
+PREDICT_CACHE_TTL = float(os.getenv("PREDICT_CACHE_TTL", "600"))
+# Encode dict -> float32 rồi đưa thẳng vào booster, bỏ qua pandas
+PREDICT_FAST_PATH = os.getenv("PREDICT_FAST_PATH", "1") == "1"
+# Batch lớn hơn ngưỡng này thì đường pandas (vector hóa theo cột) nhanh hơn
+PREDICT_FAST_PATH_MAX_ROWS = int(os.getenv("PREDICT_FAST_PATH_MAX_ROWS", "512"))
+# explain=true: số feature đóng góp nhiều nhất trả về, và kích thước cache giải thích
+EXPLAIN_TOP_K = int(os.getenv("EXPLAIN_TOP_K", "5"))
+EXPLAIN_CACHE_SIZE = int(os.getenv("EXPLAIN_CACHE_SIZE", "2000"))
+
+
+class PredictionCache:
+    """
+    Cache LRU + TTL cho kết quả dự đoán, key là hash của feature đã chuẩn hóa
+    và fingerprint của model đã chấm dòng đó (không phải model cache đang gắn:
+    request bắt đầu với v1 mà ghi sau khi đổi sang v2 thì key vẫn là của v1).
+    Gắn với fingerprint của model đang dùng: đổi model thì cache bị xóa.
+    """
+
+    def __init__(self, max_entries: int = PREDICT_CACHE_SIZE, ttl: float = PREDICT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fingerprint = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def bind(self, fingerprint: str):
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                self._data.clear()
+                self.fingerprint = fingerprint
+
+    def key(self, features: dict, fingerprint: str) -> str:
+        normalized = _normalize_features(features)
+        rate = normalized.get("rate_of_interest")
+        if isinstance(rate, (int, float)):
+            normalized["rate_of_interest_monthly"] = rate / 12
+        payload = json.dumps(normalized, sort_keys=True, default=str)
+        return hashlib.sha1(f"{fingerprint}|{payload}".encode()).hexdigest()
+
+    def get(self, key: str):
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: dict):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.fingerprint,
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+prediction_cache = PredictionCache()
+# Kết quả kèm toàn bộ đóng góp theo cột input; top_k được cắt khi trả về
+explanation_cache = PredictionCache(max_entries=EXPLAIN_CACHE_SIZE)
+
+
+def get_loaded_model():
+    """Model được load lazy qua model_registry; cache gắn với artifact đang dùng"""
+    loaded = registry.current()
+    prediction_cache.bind(loaded.fingerprint)
+    explanation_cache.bind(loaded.fingerprint)
+    return loaded
+
+
+def get_model():
+    return get_loaded_model().model
+
+
+def _normalize_features(features: dict) -> dict:
+    features = dict(features)
+    if "co_applicant_credit_type" in features:
+        features["co-applicant_credit_type"] = features.pop("co_applicant_credit_type")
+    return features
+
+
+def _build_frame(records: list) -> pd.DataFrame:
+    """Gộp nhiều hồ sơ thành 1 DataFrame (1 dòng / hồ sơ)"""
+    X = pd.DataFrame([_normalize_features(r) for r in records])
+    if "rate_of_interest" in X.columns:
+        X["rate_of_interest_monthly"] = X["rate_of_interest"] / 12
+    return X
+
+
+def _risk_levels(y_prob: np.ndarray) -> np.ndarray:
+    return np.select([y_prob > 0.7, y_prob > 0.4], ["high", "medium"], default="low")
+
+
+def _score_frame(X: pd.DataFrame, model=None) -> list:
+    """
+    Chấm điểm cả frame bằng 1 lần predict_proba; nhãn và risk_level
+    được suy ra từ xác suất (giống XGBClassifier.predict: prob > 0.5).
+    """
+    model = model if model is not None else get_model()
+    if not hasattr(model, "predict_proba"):
+        with timed("inference"):
+            y_pred = model.predict(X)
+        return [
+            {"prediction": int(p), "probability": None, "risk_level": "unknown"}
+            for p in y_pred
+        ]
+
+    classes = getattr(model, "classes_", np.array([0, 1]))
+    # Pipeline: ColumnTransformer nằm trong predict_proba nên tính cả vào inference
+    with timed("inference"):
+        y_prob = model.predict_proba(X)[:, 1]
+    return _results_from_proba(y_prob, classes)
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "models", "xgboost_model.pkl")
 
-print("Model loading from:", MODEL_PATH)
-model = joblib.load(MODEL_PATH)
-print("Model loaded successfully")
-print(">>> Model type:", type(model))
-if hasattr(model, "classes_"):
-    print(">>> Model classes:", model.classes_)
-else:
-    print(">>> No classes_ found")
+def _score_fast(records: list, loaded) -> list:
+    """Fast path: FeatureEncoder -> booster.inplace_predict (cùng kết quả với pipeline)"""
+    with timed("preprocessing"):
+        X = loaded.encoder.encode_batch(records)
+    with timed("inference"):
+        y_prob = loaded.booster.inplace_predict(X)
+    return _results_from_proba(y_prob, loaded.classes)
+
+
+def _score(records: list, loaded=None) -> list:
+    loaded = loaded or get_loaded_model()
+    start = time.perf_counter()
+    try:
+        if PREDICT_FAST_PATH and loaded.encoder is not None and len(records) <= PREDICT_FAST_PATH_MAX_ROWS:
+            results = _score_fast(records, loaded)
+        else:
+            with timed("preprocessing"):
+                X = _build_frame(records)
+            results = _score_frame(X, loaded.model)
+    except Exception:
+        registry.record(loaded.version, time.perf_counter() - start, len(records), error=True)
+        raise
+    registry.record(loaded.version, time.perf_counter() - start, len(records))
+    return results
+
+
+def score_with_model(loaded, records: list) -> list:
+    """Chấm điểm bằng 1 LoadedModel cụ thể (không qua registry / cache), VD job rescore"""
+    if loaded.encoder is not None and len(records) <= PREDICT_FAST_PATH_MAX_ROWS:
+        return _score_fast(records, loaded)
+    return _results_from_proba(loaded.model.predict_proba(_build_frame(records))[:, 1], loaded.classes)
+
+
+# Giá trị đã chuẩn hóa khi lưu (crud.normalize_loans) -> giá trị model được train
+_STORED_LOAN_LIMIT = {500000.0: "cf", 0.0: "ncf"}
+_STORED_GENDER = {"Sex Not Av": "Sex Not Available"}
+
+def features_from_loan(row: dict) -> dict:
+    """Dòng trong bảng loans -> input của model (như schemas.LoanBase)"""
+    features = {
+        k: v for k, v in row.items()
+        if k not in ("id", "Month", "Year", "prediction", "probability")
+    }
+    limit = features.get("loan_limit")
+    features["loan_limit"] = None if limit is None else _STORED_LOAN_LIMIT.get(float(limit))
+    features["Gender"] = _STORED_GENDER.get(features.get("Gender"), features.get("Gender"))
+    for k in ("age", "term"):
+        try:
+            features[k] = None if features.get(k) is None else float(features[k])
+        except ValueError:
+            features[k] = None
+    return features
+
+
+def _results_from_proba(y_prob: np.ndarray, classes: np.ndarray) -> list:
+    y_pred = classes[(y_prob > 0.5).astype(int)]
+    risk_level = _risk_levels(y_prob)
+
+    return [
+        {"prediction": int(p), "probability": round(float(pr), 4), "risk_level": str(r)}
+        for p, pr, r in zip(y_pred, y_prob, risk_level)
+    ]
 
 
 def predict(features: dict):
     try:
-        if "co_applicant_credit_type" in features:
-            features["co-applicant_credit_type"] = features.pop("co_applicant_credit_type")
+        return predict_batch([features])[0]
+    except Exception as e:
+        logger.exception("Prediction error: %s", e)
+        return {"error": str(e)}
 
 
-        X = pd.DataFrame([features])
-        print("=== Input DataFrame ===")
-        print(X.columns.tolist())
+def predict_batch(records: list, observe_drift: bool = True) -> list:
+    """
+    Chấm điểm nhiều hồ sơ, giữ đúng thứ tự đầu vào. Hồ sơ đã có trong
+    prediction_cache được trả luôn, phần còn lại chấm trong 1 lần gọi model.
+    observe_drift=False cho chấm điểm offline (nhập hàng loạt): không tính vào
+    traffic của /monitoring/drift.
+    """
+    if not records:
+        return []
+    loaded = get_loaded_model()
+    results = _cached_batch(records, loaded, prediction_cache, _score)
+    # Sketch phân phối input / probability cho /monitoring/drift (kể cả cache hit)
+    if observe_drift and drift_monitor.DRIFT_MONITOR:
+        drift_monitor.monitor.observe(records, results)
+    return [dict(r) for r in results]
 
 
-        if "rate_of_interest" in X.columns:
-            X["rate_of_interest_monthly"] = X["rate_of_interest"] / 12
-        y_pred = model.predict(X)[0]
+def _cached_batch(records: list, loaded, cache: PredictionCache, score) -> list:
+    keys = [cache.key(r, loaded.fingerprint) for r in records]
+    results = [cache.get(k) for k in keys]
+    missing = [i for i, r in enumerate(results) if r is None]
 
+    if missing:
+        scored = _score_records([records[i] for i in missing], loaded, score)
+        for i, result in zip(missing, scored):
+            results[i] = result
+            if "error" not in result:
+                cache.set(keys[i], result)
+    if debug_sampled():
+        logger.info("[sampled] scored %d rows (%d cached), input columns=%s, first result=%s",
+                    len(records), len(records) - len(missing), list(records[0]), results[0])
+    return results
 
-        y_prob = None
-        if hasattr(model, "predict_proba"):
-            y_prob = model.predict_proba(X)[0][1]
 
+def _score_records(records: list, loaded=None, score=None) -> list:
+    """Nếu cả batch lỗi thì chấm lại từng dòng để trả lỗi riêng cho dòng hỏng"""
+    score = score or _score
+    try:
+        return score(records, loaded)
+    except Exception as e:
+        logger.warning("Batch prediction error, falling back to per-row scoring: %s", e)
+
+    results = []
+    for record in records:
+        try:
+            results.append(score([record], loaded)[0])
+        except Exception as e:
+            results.append({"error": str(e)})
+    return results
+
+
+# --- Giải thích (TreeSHAP) ----------------------------------------------------
+# booster.predict(pred_contribs=True) trả đóng góp SHAP của từng feature + bias
+# (đơn vị log-odds); tổng 1 dòng = margin nên xác suất lấy luôn từ cùng lần gọi.
+# Đóng góp của các cột one-hot được cộng về cột input gốc (SHAP có tính cộng).
 
-        risk_level = "unknown"
-        if y_prob is not None:
-            if y_prob > 0.7:
-                risk_level = "high"
-            elif y_prob > 0.4:
-                risk_level = "medium"
-            else:
-                risk_level = "low"
+def explanations_supported(loaded) -> bool:
+    return loaded.encoder is not None and hasattr(loaded.booster, "predict")
 
 
-        result = {
-            "prediction": int(y_pred),
-            "probability": round(float(y_prob), 4) if y_prob is not None else None,
-            "risk_level": risk_level,
+def _explain(records: list, loaded=None) -> list:
+    import xgboost as xgb
+
+    loaded = loaded or get_loaded_model()
+    start = time.perf_counter()
+    try:
+        encoder = loaded.encoder
+        with timed("preprocessing"):
+            dmatrix = xgb.DMatrix(encoder.encode_batch(records))
+        with timed("inference.explain"):
+            contribs = loaded.booster.predict(dmatrix, pred_contribs=True)
+        y_prob = 1.0 / (1.0 + np.exp(-contribs.sum(axis=1, dtype=np.float64)))
+        by_input = contribs[:, :-1] @ encoder.input_matrix
+    except Exception:
+        registry.record(loaded.version, time.perf_counter() - start, len(records), error=True)
+        raise
+    registry.record(loaded.version, time.perf_counter() - start, len(records))
+
+    results = _results_from_proba(y_prob, loaded.classes)
+    for record, result, bias, row in zip(records, results, contribs[:, -1], by_input):
+        order = np.argsort(-np.abs(row), kind="stable")
+        result["explanation"] = {
+            "base_value": round(float(bias), 6),
+            "contributions": [
+                {
+                    "feature": encoder.input_columns[j],
+                    "value": encoder.input_value(record, encoder.input_columns[j]),
+                    "contribution": round(float(row[j]), 6),
+                }
+                for j in order
+            ],
         }
+    return results
 
 
-        print("Prediction Result:", result)
-        return result
+def explain_batch(records: list, top_k: int = EXPLAIN_TOP_K) -> list:
+    """Như predict_batch nhưng kèm top_k feature đóng góp nhiều nhất (theo |SHAP|)"""
+    if not records:
+        return []
+    loaded = get_loaded_model()
+    if not explanations_supported(loaded):
+        raise ValueError(f"Explanations are not supported for MODEL_FORMAT={loaded.format}")
 
+    scored = _cached_batch(records, loaded, explanation_cache, _explain)
+    if drift_monitor.DRIFT_MONITOR:
+        drift_monitor.monitor.observe(records, scored)
+
+    results = []
+    for result in scored:
+        result = dict(result)
+        if "explanation" in result:
+            explanation = result["explanation"]
+            result["explanation"] = {**explanation, "contributions": explanation["contributions"][:top_k]}
+        results.append(result)
+    return results
 
-    except Exception as e:
-        print("Prediction error:", e)
-        return {"error": str(e)}
 
+# --- Shadow scoring -----------------------------------------------------------
+# Một phần traffic /loans/predict (registry.shadow_rate) được chấm thêm bằng
+# model shadow trong thread riêng, sau khi đã trả kết quả cho client
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "100"))
+_shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+_shadow_pending = 0
+_shadow_lock = threading.Lock()
+shadow_dropped = 0
 
 
+def shadow_score(records: list, results: list):
+    """Gửi mẫu (records, kết quả model active) sang model shadow, không chờ"""
+    global _shadow_pending, shadow_dropped
+    shadow, rate = registry.shadow, registry.shadow_rate
+    if shadow is None or rate <= 0:
+        return
 
+    sample = [
+        (record, result) for record, result in zip(records, results)
+        if "error" not in result and random.random() < rate
+    ]
+    if not sample:
+        return
+    with _shadow_lock:
+        if _shadow_pending >= SHADOW_MAX_PENDING:
+            # Shadow chậm hơn traffic -> bỏ mẫu thay vì để hàng đợi phình ra
+            shadow_dropped += len(sample)
+            return
+        _shadow_pending += 1
+    _shadow_executor.submit(_run_shadow, shadow, sample)
 
+
+def _run_shadow(shadow, sample: list):
+    global _shadow_pending
+    start = time.perf_counter()
+    try:
+        scored = score_with_model(shadow, [record for record, _ in sample])
+        registry.record_shadow(shadow.version, [result for _, result in sample], scored,
+                               time.perf_counter() - start)
+    except Exception as e:
+        logger.warning("Shadow scoring error: %s", e)
+        registry.record(shadow.version, time.perf_counter() - start, len(sample), error=True)
+    finally:
+        with _shadow_lock:
+            _shadow_pending -= 1
@@ -0,0 +1,674 @@
+"""
+Quản lý việc load model: load lazy ở lần dùng đầu tiên (hoặc warmup nền lúc
+startup) thay vì joblib.load ngay khi import.
+
+Hỗ trợ 2 định dạng:
+- pickle: models/xgboost_model.pkl (sklearn Pipeline gốc)
+- native: booster XGBoost (models/xgboost_model.ubj) + spec tiền xử lý dạng JSON
+  (models/preprocessing_spec.json), tạo bằng:
+
+      cd backend && python model_registry.py export-native
+
+- onnx: cây XGBoost chạy bằng ONNX Runtime (models/xgboost_model.onnx) + cùng
+  spec tiền xử lý, tạo bằng (cần onnxmltools, onnxruntime):
+
+      cd backend && python model_registry.py export-onnx
+
+MODEL_FORMAT = pickle | native | onnx | auto (mặc định: native nếu đã export, ngược lại pickle;
+onnx chỉ dùng khi chọn rõ). Spec ghi fingerprint của pickle lúc export ("source"):
+pickle đã bị thay (train lại) thì native / onnx bị coi là cũ -> log lỗi và dùng pickle.
+
+Nhiều version (models/versions/<tên>/) có thể đổi lúc đang chạy qua
+/admin/models hoặc file models/ACTIVE_VERSION, kèm chạy shadow 1 version khác.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "models")
+MODEL_PATH = os.path.join(MODEL_DIR, "xgboost_model.pkl")
+NATIVE_MODEL_PATH = os.path.join(MODEL_DIR, "xgboost_model.ubj")
+PREPROCESSING_SPEC_PATH = os.path.join(MODEL_DIR, "preprocessing_spec.json")
+ONNX_MODEL_PATH = os.path.join(MODEL_DIR, "xgboost_model.onnx")
+
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "auto")
+# Số thread của ONNX Runtime cho mỗi lần chạy (0 = ORT tự chọn); 1 tốt nhất cho request 1 dòng
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "1"))
+
+
+def artifact_fingerprint(*paths) -> str:
+    parts = []
+    for path in paths:
+        st = os.stat(path)
+        parts.append(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def extract_preprocessing_spec(pipeline) -> dict:
+    """Lấy vocab one-hot + tham số MinMaxScaler + thứ tự cột từ sklearn Pipeline"""
+    from sklearn.preprocessing import MinMaxScaler, OneHotEncoder
+
+    preprocessor = pipeline.named_steps["preprocessor"]
+    classifier = pipeline.named_steps["classifier"]
+
+    if preprocessor.remainder != "drop":
+        raise ValueError("Only remainder='drop' is supported")
+
+    steps = []
+    for name, transformer, columns in preprocessor.transformers_:
+        if name == "remainder" or transformer == "drop":
+            continue
+        if isinstance(transformer, OneHotEncoder):
+            if transformer.drop is not None or transformer.handle_unknown != "ignore":
+                raise ValueError(f"Unsupported OneHotEncoder settings in '{name}'")
+            steps.append({
+                "type": "onehot",
+                "columns": list(columns),
+                "categories": [[c.item() if isinstance(c, np.generic) else c for c in cats]
+                               for cats in transformer.categories_],
+            })
+        elif isinstance(transformer, MinMaxScaler):
+            if transformer.clip:
+                raise ValueError(f"Unsupported MinMaxScaler settings in '{name}'")
+            steps.append({
+                "type": "minmax",
+                "columns": list(columns),
+                "scale": transformer.scale_.tolist(),
+                "min": transformer.min_.tolist(),
+            })
+        else:
+            raise ValueError(f"Unsupported transformer '{name}': {type(transformer).__name__}")
+
+    return {
+        "input_columns": list(preprocessor.feature_names_in_),
+        "steps": steps,
+        "classes": np.asarray(classifier.classes_).tolist(),
+        "n_features": int(classifier.n_features_in_),
+    }
+
+
+def encode_frame(spec: dict, X: pd.DataFrame) -> np.ndarray:
+    """Tái hiện ColumnTransformer của pipeline bằng NumPy, trả về ma trận float32"""
+    blocks = []
+    for step in spec["steps"]:
+        if step["type"] == "onehot":
+            for column, categories in zip(step["columns"], step["categories"]):
+                values = X[column].to_numpy(dtype=object)
+                blocks.extend((values == c).astype(np.float64) for c in categories)
+        else:
+            values = X[step["columns"]].astype(np.float64).to_numpy()
+            values = values * np.asarray(step["scale"]) + np.asarray(step["min"])
+            blocks.extend(values.T)
+    return np.column_stack(blocks).astype(np.float32)
+
+
+class FeatureEncoder:
+    """
+    Encoder "biên dịch" sẵn từ spec: chuyển thẳng dict feature (schemas.LoanBase)
+    thành hàng float32 cho booster, không qua pandas / ColumnTransformer.
+    Kết quả giống hệt encode_frame (tính float64 rồi ép float32).
+    """
+
+    # Tên cột trong pipeline -> key tương ứng trong dict input
+    ALIASES = {"co-applicant_credit_type": "co_applicant_credit_type"}
+    DERIVED = {"rate_of_interest_monthly": ("rate_of_interest", 12.0)}
+
+    def __init__(self, spec: dict):
+        self.n_features = spec["n_features"]
+        self.required = set()
+        self._onehot = []
+        self._numeric = []
+        # Cột input (tên trong pipeline) sinh ra từng feature; feature dẫn xuất quy về cột gốc
+        feature_inputs = []
+
+        offset = 0
+        for step in spec["steps"]:
+            if step["type"] == "onehot":
+                for column, categories in zip(step["columns"], step["categories"]):
+                    index = {c: offset + j for j, c in enumerate(categories)}
+                    self._onehot.append((column, self.ALIASES.get(column), index))
+                    self.required.add(column)
+                    feature_inputs += [column] * len(categories)
+                    offset += len(categories)
+            else:
+                for column, scale, minimum in zip(step["columns"], step["scale"], step["min"]):
+                    self._numeric.append((column, self.ALIASES.get(column), offset, scale, minimum))
+                    if column not in self.DERIVED:
+                        self.required.add(column)
+                    feature_inputs.append(self.DERIVED.get(column, (column,))[0])
+                    offset += 1
+
+        if offset != self.n_features:
+            raise ValueError(f"Spec encodes {offset} features, model expects {self.n_features}")
+        self._local = threading.local()
+
+        # Ma trận (n_features x n_input) để cộng đóng góp của các cột one-hot về cột input
+        self.input_columns = list(dict.fromkeys(feature_inputs))
+        self.input_matrix = np.zeros((self.n_features, len(self.input_columns)), dtype=np.float32)
+        for i, column in enumerate(feature_inputs):
+            self.input_matrix[i, self.input_columns.index(column)] = 1.0
+
+    def input_value(self, features: dict, column: str):
+        return self._get(features, column, self.ALIASES.get(column))
+
+    def _buffer(self, rows: int) -> np.ndarray:
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf.shape[0] < rows:
+            buf = np.empty((max(rows, 64), self.n_features), dtype=np.float32)
+            self._local.buf = buf
+        return buf
+
+    @staticmethod
+    def _get(features, column, alias):
+        if column in features:
+            return features[column]
+        return features.get(alias) if alias else None
+
+    def _numeric_value(self, features, column, alias):
+        if column in self.DERIVED:
+            source, divisor = self.DERIVED[column]
+            v = features.get(source)
+            return float("nan") if v is None else float(v) / divisor
+        v = self._get(features, column, alias)
+        return float("nan") if v is None else float(v)
+
+    def encode_into(self, features: dict, row: np.ndarray):
+        missing = [
+            c for c in self.required
+            if c not in features and self.ALIASES.get(c) not in features
+        ]
+        if missing:
+            raise ValueError(f"columns are missing: {set(missing)}")
+
+        row[:] = 0.0
+        for column, alias, index in self._onehot:
+            i = index.get(self._get(features, column, alias))
+            if i is not None:
+                row[i] = 1.0
+        for column, alias, i, scale, minimum in self._numeric:
+            row[i] = self._numeric_value(features, column, alias) * scale + minimum
+
+    def encode_batch(self, records: list) -> np.ndarray:
+        """Ghi vào buffer cấp phát sẵn (theo thread), trả về view n dòng đầu"""
+        out = self._buffer(len(records))[:len(records)]
+        for record, row in zip(records, out):
+            self.encode_into(record, row)
+        return out
+
+
+class OnnxBooster:
+    """Phiên ONNX Runtime với interface inplace_predict như xgboost.Booster (trả P(class 1))"""
+
+    def __init__(self, path: str):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def inplace_predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.session.run(["probabilities"], {self.input_name: X})[0][:, 1]
+
+
+class NativeModel:
+    """Booster (XGBoost hoặc ONNX) + spec tiền xử lý, cùng interface predict_proba với Pipeline"""
+
+    def __init__(self, booster, spec: dict):
+        self.booster = booster
+        self.spec = spec
+        self.classes_ = np.asarray(spec["classes"])
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        p = self.booster.inplace_predict(encode_frame(self.spec, X))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+
+def load_pickle_model(path: str = MODEL_PATH):
+    import joblib
+    return joblib.load(path)
+
+
+def load_native_model(model_path: str = NATIVE_MODEL_PATH,
+                      spec_path: str = PREPROCESSING_SPEC_PATH) -> NativeModel:
+    import xgboost as xgb
+
+    booster = xgb.Booster()
+    booster.load_model(model_path)
+    with open(spec_path, encoding="utf-8") as f:
+        spec = json.load(f)
+    return NativeModel(booster, spec)
+
+
+def load_onnx_model(model_path: str = ONNX_MODEL_PATH,
+                    spec_path: str = PREPROCESSING_SPEC_PATH) -> NativeModel:
+    with open(spec_path, encoding="utf-8") as f:
+        spec = json.load(f)
+    return NativeModel(OnnxBooster(model_path), spec)
+
+
+def _write_spec(pipeline, pickle_path: str, spec_path: str):
+    spec = extract_preprocessing_spec(pipeline)
+    spec["source"] = artifact_fingerprint(pickle_path)
+    with open(spec_path, "w", encoding="utf-8") as f:
+        json.dump(spec, f, indent=2)
+
+
+def export_native(pickle_path: str = MODEL_PATH, model_path: str = NATIVE_MODEL_PATH,
+                  spec_path: str = PREPROCESSING_SPEC_PATH):
+    pipeline = load_pickle_model(pickle_path)
+    pipeline.named_steps["classifier"].get_booster().save_model(model_path)
+    _write_spec(pipeline, pickle_path, spec_path)
+    return model_path, spec_path
+
+
+def export_onnx(pickle_path: str = MODEL_PATH, model_path: str = ONNX_MODEL_PATH,
+                spec_path: str = PREPROCESSING_SPEC_PATH):
+    """Chỉ chuyển phần XGBClassifier sang ONNX; tiền xử lý vẫn do FeatureEncoder / spec"""
+    from onnxmltools import convert_xgboost
+    from onnxmltools.convert.common.data_types import FloatTensorType
+
+    pipeline = load_pickle_model(pickle_path)
+    classifier = pipeline.named_steps["classifier"]
+    onnx_model = convert_xgboost(
+        classifier, initial_types=[("input", FloatTensorType([None, int(classifier.n_features_in_)]))]
+    )
+    with open(model_path, "wb") as f:
+        f.write(onnx_model.SerializeToString())
+    _write_spec(pipeline, pickle_path, spec_path)
+    return model_path, spec_path
+
+
+def export_is_stale(directory: str = MODEL_DIR) -> bool:
+    """Spec được export từ pickle khác với pickle hiện có trong cùng thư mục"""
+    pickle_path = artifact_paths("pickle", directory)[0]
+    spec_path = artifact_paths("native", directory)[1]
+    if not os.path.exists(pickle_path) or not os.path.exists(spec_path):
+        return False
+    with open(spec_path, encoding="utf-8") as f:
+        source = json.load(f).get("source")
+    return source is not None and source != artifact_fingerprint(pickle_path)
+
+
+def resolve_format(model_format: str = MODEL_FORMAT, directory: str = MODEL_DIR) -> str:
+    if model_format == "auto":
+        native_ready = all(os.path.exists(p) for p in artifact_paths("native", directory))
+        fmt = "native" if native_ready else "pickle"
+    elif model_format not in LOADERS:
+        raise ValueError(f"Unknown MODEL_FORMAT: {model_format}")
+    else:
+        fmt = model_format
+
+    if fmt != "pickle" and export_is_stale(directory):
+        logger.error(
+            "%s artifacts in %s were exported from a different %s, loading the pickle instead "
+            "(re-run: python model_registry.py export-%s)",
+            fmt, directory, os.path.basename(MODEL_PATH), fmt,
+        )
+        return "pickle"
+    return fmt
+
+
+def artifact_paths(fmt: str, directory: str = MODEL_DIR) -> list:
+    """Tên file artifact trong 1 thư mục version giống hệt thư mục models/ gốc"""
+    spec = os.path.join(directory, os.path.basename(PREPROCESSING_SPEC_PATH))
+    if fmt == "native":
+        return [os.path.join(directory, os.path.basename(NATIVE_MODEL_PATH)), spec]
+    if fmt == "onnx":
+        return [os.path.join(directory, os.path.basename(ONNX_MODEL_PATH)), spec]
+    return [os.path.join(directory, os.path.basename(MODEL_PATH))]
+
+
+# format -> hàm load(*artifact_paths)
+LOADERS = {
+    "pickle": load_pickle_model,
+    "native": load_native_model,
+    "onnx": load_onnx_model,
+}
+
+
+# --- Version ------------------------------------------------------------------
+# "base" = artifact trong models/, các version khác = models/versions/<tên>/ chứa
+# xgboost_model.pkl (và/hoặc xgboost_model.ubj / .onnx + preprocessing_spec.json).
+# Tạo version từ artifact hiện tại:  python model_registry.py publish <tên>
+BASE_VERSION = "base"
+MODEL_VERSIONS_DIR = os.path.join(MODEL_DIR, "versions")
+# File chứa tên version đang active; được theo dõi khi MODEL_WATCH_INTERVAL > 0
+ACTIVE_VERSION_FILE = os.path.join(MODEL_DIR, "ACTIVE_VERSION")
+MODEL_VERSION = os.getenv("MODEL_VERSION", "")
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "0"))
+
+
+def version_dir(version: str) -> str:
+    if version == BASE_VERSION:
+        return MODEL_DIR
+    if not version or os.path.basename(version) != version or version.startswith("."):
+        raise ValueError(f"Invalid model version: {version!r}")
+    directory = os.path.join(MODEL_VERSIONS_DIR, version)
+    if not os.path.isdir(directory):
+        raise ValueError(f"Unknown model version: {version}")
+    return directory
+
+
+def list_versions() -> list:
+    versions = [BASE_VERSION]
+    if os.path.isdir(MODEL_VERSIONS_DIR):
+        versions += sorted(
+            v for v in os.listdir(MODEL_VERSIONS_DIR)
+            if os.path.isdir(os.path.join(MODEL_VERSIONS_DIR, v)) and not v.startswith(".")
+        )
+    return versions
+
+
+def read_active_version_file():
+    try:
+        with open(ACTIVE_VERSION_FILE, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_version(version: str):
+    """Sao chép artifact hiện tại trong models/ thành models/versions/<version>/"""
+    import shutil
+
+    if version == BASE_VERSION or os.path.basename(version) != version:
+        raise ValueError(f"Invalid model version: {version!r}")
+    directory = os.path.join(MODEL_VERSIONS_DIR, version)
+    os.makedirs(directory, exist_ok=False)
+    copied = []
+    for path in [MODEL_PATH, NATIVE_MODEL_PATH, ONNX_MODEL_PATH, PREPROCESSING_SPEC_PATH]:
+        if os.path.exists(path):
+            copied.append(shutil.copy2(path, directory))
+    return copied
+
+
+def load_version(version: str, model_format: str = MODEL_FORMAT) -> "LoadedModel":
+    directory = version_dir(version)
+    fmt = resolve_format(model_format, directory)
+    paths = artifact_paths(fmt, directory)
+    start = time.perf_counter()
+    logger.info("Model loading version %s from: %s", version, paths[0])
+    model = LOADERS[fmt](*paths)
+    loaded = LoadedModel(model, fmt, artifact_fingerprint(*paths), time.perf_counter() - start, version)
+    logger.info("Model loaded successfully (%s, %s, %.3fs)", version, fmt, loaded.load_seconds)
+    return loaded
+
+
+class LoadedModel:
+    """Model đã load cùng booster + encoder dựng sẵn cho fast path"""
+
+    def __init__(self, model, fmt: str, fingerprint: str, load_seconds: float, version: str = BASE_VERSION):
+        self.model = model
+        self.format = fmt
+        self.fingerprint = fingerprint
+        self.load_seconds = load_seconds
+        self.version = version
+        self.classes = np.asarray(getattr(model, "classes_", [0, 1]))
+        self.booster = None
+        self.encoder = None
+
+        try:
+            if isinstance(model, NativeModel):
+                spec, self.booster = model.spec, model.booster
+            else:
+                spec = extract_preprocessing_spec(model)
+                self.booster = model.named_steps["classifier"].get_booster()
+            self.encoder = FeatureEncoder(spec)
+        except Exception as e:
+            # Pipeline có cấu trúc khác -> chỉ dùng đường pandas
+            logger.warning("Feature encoder unavailable, using pandas path: %s", e)
+            self.booster = None
+            self.encoder = None
+
+
+class VersionStats:
+    """Latency chấm điểm theo version + độ đồng thuận khi chạy shadow"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.rows = 0
+        self.errors = 0
+        self.latency_ms = Histogram([0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000])
+        self.shadow_rows = 0
+        self.label_agree = 0
+        self.abs_diff_sum = 0.0
+        self.max_abs_diff = 0.0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            out = {
+                "calls": self.calls,
+                "rows": self.rows,
+                "errors": self.errors,
+                "latency_ms": self.latency_ms.snapshot(),
+            }
+            if self.shadow_rows:
+                out["shadow"] = {
+                    "rows": self.shadow_rows,
+                    "label_agreement": self.label_agree / self.shadow_rows,
+                    "mean_abs_probability_diff": self.abs_diff_sum / self.shadow_rows,
+                    "max_abs_probability_diff": self.max_abs_diff,
+                }
+            return out
+
+
+class ModelRegistry:
+    """
+    Giữ model active (và model shadow nếu có). Đổi version = load + warmup ở
+    thread khác rồi mới gán lại tham chiếu, request đang chạy vẫn dùng model cũ.
+    """
+
+    def __init__(self, model_format: str = MODEL_FORMAT, version: str = MODEL_VERSION):
+        self.model_format = model_format
+        self.initial_version = version
+        self.error = None
+        self._loaded = None
+        self._previous = None
+        self._lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._warmup_thread = None
+        self._watch_thread = None
+        self.shadow = None
+        self.shadow_rate = 0.0
+        self.stats = {}
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded is not None
+
+    @property
+    def format(self):
+        return self._loaded.format if self._loaded else None
+
+    @property
+    def fingerprint(self):
+        return self._loaded.fingerprint if self._loaded else None
+
+    @property
+    def load_seconds(self):
+        return self._loaded.load_seconds if self._loaded else None
+
+    @property
+    def version(self):
+        return self._loaded.version if self._loaded else None
+
+    def current(self) -> LoadedModel:
+        if self._loaded is None:
+            with self._lock:
+                if self._loaded is None:
+                    self._loaded = self._load(self.initial_version or read_active_version_file() or BASE_VERSION)
+        return self._loaded
+
+    def get(self):
+        return self.current().model
+
+    def _load(self, version: str) -> LoadedModel:
+        try:
+            loaded = load_version(version, self.model_format)
+        except Exception as e:
+            self.error = str(e)
+            raise
+        self.error = None
+        return loaded
+
+    @staticmethod
+    def _warm(loaded: LoadedModel):
+        """Chạy thử 1 dòng để khởi tạo sẵn các code path trước khi nhận traffic"""
+        columns = _input_columns(loaded.model)
+        if columns:
+            loaded.model.predict_proba(pd.DataFrame([{c: None for c in columns}]))
+
+    def warmup(self):
+        try:
+            self._warm(self.current())
+        except Exception as e:
+            logger.exception("Model warmup error: %s", e)
+
+    def warmup_async(self):
+        if self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(target=self.warmup, name="model-warmup", daemon=True)
+            self._warmup_thread.start()
+
+    # --- hot swap ------------------------------------------------------------
+
+    def activate(self, version: str) -> dict:
+        """Load + warmup version mới (ngoài request path) rồi đổi tham chiếu"""
+        with self._swap_lock:
+            loaded = self._load(version)
+            self._warm(loaded)
+            with self._lock:
+                self._previous, self._loaded = self._loaded, loaded
+            if self.shadow is not None and self.shadow.version == version:
+                self.shadow = None
+        logger.info("Model version %s activated", version)
+        return self.status()
+
+    def rollback(self) -> dict:
+        with self._swap_lock:
+            if self._previous is None:
+                raise ValueError("No previous model version to roll back to")
+            with self._lock:
+                self._previous, self._loaded = self._loaded, self._previous
+        logger.info("Model rolled back to version %s", self.version)
+        return self.status()
+
+    def set_shadow(self, version: str, sample_rate: float) -> dict:
+        if not 0 < sample_rate <= 1:
+            raise ValueError("sample_rate must be in (0, 1]")
+        with self._swap_lock:
+            loaded = self._load(version)
+            self._warm(loaded)
+            self.shadow, self.shadow_rate = loaded, sample_rate
+        return self.status()
+
+    def clear_shadow(self) -> dict:
+        self.shadow, self.shadow_rate = None, 0.0
+        return self.status()
+
+    def watch(self, interval: float):
+        """Theo dõi ACTIVE_VERSION_FILE, đổi version khi nội dung file thay đổi"""
+        last_mtime = None
+        while True:
+            try:
+                mtime = os.stat(ACTIVE_VERSION_FILE).st_mtime_ns
+                if mtime != last_mtime:
+                    last_mtime = mtime
+                    version = read_active_version_file()
+                    if version and self.ready and version != self.version:
+                        self.activate(version)
+            except FileNotFoundError:
+                last_mtime = None
+            except Exception as e:
+                logger.exception("Model watch error: %s", e)
+            time.sleep(interval)
+
+    def watch_async(self, interval: float = MODEL_WATCH_INTERVAL):
+        if interval > 0 and self._watch_thread is None:
+            self._watch_thread = threading.Thread(
+                target=self.watch, args=(interval,), name="model-watch", daemon=True
+            )
+            self._watch_thread.start()
+
+    # --- thống kê ------------------------------------------------------------
+
+    def _version_stats(self, version: str) -> VersionStats:
+        stats = self.stats.get(version)
+        if stats is None:
+            stats = self.stats.setdefault(version, VersionStats())
+        return stats
+
+    def record(self, version: str, seconds: float, rows: int, error: bool = False):
+        stats = self._version_stats(version)
+        with stats.lock:
+            stats.calls += 1
+            stats.rows += rows
+            stats.errors += int(error)
+            if not error:
+                stats.latency_ms.observe(seconds * 1000)
+
+    def record_shadow(self, version: str, active_results: list, shadow_results: list, seconds: float):
+        self.record(version, seconds, len(shadow_results))
+        stats = self._version_stats(version)
+        with stats.lock:
+            for active, shadow in zip(active_results, shadow_results):
+                diff = abs(active["probability"] - shadow["probability"])
+                stats.shadow_rows += 1
+                stats.label_agree += int(active["prediction"] == shadow["prediction"])
+                stats.abs_diff_sum += diff
+                stats.max_abs_diff = max(stats.max_abs_diff, diff)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "version": self.version,
+            "previous_version": self._previous.version if self._previous else None,
+            "format": self.format,
+            "fingerprint": self.fingerprint,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+            "shadow": {"version": self.shadow.version, "sample_rate": self.shadow_rate} if self.shadow else None,
+        }
+
+    def version_stats(self) -> dict:
+        return {version: stats.snapshot() for version, stats in list(self.stats.items())}
+
+
+def _input_columns(model):
+    if isinstance(model, NativeModel):
+        return model.spec["input_columns"]
+    return list(getattr(model, "feature_names_in_", []))
+
+
+registry = ModelRegistry()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if len(sys.argv) > 1 and sys.argv[1] == "export-native":
+        for path in export_native():
+            print("Exported:", path)
+    elif len(sys.argv) > 1 and sys.argv[1] == "export-onnx":
+        for path in export_onnx():
+            print("Exported:", path)
+    elif len(sys.argv) > 2 and sys.argv[1] == "publish":
+        for path in publish_version(sys.argv[2]):
+            print("Published:", path)
+    else:
+        print("Usage: python model_registry.py export-native | export-onnx | publish <version>")
@@ -1,15 +1,24 @@
-from sqlalchemy import Column, String, Float, Integer, Double
+from sqlalchemy import Column, String, Float, Integer, Double, Index
 from database import Base
 
 class Loan(Base):
     __tablename__ = "loans"
+    # Index cho filter Year/Month của dashboard và /loans/page (kèm id để ORDER BY / keyset)
+    __table_args__ = (
+        Index("ix_loans_year_month_id", "Year", "Month", "id"),
+        Index("ix_loans_month_id", "Month", "id"),
+        # GROUP BY nhóm tuổi / khoản vay của dashboard: index phủ cả các measure
+        # của section nên đọc hết từ index, không chạm bảng
+        Index("ix_loans_age_group", "age_group", "prediction", "Credit_Score"),
+        Index("ix_loans_loan_amount_group", "loan_amount_group", "loan_amount", "prediction", "probability"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
     Month = Column(String(20), nullable=True)
     Year = Column(Integer, nullable=True)
     Gender = Column(String(10), nullable=True)
-    age = Column(String(10), nullable=True)
+    age = Column(Double, nullable=True)
     Region = Column(String(50), nullable=True)
     submission_of_application = Column(String(10), nullable=True)
     approv_in_adv = Column(String(10), nullable=True)
@@ -22,7 +31,7 @@ class Loan(Base):
     loan_type = Column(String(50), nullable=True)
     loan_purpose = Column(String(100), nullable=True)
     loan_amount = Column(Double, nullable=True)
-    term = Column(String(20), nullable=True)
+    term = Column(Integer, nullable=True)
     rate_of_interest = Column(Double, nullable=True)
     loan_limit = Column(Double, nullable=True)
     business_or_commercial = Column(String(10), nullable=True)
@@ -37,6 +46,39 @@ class Loan(Base):
     lump_sum_payment = Column(String(10), nullable=True)
     prediction = Column(Integer, nullable=True)
     probability = Column(Float, nullable=True)
+    # Suy ra từ age / loan_amount lúc ghi (crud.normalize_loans, migration 4)
+    age_group = Column(String(10), nullable=True)
+    loan_amount_group = Column(String(20), nullable=True)
+
+class LoanRollup(Base):
+    """
+    Tổng hợp sẵn theo (Year, Month, section, key) cho dashboard, được cập nhật
+    khi thêm / xóa loan (xem rollups.py). Mỗi measure lưu tổng và số dòng khác NULL.
+    """
+    __tablename__ = "loan_rollups"
+    __table_args__ = (
+        Index("ix_loan_rollups_lookup", "Year", "Month", "section", "key1", "key2"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    Year = Column(Integer, nullable=True)
+    Month = Column(String(20), nullable=True)
+    section = Column(String(50), nullable=False)
+    key1 = Column(String(100), nullable=True)
+    key2 = Column(String(100), nullable=True)
+
+    n = Column(Integer, nullable=False, default=0)
+    sum_prediction = Column(Double, nullable=False, default=0)
+    cnt_prediction = Column(Integer, nullable=False, default=0)
+    sum_probability = Column(Double, nullable=False, default=0)
+    cnt_probability = Column(Integer, nullable=False, default=0)
+    sum_credit_score = Column(Double, nullable=False, default=0)
+    cnt_credit_score = Column(Integer, nullable=False, default=0)
+    sum_loan_amount = Column(Double, nullable=False, default=0)
+    cnt_loan_amount = Column(Integer, nullable=False, default=0)
+    sum_rate_of_interest = Column(Double, nullable=False, default=0)
+    cnt_rate_of_interest = Column(Integer, nullable=False, default=0)
 
 class Employee(Base):
     __tablename__ = "employees"
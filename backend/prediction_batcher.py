@@ -0,0 +1,132 @@
+"""
+Gom các request /loans/predict đồng thời thành 1 batch rồi chấm điểm một lần
+bằng model_loader.predict_batch, mỗi caller nhận lại kết quả của riêng mình.
+
+Cấu hình qua biến môi trường:
+- PREDICT_BATCH_MAX_WAIT_MS: thời gian tối đa chờ gom batch (mặc định 5ms)
+- PREDICT_BATCH_MAX_SIZE: số dòng tối đa mỗi batch (mặc định 64)
+- PREDICT_BATCH_MAX_IN_FLIGHT: số batch chấm điểm song song trong threadpool
+  (mặc định 4); đủ chỗ thì request mới dồn vào batch kế tiếp
+"""
+import asyncio
+import os
+
+import model_loader
+from metrics import Histogram
+
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", "5"))
+PREDICT_BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "64"))
+PREDICT_BATCH_MAX_IN_FLIGHT = int(os.getenv("PREDICT_BATCH_MAX_IN_FLIGHT", "4"))
+
+
+class PredictionBatcher:
+    def __init__(self, max_wait_ms: float = PREDICT_BATCH_MAX_WAIT_MS,
+                 max_batch_size: int = PREDICT_BATCH_MAX_SIZE,
+                 max_in_flight: int = PREDICT_BATCH_MAX_IN_FLIGHT):
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self._loop = None
+        self._queue = None
+        self._slots = None
+        self._worker = None
+        self._scoring = set()
+        self.batch_size_hist = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512])
+        self.queue_depth_hist = Histogram([0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512])
+        self.batches = 0
+
+    def _ensure_worker(self):
+        # Queue tạo 1 lần cho mỗi event loop; worker dừng (lỗi / bị huỷ) thì
+        # worker mới đọc tiếp đúng queue đó, các request đang chờ không bị mất
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, features: dict) -> dict:
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((features, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        self.queue_depth_hist.observe(self._queue.qsize())
+
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        try:
+            while len(batch) < self.max_batch_size:
+                while not self._queue.empty() and len(batch) < self.max_batch_size:
+                    batch.append(self._queue.get_nowait())
+                if len(batch) >= self.max_batch_size:
+                    break
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Worker bị huỷ giữa lúc gom: trả các request đã lấy về queue cho worker sau
+            for item in batch:
+                if not item[1].done():
+                    self._queue.put_nowait(item)
+            raise
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Chờ chỗ trống trước khi gom: tối đa max_in_flight batch đang chấm điểm
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            self.batches += 1
+            self.batch_size_hist.observe(len(batch))
+
+            task = loop.create_task(self._score(batch))
+            self._scoring.add(task)
+            task.add_done_callback(self._scoring.discard)
+
+    async def _score(self, batch):
+        try:
+            # Model chạy trong threadpool để không chặn event loop
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, model_loader.predict_batch, [f for f, _ in batch]
+            )
+        except Exception as e:
+            results = [{"error": str(e)}] * len(batch)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Prediction batch was cancelled"))
+            raise
+        finally:
+            self._slots.release()
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_wait_ms": self.max_wait * 1000,
+            "max_batch_size": self.max_batch_size,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": len(self._scoring),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "batch_size": self.batch_size_hist.snapshot(),
+            "queue_depth_at_dispatch": self.queue_depth_hist.snapshot(),
+        }
+
+
+batcher = PredictionBatcher()
@@ -0,0 +1,253 @@
+"""
+Chấm điểm lại toàn bộ bảng loans bằng 1 model artifact (sau khi train lại).
+
+- Chia bảng thành các shard theo khoảng id, chạy song song bằng ProcessPoolExecutor;
+  mỗi worker load model 1 lần và có engine DB riêng
+- Mỗi shard đọc theo khúc (keyset theo id), chấm điểm cả khúc 1 lần, chỉ UPDATE
+  các dòng có prediction / probability thay đổi (executemany, commit theo khúc)
+- Checkpoint (JSON) ghi lại shard đã xong -> chạy lại với --resume để tiếp tục
+- --dry-run: không ghi DB, chỉ thống kê khác biệt so với giá trị đang lưu
+- Xong (không dry-run) thì dựng lại loan_rollups; API đang chạy cần restart
+  (hoặc chờ TTL) để dashboard cache / snapshot thấy giá trị mới
+
+    cd backend && python rescore.py --model models/xgboost_model.pkl --workers 4
+    cd backend && python rescore.py --model models/xgboost_model.ubj --spec models/preprocessing_spec.json --dry-run
+    cd backend && python rescore.py --model models/xgboost_model.pkl --resume
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sqlalchemy import create_engine, text
+
+RESCORE_SHARD_SIZE = 100000
+RESCORE_CHUNK_SIZE = 5000
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rescore_checkpoint.json")
+DIFF_SAMPLE_SIZE = 20
+
+_worker = {}
+
+
+def artifact_paths(model_path: str, spec_path: str = None) -> list:
+    import model_registry
+
+    if model_path.endswith(".pkl"):
+        return [model_path]
+    return [model_path, spec_path or model_registry.PREPROCESSING_SPEC_PATH]
+
+
+def load_model(model_path: str, spec_path: str = None):
+    """Load artifact -> LoadedModel (pickle Pipeline hoặc booster native + spec)"""
+    import model_registry
+
+    start = time.perf_counter()
+    paths = artifact_paths(model_path, spec_path)
+    if len(paths) == 1:
+        model, fmt = model_registry.load_pickle_model(model_path), "pickle"
+    else:
+        model, fmt = model_registry.load_native_model(*paths), "native"
+    fingerprint = model_registry.artifact_fingerprint(*paths)
+    return model_registry.LoadedModel(model, fmt, fingerprint, time.perf_counter() - start)
+
+
+def plan_shards(min_id: int, max_id: int, shard_size: int) -> list:
+    """[lo, hi) theo id"""
+    return [[lo, min(lo + shard_size, max_id + 1)] for lo in range(min_id, max_id + 1, shard_size)]
+
+
+def _feature_columns():
+    import models
+
+    skip = {"id", "Month", "Year", "prediction", "probability"}
+    return [c.name for c in models.Loan.__table__.columns if c.name not in skip]
+
+
+def _init_worker(database_url: str, model_path: str, spec_path: str):
+    import database
+
+    _worker["engine"] = create_engine(database_url, **database.engine_options(database_url))
+    _worker["model"] = load_model(model_path, spec_path)
+    _worker["columns"] = _feature_columns()
+
+
+def _changed(old_pred, old_prob, new):
+    if old_pred is None or old_prob is None:
+        return True
+    return int(old_pred) != new["prediction"] or abs(float(old_prob) - new["probability"]) > 1e-9
+
+
+def process_shard(shard, chunk_size: int, dry_run: bool) -> dict:
+    """Chạy trong worker: chấm lại các dòng id trong [lo, hi)"""
+    from model_loader import features_from_loan, score_with_model
+
+    lo, hi = shard
+    engine, loaded, columns = _worker["engine"], _worker["model"], _worker["columns"]
+    select_sql = text(
+        f"SELECT id, prediction, probability, {', '.join(columns)} FROM loans "
+        "WHERE id >= :lo AND id < :hi AND id > :last_id ORDER BY id LIMIT :limit"
+    )
+    update_sql = text("UPDATE loans SET prediction = :prediction, probability = :probability WHERE id = :id")
+
+    stats = {"shard": shard, "rows": 0, "changed": 0, "label_flips": 0, "abs_delta_sum": 0.0,
+             "max_abs_delta": 0.0, "samples": [], "seconds": 0.0}
+    start = time.perf_counter()
+    last_id = lo - 1
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(select_sql, {"lo": lo, "hi": hi, "last_id": last_id, "limit": chunk_size}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        records = [features_from_loan(dict(zip(columns, r[3:]))) for r in rows]
+        results = score_with_model(loaded, records)
+
+        updates = []
+        for row, new in zip(rows, results):
+            loan_id, old_pred, old_prob = row[0], row[1], row[2]
+            if not _changed(old_pred, old_prob, new):
+                continue
+            updates.append({"id": loan_id, "prediction": new["prediction"], "probability": new["probability"]})
+            if old_pred is not None and int(old_pred) != new["prediction"]:
+                stats["label_flips"] += 1
+            if old_prob is not None:
+                delta = abs(float(old_prob) - new["probability"])
+                stats["abs_delta_sum"] += delta
+                stats["max_abs_delta"] = max(stats["max_abs_delta"], delta)
+            if len(stats["samples"]) < DIFF_SAMPLE_SIZE:
+                stats["samples"].append({"id": loan_id, "old": [old_pred, old_prob],
+                                         "new": [new["prediction"], new["probability"]]})
+
+        if updates and not dry_run:
+            with engine.begin() as conn:
+                conn.execute(update_sql, updates)
+
+        stats["rows"] += len(rows)
+        stats["changed"] += len(updates)
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+class Checkpoint:
+    """File JSON: model fingerprint + các shard đã xong + thống kê cộng dồn"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = None
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.data = json.load(f)
+        return self.data
+
+    def start(self, fingerprint: str, shards: list, dry_run: bool):
+        self.data = {"fingerprint": fingerprint, "dry_run": dry_run, "shards": shards,
+                     "done": [], "rows": 0, "changed": 0, "label_flips": 0}
+        self.save()
+
+    def mark_done(self, result: dict):
+        self.data["done"].append(result["shard"])
+        for key in ("rows", "changed", "label_flips"):
+            self.data[key] += result[key]
+        self.save()
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+
+
+def run(args):
+    import database
+
+    database_url = database.SQLALCHEMY_DATABASE_URL
+    engine = database.engine
+    with engine.connect() as conn:
+        min_id, max_id, total = conn.execute(text("SELECT MIN(id), MAX(id), COUNT(*) FROM loans")).one()
+    if not total:
+        print("loans is empty, nothing to rescore")
+        return
+
+    import model_registry
+    fingerprint = model_registry.artifact_fingerprint(*artifact_paths(args.model, args.spec))
+    checkpoint = Checkpoint(args.checkpoint)
+    previous = checkpoint.load() if args.resume else None
+    if previous:
+        if previous["fingerprint"] != fingerprint or previous["dry_run"] != args.dry_run:
+            raise SystemExit("Checkpoint was created for another model or mode, run without --resume")
+        shards = previous["shards"]
+    else:
+        shards = plan_shards(min_id, max_id, args.shard_size)
+        checkpoint.start(fingerprint, shards, args.dry_run)
+
+    done = {tuple(s) for s in checkpoint.data["done"]}
+    pending = [s for s in shards if tuple(s) not in done]
+    print(f"{'DRY RUN: ' if args.dry_run else ''}{total} loans, {len(shards)} shards "
+          f"({len(pending)} pending), {args.workers} workers, model {fingerprint}")
+
+    start = time.perf_counter()
+    rows_done, abs_delta_sum, max_abs_delta, samples = 0, 0.0, 0.0, []
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(database_url, args.model, args.spec),
+    ) as pool:
+        futures = [pool.submit(process_shard, s, args.chunk_size, args.dry_run) for s in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            checkpoint.mark_done(result)
+            rows_done += result["rows"]
+            abs_delta_sum += result["abs_delta_sum"]
+            max_abs_delta = max(max_abs_delta, result["max_abs_delta"])
+            samples.extend(result["samples"][:DIFF_SAMPLE_SIZE - len(samples)])
+
+            elapsed = time.perf_counter() - start
+            rate = rows_done / elapsed if elapsed else 0.0
+            remaining = total - checkpoint.data["rows"]
+            eta = remaining / rate if rate else float("nan")
+            print(f"[{len(checkpoint.data['done'])}/{len(shards)}] shard {result['shard']}: "
+                  f"{result['rows']} rows, {result['changed']} changed | "
+                  f"{checkpoint.data['rows']}/{total} rows, {rate:.0f} rows/s, ETA {eta:.0f}s")
+
+    data = checkpoint.data
+    print(f"{'Would change' if args.dry_run else 'Changed'} {data['changed']}/{data['rows']} rows, "
+          f"{data['label_flips']} label flips, mean |dprob| {abs_delta_sum / max(data['changed'], 1):.4f} "
+          f"(this run), max |dprob| {max_abs_delta:.4f}")
+    os.remove(args.checkpoint)
+    if args.dry_run:
+        for sample in samples:
+            print("  ", sample)
+        return
+
+    import rollups
+    db = database.SessionLocal()
+    try:
+        count = rollups.rebuild(db)
+        db.commit()
+        print(f"Rebuilt loan_rollups: {count} rows")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score every loan with a model artifact")
+    parser.add_argument("--model", required=True, help=".pkl (Pipeline) hoặc .ubj/.json (booster native)")
+    parser.add_argument("--spec", help="preprocessing_spec.json cho model native")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard-size", type=int, default=RESCORE_SHARD_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=RESCORE_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--resume", action="store_true", help="bỏ qua các shard đã xong trong checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="không ghi DB, chỉ báo khác biệt")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main()
@@ -0,0 +1,282 @@
+"""
+Bảng tổng hợp loan_rollups cho dashboard: mỗi dòng giữ count + tổng / số dòng
+khác NULL của từng measure theo (Year, Month, section, key).
+
+- create_loan / delete_loan gọi apply_rows(+1 / -1) trong cùng transaction
+  (bản AsyncSession: apply_rows_async / get_dashboard_data_async)
+- get_dashboard_data đọc rollups rồi finalize như dashboard_engine
+  -> O(số nhóm) thay vì O(số loans)
+- Month / key chuỗi so theo engine.collation_key như GROUP BY trên MySQL:
+  loan 'central' được cộng vào dòng 'Central' đã có, filter month='october'
+  khớp 'October'
+- Dựng lại từ đầu khi cần:  cd backend && python rollups.py rebuild
+"""
+import sys
+
+import numpy as np
+from sqlalchemy import and_, delete, insert, inspect, select, text, update
+from sqlalchemy.orm import Session
+
+import dashboard_engine as engine
+import models
+
+table = models.LoanRollup.__table__
+
+REBUILD_CHUNK_SIZE = 50000
+
+KPI_SECTION = "kpi"
+MEASURE_COLUMNS = [(f"sum_{m.lower()}", f"cnt_{m.lower()}") for m in engine.MEASURES]
+
+# (section hoặc None, cột) -> {collation_key: cách viết đang lưu trong loan_rollups}
+_labels = {}
+
+
+def section_dimensions():
+    """section -> danh sách dimension, kể cả KPI (không group)"""
+    sections = {KPI_SECTION: []}
+    for section in engine.SECTIONS:
+        sections[section[1]] = [d for _, d in section[2]]
+    return sections
+
+
+def source_columns():
+    return engine.source_columns(extra_dimensions=("Year", "Month"))
+
+
+def _encode(value):
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _decode(value, dimension):
+    if value is None:
+        return None
+    source, derive, _ = engine.DIMENSIONS[dimension]
+    if derive is None and source in engine.MEASURES:
+        return float(value)
+    return value
+
+
+def _labels_query(section, column):
+    query = select(table.c[column]).distinct()
+    if section is not None:
+        query = query.where(table.c.section == section)
+    return query
+
+
+def _collect_labels(rows):
+    labels = {}
+    for (value,) in rows:
+        if value is not None:
+            labels.setdefault(engine.collation_key(value), value)
+    return labels
+
+
+def _cached_label(section, column, value):
+    """Nhãn trong cache hoặc None nếu phải đọc lại _labels_query"""
+    labels = _labels.get((section, column))
+    if labels is None:
+        return None
+    return labels.get(engine.collation_key(value))
+
+
+def _remember_label(section, column, value, labels):
+    _labels[(section, column)] = labels
+    return labels.setdefault(engine.collation_key(value), value)
+
+
+def _stored_label(db, section, column, value):
+    """Nhãn đang lưu cùng collation_key với value; chưa có thì đọc lại từ bảng, vẫn không có -> value"""
+    if not isinstance(value, str):
+        return value
+    label = _cached_label(section, column, value)
+    if label is None:
+        rows = db.execute(_labels_query(section, column))
+        label = _remember_label(section, column, value, _collect_labels(rows))
+    return label
+
+
+async def _stored_label_async(db, section, column, value):
+    if not isinstance(value, str):
+        return value
+    label = _cached_label(section, column, value)
+    if label is None:
+        rows = (await db.execute(_labels_query(section, column))).all()
+        label = _remember_label(section, column, value, _collect_labels(rows))
+    return label
+
+
+def compute_entries(columns):
+    """Partial theo (Year, Month, section, key) cho các dòng đã fetch"""
+    entries = {}
+    for section, dimensions in section_dimensions().items():
+        partial = engine.accumulate(columns, ["Year", "Month"] + dimensions)
+        for key, stats in partial.items():
+            entries[(key[0], key[1], section, key[2:])] = stats
+    return entries
+
+
+def _eq(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def _stats_values(stats):
+    values = {"n": int(stats[0])}
+    for i, (sum_col, cnt_col) in enumerate(MEASURE_COLUMNS):
+        values[sum_col] = float(stats[1 + 2 * i])
+        values[cnt_col] = int(stats[2 + 2 * i])
+    return values
+
+
+def _upsert_statements(year, month, section, key, stats):
+    """(UPDATE cộng dồn, INSERT nếu UPDATE không khớp dòng nào) cho 1 nhóm"""
+    keys = list(key) + [None] * (2 - len(key))
+    key1, key2 = _encode(keys[0]), _encode(keys[1])
+    where = and_(
+        _eq(table.c.Year, year), _eq(table.c.Month, month), table.c.section == section,
+        _eq(table.c.key1, key1), _eq(table.c.key2, key2),
+    )
+    values = _stats_values(stats)
+
+    return (
+        update(table).where(where).values({c: table.c[c] + v for c, v in values.items()}),
+        insert(table).values(Year=year, Month=month, section=section, key1=key1, key2=key2, **values),
+    )
+
+
+def _upsert(db, year, month, section, key, stats):
+    # UPDATE cộng dồn là atomic; nếu 2 request cùng INSERT một nhóm mới thì
+    # có 2 dòng trùng key, lúc đọc vẫn cộng lại nên kết quả không sai
+    update_stmt, insert_stmt = _upsert_statements(year, month, section, key, stats)
+    if db.execute(update_stmt).rowcount == 0:
+        db.execute(insert_stmt)
+
+
+def row_entries(rows: list):
+    """compute_entries cho các dòng dict (đã chuẩn hóa như normalize_loans)"""
+    names = source_columns()
+    columns = engine.columns_from_rows(names, [tuple(r.get(n) for n in names) for r in rows])
+    return compute_entries(columns)
+
+
+def apply_rows(db, rows: list, sign: int = 1):
+    """Cộng (sign=1) hoặc trừ (sign=-1) các loan vào rollups, chưa commit"""
+    if not rows:
+        return
+    for (year, month, section, key), stats in row_entries(rows).items():
+        month = _stored_label(db, None, "Month", month)
+        key = tuple(_stored_label(db, section, f"key{i + 1}", v) for i, v in enumerate(key))
+        _upsert(db, year, month, section, key, stats * sign)
+
+    if sign < 0:
+        db.execute(delete(table).where(table.c.n <= 0))
+
+
+async def apply_rows_async(db, rows: list, sign: int = 1):
+    """Như apply_rows trên AsyncSession: row_entries (NumPy) chạy trong executor"""
+    if not rows:
+        return
+    entries = await engine.in_executor(row_entries, rows)
+    for (year, month, section, key), stats in entries.items():
+        month = await _stored_label_async(db, None, "Month", month)
+        key = tuple([await _stored_label_async(db, section, f"key{i + 1}", v) for i, v in enumerate(key)])
+        update_stmt, insert_stmt = _upsert_statements(year, month, section, key, stats * sign)
+        if (await db.execute(update_stmt)).rowcount == 0:
+            await db.execute(insert_stmt)
+
+    if sign < 0:
+        await db.execute(delete(table).where(table.c.n <= 0))
+
+
+def _select_list(db, names):
+    """Cột nhóm chưa có trong bảng loans (DB import từ dump, trước migration 4) -> tính bằng CASE"""
+    bind = db.connection() if isinstance(db, Session) else db
+    existing = {c["name"] for c in inspect(bind).get_columns("loans")}
+    return [
+        f"{engine.GROUP_SQL[name]} AS {name}" if name not in existing and name in engine.GROUP_SQL else name
+        for name in names
+    ]
+
+
+def rebuild(db, chunk_size: int = REBUILD_CHUNK_SIZE):
+    """Tính lại toàn bộ rollups từ bảng loans (đọc theo từng khúc id)"""
+    names = source_columns()
+    sql = text(
+        f"SELECT id, {', '.join(_select_list(db, names))} FROM loans "
+        "WHERE id > :last_id ORDER BY id LIMIT :limit"
+    )
+
+    entries, last_id = {}, 0
+    while True:
+        rows = db.execute(sql, {"last_id": last_id, "limit": chunk_size}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        columns = engine.columns_from_rows(names, [tuple(r[1:]) for r in rows])
+        engine.merge_partials(entries, compute_entries(columns))
+
+    db.execute(delete(table))
+    batch = []
+    for (year, month, section, key), stats in entries.items():
+        keys = list(key) + [None] * (2 - len(key))
+        batch.append(dict(Year=year, Month=month, section=section,
+                          key1=_encode(keys[0]), key2=_encode(keys[1]), **_stats_values(stats)))
+    if batch:
+        db.execute(insert(table), batch)
+    _labels.clear()
+    return len(batch)
+
+
+def dashboard_query(year=None):
+    query = select(table).order_by(table.c.id)
+    if year:
+        query = query.where(table.c.Year == year)
+    return query
+
+
+def dashboard_from_rows(rows, month=None):
+    # Month lọc theo collation_key (không phân biệt hoa thường như MySQL)
+    month_key = engine.collation_key(month) if month else None
+
+    sections = section_dimensions()
+    items = {}
+    for row in rows:
+        dimensions = sections.get(row.section)
+        if dimensions is None or (month and engine.collation_key(row.Month) != month_key):
+            continue
+        key = tuple(_decode(v, d) for v, d in zip((row.key1, row.key2), dimensions))
+        stats = np.array([row.n] + [v for sum_col, cnt_col in MEASURE_COLUMNS
+                                    for v in (row._mapping[sum_col], row._mapping[cnt_col])],
+                         dtype=float)
+        items.setdefault(row.section, []).append((key, stats))
+
+    # Dòng trùng nhóm (2 request cùng INSERT, hoặc khác cách viết) cộng lại khi đọc
+    partials = {section: engine.merge_items({}, section_items) for section, section_items in items.items()}
+    return engine.build_dashboard(partials)
+
+
+def get_dashboard_data(db, month=None, year=None):
+    return dashboard_from_rows(db.execute(dashboard_query(year)), month)
+
+
+async def get_dashboard_data_async(db, month=None, year=None):
+    rows = (await db.execute(dashboard_query(year))).all()
+    return await engine.in_executor(dashboard_from_rows, rows, month)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        db = SessionLocal()
+        try:
+            count = rebuild(db)
+            db.commit()
+            print(f"Rebuilt loan_rollups: {count} rows")
+        finally:
+            db.close()
+    else:
+        print("Usage: python rollups.py rebuild")
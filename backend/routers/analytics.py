@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from database import get_db
+import analytics_query
+import dashboard_engine
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+def _run(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except analytics_query.QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except analytics_query.QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+# VD: /analytics/query?group_by=Region,loan_type&metrics=count,default_rate&filters=Year:2025,Month:October
+@router.get("/query")
+def analytics_query_endpoint(
+    group_by: str | None = None,
+    metrics: str = "count",
+    filters: str | None = None,
+    order_by: str | None = None,
+    limit: int | None = None,
+    db: Session = Depends(get_db)
+):
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be >= 1")
+    return _run(
+        lambda: analytics_query.run_query(
+            db,
+            analytics_query.parse_list(group_by),
+            analytics_query.parse_list(metrics),
+            analytics_query.parse_filters(filters),
+            order_by=order_by,
+            limit=limit,
+        )
+    )
+
+# Danh sách dimension / metric / preset được phép
+@router.get("/schema")
+def analytics_schema():
+    return {
+        "dimensions": list(dashboard_engine.DIMENSIONS),
+        "metrics": list(dashboard_engine.METRICS),
+        "presets": {
+            name: {
+                "group": section[0],
+                "group_by": [d for _, d in section[2]],
+                "metrics": [m for _, m in section[3]],
+            }
+            for name, section in analytics_query.PRESETS.items()
+        },
+        "max_groups": analytics_query.ANALYTICS_MAX_GROUPS,
+        "timeout_ms": analytics_query.ANALYTICS_QUERY_TIMEOUT_MS,
+    }
+
+# Section của dashboard chạy như 1 preset, VD: /analytics/presets/region?filters=Month:October
+@router.get("/presets/{name}")
+def analytics_preset(name: str, filters: str | None = None, db: Session = Depends(get_db)):
+    return _run(lambda: analytics_query.run_preset(db, name, analytics_query.parse_filters(filters)))
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import schemas, models
+import crud
+import write_behind
+from database import get_async_db
+from dashboard_cache import dashboard_cache, etag_response
+from routers.loans import enqueue_loan, filter_loans, page_query, page_rows
+
+# Bản async của các route đọc / ghi DB, chỉ được mount khi DB_ASYNC=1
+router = APIRouter(tags=["Async"])
+
+@router.get("/dashboard")
+async def get_dashboard(request: Request, response: Response, month: str | None = None, year: int | None = None, db: AsyncSession = Depends(get_async_db)):
+    data, etag = await dashboard_cache.get_async(
+        (month, year), lambda: crud.get_dashboard_data_async(db, month, year)
+    )
+    return etag_response(request, response, data, etag)
+
+@router.get("/loans/page", response_model=list[schemas.LoanResponse])
+async def read_loans_page(
+    response: Response,
+    page: int = 1,
+    size: int = 300,
+    id: int | None = None,
+    year: int | None = None,
+    month: str | None = None,
+    sort_id: str | None = None,
+    after_id: int | None = None,
+    before_id: int | None = None,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    query = filter_loans(select(models.Loan), id, year, month)
+    query, backward = page_query(query, page, size, sort_id, after_id, before_id, cursor)
+    rows = (await db.scalars(query)).all()
+    return page_rows(response, list(rows), size, backward, cursor is not None)
+
+@router.get("/loans/count")
+async def loans_count(db: AsyncSession = Depends(get_async_db)):
+    return {"total": await crud.count_loans_async(db)}
+
+@router.post("/loans/", response_model=schemas.LoanResponse)
+async def create_loan(loan: schemas.LoanCreate, db: AsyncSession = Depends(get_async_db)):
+    if write_behind.WRITE_BEHIND:
+        # submit có thể chờ chỗ trống trong hàng đợi -> không chạy trên event loop
+        return await run_in_threadpool(enqueue_loan, loan)
+    return await crud.create_loan_async(db, loan)
+
+@router.delete("/loans/{loan_id}")
+async def delete_loan(loan_id: int, db: AsyncSession = Depends(get_async_db)):
+    loan = await crud.delete_loan_async(db, loan_id)
+    if not loan:
+        return {"error": "Loan not found"}
+
+    return {"message": f"Loan {loan_id} deleted successfully"}
@@ -1,19 +1,33 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from database import get_db
-import crud
+from facets import facet_index
 
-router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
+# GET /dashboard (có cache / ETag) nằm ở main.py
+router = APIRouter(tags=["Dashboard"])
 
-@router.get("/")
-def get_dashboard(db: Session = Depends(get_db)):
-    return crud.get_dashboard_data(db)
-@router.get("/filters")
+# Year / Month đang có dữ liệu, lấy từ facet index trong RAM (facets.py)
+@router.get("/dashboard/filters")
 def get_filters(db: Session = Depends(get_db)):
-    return {
-        "years": get_available_years(db),
-        "months": get_available_months()
-    }
+    facet_index.ensure_built(db)
+    return facet_index.filters()
 
+@router.get("/facets")
+def get_facets(columns: str | None = None, db: Session = Depends(get_db)):
+    """
+    Giá trị khác nhau + số dòng của các cột phân loại (String, Year) của loans.
+    - columns: danh sách cột, phân cách bằng dấu phẩy (mặc định: tất cả)
+    """
+    facet_index.ensure_built(db)
+    if not columns:
+        return Response(content=facet_index.payload(), media_type="application/json")
 
+    selected = [c for c in columns.split(",") if c]
+    unknown = [c for c in selected if c not in facet_index.columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown facet columns {unknown} (choose from {facet_index.columns})")
+    return facet_index.facets(selected)
 
+@router.get("/facets/stats")
+def get_facet_stats():
+    return facet_index.stats()
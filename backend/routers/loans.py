@@ -1,32 +1,90 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
+import base64
+import io
+import json
+import pandas as pd
 import schemas, models
 from database import get_db
-from model_loader import predict as model_predict
+from model_loader import predict_batch as model_predict_batch, prediction_cache, shadow_score
+from model_loader import explain_batch, explanation_cache, EXPLAIN_TOP_K
+from pydantic import ValidationError
+from prediction_batcher import batcher
 import crud
+import loan_export
+import write_behind
+from metrics import timed
 router = APIRouter(prefix="/loans", tags=["Loans"])
 
+def encode_cursor(direction: str, loan_id: int) -> str:
+    raw = json.dumps({"d": direction, "id": loan_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        if data["d"] not in ("a", "b"):
+            raise ValueError
+        return data["d"], int(data["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def filter_loans(query, id: int | None = None, year: int | None = None, month: str | None = None):
+    if id is not None:
+        query = query.filter(models.Loan.id == id)
+
+    if year is not None:
+        query = query.filter(models.Loan.Year == year)
+
+    if month is not None:
+        query = query.filter(models.Loan.Month == month)
+
+    return query
+
+
 #API lấy danh sách loans với phân trang và lọc
+# - page/size: phân trang OFFSET/LIMIT như cũ
+# - after_id/before_id/cursor: phân trang keyset theo id, cursor trả về qua header
+#   X-Next-Cursor / X-Prev-Cursor
 @router.get("/page", response_model=list[schemas.LoanResponse])
 def read_loans_page(
+    response: Response,
     page: int = 1,
     size: int = 300,
     id: int | None = None,
     year: int | None = None,
     month: str | None = None,
     sort_id: str | None = None,
+    after_id: int | None = None,
+    before_id: int | None = None,
+    cursor: str | None = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.Loan)
+    query = filter_loans(db.query(models.Loan), id, year, month)
+    query, backward = page_query(query, page, size, sort_id, after_id, before_id, cursor)
+    return page_rows(response, query.all(), size, backward, cursor is not None)
 
-    if id is not None:
-        query = query.filter(models.Loan.id == id)
 
-    if year is not None:
-        query = query.filter(models.Loan.Year == year)
+def page_query(query, page: int, size: int, sort_id: str | None, after_id: int | None,
+               before_id: int | None, cursor: str | None):
+    """
+    Thêm ORDER BY / LIMIT của /loans/page vào query (Query sync hoặc select() cho
+    AsyncSession). Trả về (query, backward): backward=None nếu phân trang OFFSET.
+    """
+    if cursor is not None:
+        direction, cursor_id = decode_cursor(cursor)
+        if direction == "a":
+            after_id = cursor_id
+        else:
+            before_id = cursor_id
 
-    if month is not None:
-        query = query.filter(models.Loan.Month == month)
+    if after_id is not None or before_id is not None:
+        return keyset_query(query, size, sort_id, after_id, before_id)
 
     if sort_id == "asc":
         query = query.order_by(models.Loan.id.asc())
@@ -35,7 +93,69 @@ def read_loans_page(
         query = query.order_by(models.Loan.id.desc())
 
     offset = (page - 1) * size
-    return query.offset(offset).limit(size).all()
+    return query.offset(offset).limit(size), None
+
+
+# API xuất toàn bộ loans (cùng filter với /page) dạng stream: csv | ndjson | parquet
+@router.get("/export")
+def export_loans(
+    format: str = "csv",
+    id: int | None = None,
+    year: int | None = None,
+    month: str | None = None,
+    chunk_size: int = loan_export.EXPORT_CHUNK_SIZE,
+):
+    if format not in loan_export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(loan_export.FORMATS)}")
+    if format == "parquet" and not loan_export.has_pyarrow():
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be >= 1")
+
+    media_type, extension = loan_export.FORMATS[format]
+    stream = loan_export.export_stream(
+        format, lambda db: filter_loans(db.query(models.Loan), id, year, month), chunk_size
+    )
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="loans.{extension}"'},
+    )
+
+
+def keyset_query(query, size: int, sort_id: str | None, after_id: int | None, before_id: int | None):
+    descending = sort_id == "desc"
+    backward = after_id is None
+    key = before_id if backward else after_id
+
+    # Đi lùi = lấy theo chiều ngược lại rồi đảo kết quả
+    ascending = descending == backward
+    if ascending:
+        query = query.filter(models.Loan.id > key).order_by(models.Loan.id.asc())
+    else:
+        query = query.filter(models.Loan.id < key).order_by(models.Loan.id.desc())
+    return query.limit(size + 1), backward
+
+
+def page_rows(response: Response, rows: list, size: int, backward: bool | None, from_cursor: bool = False):
+    """
+    Kết quả của page_query; phân trang keyset thì cắt dòng thừa và gắn header cursor.
+    Trang đi tiến chỉ có X-Prev-Cursor khi được mở từ một cursor (trang đầu thì không).
+    """
+    if backward is None:
+        return rows
+
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if backward:
+        rows.reverse()
+
+    if rows:
+        if has_more or backward:
+            response.headers["X-Next-Cursor"] = encode_cursor("a", rows[-1].id)
+        if has_more if backward else from_cursor:
+            response.headers["X-Prev-Cursor"] = encode_cursor("b", rows[0].id)
+    return rows
 
 # API trả tổng số bản ghi
 @router.get("/count")
@@ -43,22 +163,136 @@ def loans_count(db: Session = Depends(get_db)):
     total = db.query(models.Loan).count()
     return {"total": total}
 
+def enqueue_loan(loan: schemas.LoanCreate):
+    """WRITE_BEHIND=1: xếp hàng cho group commit, trả 202 + ticket; hàng đợi đầy -> 503"""
+    try:
+        ticket = write_behind.writer.submit(loan)
+    except write_behind.QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return JSONResponse(
+        status_code=202,
+        content=ticket.as_dict(),
+        headers={"Location": f"/loans/tickets/{ticket.id}"},
+    )
+
 @router.post("/", response_model=schemas.LoanResponse)
 def create_loan(loan: schemas.LoanCreate, db: Session = Depends(get_db)):
+    if write_behind.WRITE_BEHIND:
+        return enqueue_loan(loan)
     return crud.create_loan(db, loan)
 
+# Trạng thái 1 loan đã nhận ở chế độ write-behind; wait > 0 thì chờ tối đa wait giây
+@router.get("/tickets/{ticket_id}")
+def get_ticket(ticket_id: str, wait: float = 0):
+    ticket = write_behind.writer.ticket(ticket_id)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    if wait > 0:
+        ticket.done.wait(min(wait, 30))
+    return ticket.as_dict()
+
+@router.get("/write-behind")
+def write_behind_stats():
+    return write_behind.writer.stats()
+
+def parse_bulk_body(body: bytes, content_type: str) -> list:
+    """Body của /loans/bulk: mảng JSON, hoặc CSV có dòng header (Content-Type: text/csv)"""
+    if "csv" in content_type:
+        try:
+            df = pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid CSV: {e}")
+        # Ô trống -> None để pydantic coi là thiếu giá trị
+        return [{k: (v if v != "" else None) for k, v in row.items()} for row in df.to_dict("records")]
+
+    try:
+        rows = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array")
+    return rows
+
+# Nhập hàng loạt: JSON array hoặc CSV; score=true thì chấm điểm cả lô trước khi ghi
+@router.post("/bulk")
+async def bulk_create_loans(request: Request, score: bool = False, chunk_size: int = crud.BULK_CHUNK_SIZE,
+                            db: Session = Depends(get_db)):
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be >= 1")
+    rows = parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    return await run_in_threadpool(crud.bulk_create_loans, db, rows, score, chunk_size)
+
+def run_explain(records: list, top_k: int) -> list:
+    if top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be >= 1")
+    try:
+        return explain_batch(records, top_k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Các request đồng thời được gom thành micro-batch (xem prediction_batcher)
+# explain=true: kèm top_k feature đóng góp nhiều nhất (TreeSHAP), không qua batcher
 @router.post("/predict")
-def predict_loan(data: schemas.LoanBase):
-    result = model_predict(data.dict())
+async def predict_loan(data: schemas.LoanBase, explain: bool = False, top_k: int = EXPLAIN_TOP_K):
+    features = data.dict()
+    if explain:
+        result = (await run_in_threadpool(run_explain, [features], top_k))[0]
+    else:
+        result = await batcher.submit(features)
+    shadow_score([features], [result])
     return result
 
+@router.get("/predict/stats")
+def predict_stats():
+    return batcher.stats()
+
+# Thống kê cache kết quả dự đoán (hit/miss/eviction)
+@router.get("/predict/cache")
+def predict_cache_stats():
+    return prediction_cache.stats()
+
+@router.delete("/predict/cache")
+def clear_predict_cache():
+    prediction_cache.clear()
+    explanation_cache.clear()
+    return {"message": "Prediction cache cleared"}
+
+@router.get("/predict/explain/cache")
+def explain_cache_stats():
+    return explanation_cache.stats()
+
+def score_rows(data: list[dict], score) -> list:
+    """Validate từng dòng, chấm 1 lần cho các dòng hợp lệ, dòng lỗi trả lỗi riêng"""
+    results = [None] * len(data)
+    valid_idx, valid_rows = [], []
+
+    with timed("validation"):
+        for i, row in enumerate(data):
+            try:
+                valid_rows.append(schemas.LoanBase(**row).dict())
+                valid_idx.append(i)
+            except ValidationError as e:
+                results[i] = {"error": e.errors(include_url=False, include_context=False)}
+
+    for i, result in zip(valid_idx, score(valid_rows)):
+        results[i] = result
+
+    return [{"index": i, **r} for i, r in enumerate(results)]
+
+# API chấm điểm hàng loạt: validate từng dòng, chấm 1 lần cho cả batch
+@router.post("/predict/batch")
+def predict_loans_batch(data: list[dict]):
+    return score_rows(data, model_predict_batch)
+
+# Như /predict/batch nhưng kèm top_k feature đóng góp nhiều nhất cho mỗi dòng
+@router.post("/predict/explain")
+def explain_loans_batch(data: list[dict], top_k: int = EXPLAIN_TOP_K):
+    return score_rows(data, lambda rows: run_explain(rows, top_k))
+
 @router.delete("/{loan_id}")
 def delete_loan(loan_id: int, db: Session = Depends(get_db)):
-    loan = db.query(models.Loan).filter(models.Loan.id == loan_id).first()
+    loan = crud.delete_loan(db, loan_id)
     if not loan:
         return {"error": "Loan not found"}
 
-    db.delete(loan)
-    db.commit()
     return {"message": f"Loan {loan_id} deleted successfully"}
-
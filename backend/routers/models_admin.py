@@ -0,0 +1,62 @@
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel
+
+import model_loader
+import model_registry
+from model_registry import registry
+
+# ADMIN_TOKEN: nếu đặt thì các API quản trị yêu cầu header X-Admin-Token
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+router = APIRouter(prefix="/admin/models", tags=["Models"], dependencies=[Depends(require_admin)])
+
+
+class ActivateRequest(BaseModel):
+    version: str
+
+
+class ShadowRequest(BaseModel):
+    version: str
+    sample_rate: float = 0.1
+
+
+def _call(fn, *args):
+    try:
+        return fn(*args)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model load failed: {e}")
+
+# Version đang active / shadow, danh sách version, thống kê theo version
+@router.get("")
+def models_status():
+    return {
+        **registry.status(),
+        "versions": model_registry.list_versions(),
+        "stats": registry.version_stats(),
+        "shadow_dropped": model_loader.shadow_dropped,
+    }
+
+# Load + warmup rồi mới đổi model; request đang chạy vẫn dùng model cũ
+@router.post("/activate")
+def activate_model(body: ActivateRequest):
+    return _call(registry.activate, body.version)
+
+@router.post("/rollback")
+def rollback_model():
+    return _call(registry.rollback)
+
+@router.post("/shadow")
+def set_shadow_model(body: ShadowRequest):
+    return _call(registry.set_shadow, body.version, body.sample_rate)
+
+@router.delete("/shadow")
+def clear_shadow_model():
+    return registry.clear_shadow()
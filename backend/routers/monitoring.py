@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from database import get_db
+from drift_monitor import DRIFT_MIN_SAMPLES, monitor
+from routers.models_admin import require_admin
+
+router = APIRouter(prefix="/monitoring", tags=["Monitoring"])
+
+# PSI / KS của traffic /loans/predict so với baseline (xem drift_monitor.py)
+@router.get("/drift")
+def get_drift(min_samples: int = DRIFT_MIN_SAMPLES):
+    return monitor.report(min_samples)
+
+# Sketch thô (histogram / bộ đếm) của baseline và traffic
+@router.get("/drift/sketches")
+def get_drift_sketches():
+    return monitor.sketches()
+
+# source=loans: dựng lại từ bảng loans; source=live: chốt traffic hiện tại làm baseline
+@router.post("/drift/baseline", dependencies=[Depends(require_admin)])
+def rebuild_drift_baseline(source: str = "loans", db: Session = Depends(get_db)):
+    if source == "loans":
+        return monitor.build_baseline(db)
+    if source == "live":
+        try:
+            return monitor.promote_live()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    raise HTTPException(status_code=400, detail="source must be one of ['loans', 'live']")
+
+# Xóa sketch traffic, giữ baseline
+@router.delete("/drift", dependencies=[Depends(require_admin)])
+def reset_drift():
+    monitor.reset()
+    return {"message": "Drift sketches reset"}
@@ -38,6 +38,14 @@ class LoanCreate(LoanBase):
     probability: float
 
 
+class LoanBulkRow(LoanBase):
+    """Một dòng của POST /loans/bulk; prediction/probability được tính khi score=true"""
+    age: float
+    credit_type: str
+    prediction: Optional[int] = None
+    probability: Optional[float] = None
+
+
 class LoanResponse(LoanBase):
     id: int
 
@@ -48,7 +56,7 @@ class LoanResponse(BaseModel):
     id: int
     Month: str
     Gender: str
-    age: str
+    age: float | None = None
     Region: str
     submission_of_application: str | None = None
     approv_in_adv: str | None = None
@@ -61,7 +69,7 @@ class LoanResponse(BaseModel):
     loan_type: str | None = None
     loan_purpose: str | None = None
     loan_amount: float | None = None
-    term: str | None = None
+    term: int | None = None
     rate_of_interest: float | None = None
     loan_limit: float | None = None
     business_or_commercial: str | None = None
@@ -77,6 +85,8 @@ class LoanResponse(BaseModel):
     prediction: int | None = None
     probability: float | None = None
     Year: int | None = None
+    age_group: str | None = None
+    loan_amount_group: str | None = None
 
     class Config:
         orm_mode = True
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Module backend import phẳng (như khi chạy `cd backend && uvicorn main:app`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
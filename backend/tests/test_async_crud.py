@@ -0,0 +1,167 @@
+"""
+Bản async (DB_ASYNC=1) của crud / routes: cùng kết quả với bản sync, và phần
+pandas / NumPy (normalize_loans, rollups, dashboard) không chạy trên thread
+của event loop - chỉ I/O đi qua AsyncSession.
+"""
+import asyncio
+import shutil
+import threading
+
+import pytest
+from fastapi import Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import dashboard_engine
+import rollups
+import schemas
+from analytics_snapshot import LoanSnapshot
+from benchmarks.sample_data import create_sqlite_db, load_dump_rows, loan_features
+from routers import async_routes, loans
+
+pytest.importorskip("aiosqlite")
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+N_ROWS = 2000
+
+
+@pytest.fixture(scope="module")
+def template_db(tmp_path_factory):
+    path = tmp_path_factory.mktemp("async") / "template.db"
+    engine = create_sqlite_db(str(path), N_ROWS)
+    with engine.begin() as conn:
+        rollups.rebuild(conn)
+    engine.dispose()
+    return path
+
+
+@pytest.fixture
+def sessions(template_db, tmp_path):
+    path = tmp_path / "loans.db"
+    shutil.copy(template_db, path)
+    engine = create_engine(f"sqlite:///{path}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    yield sessionmaker(bind=engine), async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+def run_async(async_factory, fn):
+    async def main():
+        async with async_factory() as db:
+            return await fn(db)
+    return asyncio.run(main())
+
+
+def sample_loan():
+    row = load_dump_rows()[0]
+    return schemas.LoanCreate(**loan_features(row), prediction=row["prediction"], probability=row["probability"])
+
+
+@pytest.mark.parametrize("source", ["rollup", "scan", "query", "snapshot"])
+@pytest.mark.parametrize("month", [None, "September"])
+def test_dashboard_matches_sync(sessions, monkeypatch, source, month):
+    session_factory, async_factory = sessions
+    monkeypatch.setattr(crud, "DASHBOARD_SOURCE", source)
+    monkeypatch.setattr(crud, "SessionLocal", session_factory)
+    monkeypatch.setattr(crud, "snapshot", LoanSnapshot())
+
+    with session_factory() as db:
+        expected = crud.get_dashboard_data(db, month)
+    assert expected["kpi"]["total_loans"] > 0
+    assert run_async(async_factory, lambda db: crud.get_dashboard_data_async(db, month)) == expected
+
+
+def test_cpu_work_runs_off_the_event_loop(sessions, monkeypatch):
+    _, async_factory = sessions
+    threads = []
+
+    def record(fn):
+        def wrapper(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return fn(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(crud, "normalize_loans", record(crud.normalize_loans))
+    monkeypatch.setattr(rollups, "row_entries", record(rollups.row_entries))
+    monkeypatch.setattr(dashboard_engine, "compute_partials", record(dashboard_engine.compute_partials))
+    monkeypatch.setattr(dashboard_engine, "build_dashboard", record(dashboard_engine.build_dashboard))
+
+    async def scenario(db):
+        loop_thread = threading.get_ident()
+        loan = await crud.create_loan_async(db, sample_loan())
+        for source in ("rollup", "scan"):
+            monkeypatch.setattr(crud, "DASHBOARD_SOURCE", source)
+            await crud.get_dashboard_data_async(db)
+        await crud.delete_loan_async(db, loan.id)
+        return loop_thread
+
+    loop_thread = run_async(async_factory, scenario)
+    # normalize + row_entries (create, delete) + build_dashboard x2 + compute_partials (scan)
+    assert len(threads) >= 6
+    assert loop_thread not in threads
+
+
+def test_create_and_delete_keep_rollups_in_sync(sessions):
+    session_factory, async_factory = sessions
+
+    loan = run_async(async_factory, lambda db: crud.create_loan_async(db, sample_loan()))
+    assert loan.id == N_ROWS + 1
+    with session_factory() as db:
+        data = rollups.get_dashboard_data(db)
+        assert data["kpi"]["total_loans"] == N_ROWS + 1
+        assert data == dashboard_engine.get_dashboard_data(db)
+
+    deleted = run_async(async_factory, lambda db: crud.delete_loan_async(db, loan.id))
+    assert deleted.id == loan.id
+    assert run_async(async_factory, lambda db: crud.delete_loan_async(db, loan.id)) is None
+    assert run_async(async_factory, crud.count_loans_async) == N_ROWS
+    with session_factory() as db:
+        assert rollups.get_dashboard_data(db) == dashboard_engine.get_dashboard_data(db)
+
+
+@pytest.mark.parametrize("params", [
+    {"page": 2, "size": 50, "sort_id": "desc"},
+    {"size": 50, "after_id": 100},
+    {"size": 50, "before_id": 100, "sort_id": "desc"},
+    {"size": 50, "cursor": loans.encode_cursor("b", 500), "year": 2025},
+])
+def test_loans_page_matches_sync(sessions, params):
+    session_factory, async_factory = sessions
+    defaults = {"page": 1, "size": 300, "id": None, "year": None, "month": None, "sort_id": None,
+                "after_id": None, "before_id": None, "cursor": None}
+    params = {**defaults, **params}
+
+    sync_response, async_response = Response(), Response()
+    with session_factory() as db:
+        expected = [row.id for row in loans.read_loans_page(sync_response, db=db, **params)]
+    rows = run_async(async_factory, lambda db: async_routes.read_loans_page(async_response, db=db, **params))
+    assert [row.id for row in rows] == expected
+    assert dict(async_response.headers) == dict(sync_response.headers)
+
+
+def test_loans_page_cursors_walk_back_to_first_page(sessions):
+    session_factory, _ = sessions
+    defaults = {"page": 1, "size": 50, "id": None, "year": None, "month": None, "sort_id": None,
+                "after_id": None, "before_id": None, "cursor": None}
+
+    def page(**params):
+        response = Response()
+        with session_factory() as db:
+            rows = loans.read_loans_page(response, db=db, **{**defaults, **params})
+        return [row.id for row in rows], response.headers
+
+    # Trang đầu (mở không có cursor) không có X-Prev-Cursor
+    first, headers = page(after_id=0)
+    assert first == list(range(1, 51))
+    assert "X-Prev-Cursor" not in headers
+
+    second, headers = page(cursor=headers["X-Next-Cursor"])
+    assert second == list(range(51, 101))
+
+    # Lùi về trang đầu: đúng các dòng cũ, và không còn gì phía trước
+    back, headers = page(cursor=headers["X-Prev-Cursor"])
+    assert back == first
+    assert "X-Prev-Cursor" not in headers
+    assert page(cursor=headers["X-Next-Cursor"])[0] == second
@@ -0,0 +1,294 @@
+"""
+Dashboard tính trong Python (dashboard_engine) phải khớp với 15 câu SQL của
+crud.get_dashboard_data trước khi đổi sang 1 lần quét (BASELINE_SQL bên dưới)
+chạy trên MySQL, nơi bảng loans dùng collation utf8mb4_unicode_ci: GROUP BY /
+WHERE không phân biệt hoa thường và bỏ khoảng trắng cuối, SUM / COUNT là phép
+chia thực.
+
+Không có MySQL trong test nên dùng SQLite với collation "unicode_ci" đăng ký
+bằng Python cho mọi cột chuỗi của loans; SQL gốc chỉ thêm CAST(... AS REAL) để
+SQLite không chia nguyên.
+"""
+import math
+
+import pytest
+from sqlalchemy import MetaData, String, create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import dashboard_engine
+import migrations
+import models
+import rollups
+from analytics_snapshot import LoanSnapshot
+from benchmarks.sample_data import load_dump_rows
+
+# Các dòng thêm vào dump: cùng giá trị nhưng khác cách viết / có khoảng trắng cuối
+MIXED_CASE_ROWS = [
+    {"Month": "october", "Region": "SOUTH", "Gender": "MALE", "loan_type": "TYPE1 ",
+     "loan_purpose": "P1", "occupancy_type": "PR", "Secured_by": "Home"},
+    {"Month": "OCTOBER", "Region": "north-EAST", "Gender": "female", "loan_type": "type2",
+     "loan_purpose": "p3 ", "occupancy_type": "Ir", "Secured_by": "LAND"},
+    {"Month": "September ", "Region": "central", "Gender": "Sex not av", "loan_type": "Type3",
+     "loan_purpose": "P4", "occupancy_type": "sr", "Secured_by": "land"},
+]
+
+
+DEFAULT_RATE = "(CAST(SUM(prediction) AS REAL) / COUNT(*)) * 100"
+
+# (nhóm, section, SELECT ... GROUP BY ... [ORDER BY]) của crud.get_dashboard_data cũ.
+# age_group / loan_amount_group: GROUP BY 1 (biểu thức CASE như SQL gốc) vì bảng
+# loans giờ có cột cùng tên lưu sẵn, SQLite sẽ group theo cột đó thay vì alias
+BASELINE_SQL = [
+    ("demographics", "gender", f"""
+        SELECT Gender, COUNT(*) AS total_loans, SUM(prediction) AS default_count,
+               {DEFAULT_RATE} AS default_rate_percent, AVG(probability) AS avg_probability
+        FROM loans WHERE {{where}} GROUP BY Gender"""),
+    ("demographics", "age_group", f"""
+        SELECT CASE
+                   WHEN age < 25 THEN '<25'
+                   WHEN age BETWEEN 25 AND 34 THEN '25-34'
+                   WHEN age BETWEEN 35 AND 44 THEN '35-44'
+                   WHEN age BETWEEN 45 AND 54 THEN '45-54'
+                   WHEN age BETWEEN 55 AND 64 THEN '55-64'
+                   WHEN age BETWEEN 65 AND 74 THEN '65-74'
+                   ELSE '>74'
+               END AS age_group,
+               COUNT(*) AS total_loans, {DEFAULT_RATE} AS default_rate_percent,
+               AVG(Credit_Score) AS avg_credit_score
+        FROM loans WHERE {{where}} GROUP BY 1
+        ORDER BY CASE
+                     WHEN age_group = '<25' THEN 1
+                     WHEN age_group = '25-34' THEN 2
+                     WHEN age_group = '35-44' THEN 3
+                     WHEN age_group = '45-54' THEN 4
+                     WHEN age_group = '55-64' THEN 5
+                     WHEN age_group = '65-74' THEN 6
+                     WHEN age_group = '>74' THEN 7
+                 END"""),
+    ("demographics", "region", f"""
+        SELECT Region, COUNT(*) AS total_loans, AVG(probability) AS avg_probability,
+               {DEFAULT_RATE} AS default_rate_percent
+        FROM loans WHERE {{where}} GROUP BY Region"""),
+    ("loan_characteristics", "loan_type", f"""
+        SELECT loan_type, COUNT(*) AS total_loans, {DEFAULT_RATE} AS default_rate_percent,
+               AVG(rate_of_interest) AS avg_interest_rate
+        FROM loans WHERE {{where}} GROUP BY loan_type ORDER BY loan_type"""),
+    ("loan_characteristics", "purpose", f"""
+        SELECT loan_purpose AS purpose, COUNT(*) AS loan_count,
+               {DEFAULT_RATE} AS default_rate_percent, AVG(probability) AS avg_probability
+        FROM loans WHERE {{where}} GROUP BY loan_purpose ORDER BY loan_purpose"""),
+    ("loan_characteristics", "interest_rate", f"""
+        SELECT rate_of_interest, AVG(probability) AS avg_probability,
+               {DEFAULT_RATE} AS default_rate_percent
+        FROM loans WHERE {{where}} GROUP BY rate_of_interest ORDER BY rate_of_interest"""),
+    ("loan_characteristics", "loan_amount_group", f"""
+        SELECT CASE
+                   WHEN loan_amount < 300000 THEN '<300k'
+                   WHEN loan_amount >= 300000 AND loan_amount < 900000 THEN '300k-900k'
+                   WHEN loan_amount >= 900000 AND loan_amount <= 2000000 THEN '900k-2M'
+                   ELSE '>2M'
+               END AS loan_amount_group,
+               COUNT(*) AS total_loans, AVG(loan_amount) AS avg_loan_amount,
+               {DEFAULT_RATE} AS default_rate_percent, AVG(probability) AS avg_probability
+        FROM loans WHERE {{where}} GROUP BY 1
+        ORDER BY CASE
+                     WHEN loan_amount_group = '<300k' THEN 1
+                     WHEN loan_amount_group = '300k-900k' THEN 2
+                     WHEN loan_amount_group = '900k-2M' THEN 3
+                     WHEN loan_amount_group = '>2M' THEN 4
+                 END"""),
+    ("collateral_application", "submission_method", f"""
+        SELECT submission_of_application AS submission, approv_in_adv AS pre_approval,
+               {DEFAULT_RATE} AS default_rate_percent, AVG(probability) AS avg_probability
+        FROM loans WHERE {{where}}
+        GROUP BY submission_of_application, approv_in_adv
+        ORDER BY submission_of_application, pre_approval"""),
+    ("collateral_application", "occupancy_type", f"""
+        SELECT occupancy_type, {DEFAULT_RATE} AS default_rate_percent, AVG(probability) AS avg_probability
+        FROM loans WHERE {{where}} GROUP BY occupancy_type"""),
+    ("collateral_application", "secured_by", f"""
+        SELECT Secured_by, {DEFAULT_RATE} AS default_rate_percent, AVG(loan_amount) AS avg_loan_amount
+        FROM loans WHERE {{where}} GROUP BY Secured_by"""),
+]
+# Các section có ORDER BY trong SQL gốc: so cả thứ tự nhóm
+ORDERED_SECTIONS = {"age_group", "loan_type", "purpose", "interest_rate", "loan_amount_group", "submission_method"}
+SECTION_ALIASES = {section[1]: [alias for alias, _ in section[2]] for section in dashboard_engine.SECTIONS}
+
+
+def baseline_dashboard(db, month=None, year=None):
+    """crud.get_dashboard_data trước khi có dashboard_engine (4 câu KPI + 10 section)"""
+    conditions, params = ["1=1"], {}
+    if month:
+        conditions.append("Month = :month")
+        params["month"] = month
+    if year:
+        conditions.append("Year = :year")
+        params["year"] = year
+    where = " AND ".join(conditions)
+
+    row = db.execute(text(f"""
+        SELECT COUNT(id) AS total_loans, AVG(Credit_Score) AS avg_credit_score,
+               AVG(loan_amount) AS avg_loan_amount, {DEFAULT_RATE} AS default_rate_percent
+        FROM loans WHERE {where}"""), params).fetchone()
+    data = {"kpi": {
+        "total_loans": int(row.total_loans or 0),
+        "avg_credit_score": float(row.avg_credit_score) if row.avg_credit_score is not None else None,
+        "avg_loan_amount": float(row.avg_loan_amount) if row.avg_loan_amount is not None else None,
+        "default_rate_percent": float(row.default_rate_percent) if row.default_rate_percent is not None else 0.0,
+        "model_accuracy": 93.40,
+    }}
+    for group, name, sql in BASELINE_SQL:
+        rows = db.execute(text(sql.format(where=where)), params).fetchall()
+        data.setdefault(group, {})[name] = [dict(r._mapping) for r in rows]
+    return data
+
+
+def unicode_ci(a: str, b: str) -> int:
+    """Đủ giống utf8mb4_unicode_ci cho dữ liệu test: không phân biệt hoa thường, bỏ khoảng trắng cuối"""
+    a, b = a.rstrip(" ").casefold(), b.rstrip(" ").casefold()
+    return (a > b) - (a < b)
+
+
+def fold(value):
+    return value.rstrip(" ").casefold() if isinstance(value, str) else value
+
+
+def fixture_rows():
+    rows = [dict(row, age=float(row["age"]), term=int(row["term"])) for row in load_dump_rows()]
+    last_id = max(row["id"] for row in rows)
+    for i, overrides in enumerate(MIXED_CASE_ROWS):
+        rows.append(dict(rows[i * 7], id=last_id + i + 1, **overrides))
+    return rows
+
+
+@pytest.fixture(scope="module")
+def mysql_like_db(tmp_path_factory):
+    """SQLite có bảng loans với mọi cột chuỗi COLLATE unicode_ci, nạp dump + MIXED_CASE_ROWS"""
+    path = tmp_path_factory.mktemp("parity") / "loans.db"
+    engine = create_engine(f"sqlite:///{path}")
+
+    @event.listens_for(engine, "connect")
+    def register_collation(dbapi_connection, _):
+        dbapi_connection.create_collation("unicode_ci", unicode_ci)
+
+    metadata = MetaData()
+    loans = models.Loan.__table__.to_metadata(metadata)
+    for column in loans.columns:
+        if isinstance(column.type, String):
+            column.type = String(column.type.length, collation="unicode_ci")
+    models.LoanRollup.__table__.to_metadata(metadata)
+    metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        conn.execute(loans.insert(), fixture_rows())
+        migrations.backfill_loan_groups(conn)
+
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def assert_same_dashboard(actual: dict, expected: dict, rel_tol: float = 1e-9):
+    """So từng section không phụ thuộc thứ tự nhóm; nhãn so theo collation, số so gần đúng"""
+    assert actual["kpi"] == pytest.approx(expected["kpi"], rel=rel_tol)
+    for group in ("demographics", "loan_characteristics", "collateral_application"):
+        assert actual[group].keys() == expected[group].keys()
+        for name, expected_rows in expected[group].items():
+            aliases = SECTION_ALIASES[name]
+            if name in ORDERED_SECTIONS:
+                order = lambda rows: [tuple(fold(row[a]) for a in aliases) for row in rows]
+                assert order(actual[group][name]) == order(expected_rows), f"{group}.{name} order"
+
+            def by_key(rows):
+                out = {}
+                for row in rows:
+                    key = tuple(fold(row[a]) for a in aliases)
+                    assert key not in out, f"{group}.{name}: duplicate group {key}"
+                    out[key] = {k: v for k, v in row.items() if k not in aliases}
+                return out
+
+            actual_groups, expected_groups = by_key(actual[group][name]), by_key(expected_rows)
+            assert actual_groups.keys() == expected_groups.keys(), f"{group}.{name}"
+            for key, values in expected_groups.items():
+                for metric, value in values.items():
+                    got = actual_groups[key][metric]
+                    if value is None or got is None:
+                        assert got == value, f"{group}.{name} {key} {metric}"
+                    else:
+                        assert math.isclose(got, value, rel_tol=rel_tol), f"{group}.{name} {key} {metric}"
+
+
+@pytest.mark.parametrize("month", [None, "October", "october", "SEPTEMBER"])
+def test_scan_matches_case_insensitive_sql(mysql_like_db, month):
+    expected = baseline_dashboard(mysql_like_db, month)
+    actual = dashboard_engine.get_dashboard_data(mysql_like_db, month)
+    assert_same_dashboard(actual, expected)
+
+
+def test_case_variants_are_one_group_labelled_with_first_spelling(mysql_like_db):
+    data = dashboard_engine.get_dashboard_data(mysql_like_db)
+    regions = [row["Region"] for row in data["demographics"]["region"]]
+    genders = [row["Gender"] for row in data["demographics"]["gender"]]
+    assert sorted(regions) == ["Central", "North", "North-East", "South"]
+    assert sorted(genders) == ["Female", "Joint", "Male", "Sex Not Av"]
+
+    loan_types = data["loan_characteristics"]["loan_type"]
+    assert [row["loan_type"] for row in loan_types] == ["type1", "type2", "type3"]
+    assert sum(row["total_loans"] for row in loan_types) == data["kpi"]["total_loans"]
+
+
+def test_default_rate_is_not_integer_division(mysql_like_db):
+    data = dashboard_engine.get_dashboard_data(mysql_like_db)
+    rates = [row["default_rate_percent"] for row in data["demographics"]["region"]]
+    assert all(0 < rate < 100 for rate in rates)
+
+
+@pytest.mark.parametrize("month", [None, "October", "october"])
+def test_rollups_match_case_insensitive_sql(mysql_like_db, month):
+    rollups.rebuild(mysql_like_db)
+    expected = baseline_dashboard(mysql_like_db, month)
+    assert_same_dashboard(rollups.get_dashboard_data(mysql_like_db, month), expected)
+    mysql_like_db.rollback()
+
+
+def test_rollup_writes_reuse_stored_spelling(mysql_like_db):
+    rollups.rebuild(mysql_like_db)
+    count = mysql_like_db.query(models.LoanRollup).count()
+    before = rollups.get_dashboard_data(mysql_like_db)["demographics"]["region"]
+
+    loan = crud.loan_to_dict(mysql_like_db.query(models.Loan).first())
+    upper = {k: v.upper() for k, v in loan.items() if isinstance(v, str) and not v.startswith(("<", ">"))}
+    rollups.apply_rows(mysql_like_db, [dict(loan, **upper)], +1)
+
+    # Mọi nhóm đã có sẵn (khác cách viết) -> chỉ cộng dồn, không thêm dòng rollups
+    assert mysql_like_db.query(models.LoanRollup).count() == count
+    after = rollups.get_dashboard_data(mysql_like_db)["demographics"]["region"]
+    totals = lambda rows: {row["Region"]: row["total_loans"] for row in rows}
+    expected = totals(before)
+    expected[next(r for r in expected if fold(r) == fold(loan["Region"]))] += 1
+    assert totals(after) == expected
+
+    rollups.apply_rows(mysql_like_db, [dict(loan, **upper)], -1)
+    assert rollups.get_dashboard_data(mysql_like_db)["demographics"]["region"] == before
+    mysql_like_db.rollback()
+
+
+@pytest.mark.parametrize("month", [None, "October", "october", "SEPTEMBER"])
+def test_snapshot_matches_case_insensitive_sql(mysql_like_db, month):
+    snapshot = LoanSnapshot()
+    snapshot.load(mysql_like_db)
+    expected = baseline_dashboard(mysql_like_db, month)
+    # Measure của snapshot lưu float32
+    assert_same_dashboard(snapshot.get_dashboard_data(mysql_like_db, month), expected, rel_tol=1e-6)
+
+
+def test_snapshot_append_reuses_dictionary_codes(mysql_like_db):
+    snapshot = LoanSnapshot()
+    snapshot.load(mysql_like_db)
+    cardinality = snapshot.stats()["cardinality"]
+
+    loan = crud.loan_to_dict(mysql_like_db.query(models.Loan).first())
+    snapshot.append([dict(loan, id=-1, Month=loan["Month"].upper(), Region=loan["Region"].lower())])
+    assert snapshot.stats()["cardinality"] == cardinality
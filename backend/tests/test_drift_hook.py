@@ -0,0 +1,83 @@
+"""
+Drift monitor chỉ nhận traffic online (/loans/predict, /loans/predict/batch),
+không nhận các dòng chấm điểm khi nhập hàng loạt (bulk_create_loans score=True);
+observe chạy đua với promote_live không cộng vào baseline vừa chốt.
+"""
+import asyncio
+import contextlib
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import drift_monitor
+import schemas
+from benchmarks.sample_data import load_dump_rows, loan_features
+from database import Base
+from prediction_batcher import PredictionBatcher
+from routers import loans
+
+N_ROWS = 20
+
+
+@pytest.fixture
+def observed(monkeypatch):
+    rows = []
+    monkeypatch.setattr(drift_monitor, "DRIFT_MONITOR", True)
+    monkeypatch.setattr(drift_monitor.monitor, "observe", lambda records, results: rows.extend(records))
+    return rows
+
+
+@pytest.fixture
+def records():
+    return [loan_features(row) for row in load_dump_rows()[:N_ROWS]]
+
+
+def test_bulk_import_scoring_is_not_observed(observed, records, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'loans.db'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        report = crud.bulk_create_loans(db, records, score=True)
+    engine.dispose()
+
+    assert report["inserted"] == N_ROWS
+    assert observed == []
+
+
+def test_online_predict_batch_is_observed(observed, records):
+    results = loans.predict_loans_batch(records)
+    assert all("error" not in r for r in results)
+    assert len(observed) == N_ROWS
+
+
+def test_online_predict_is_observed(observed, records, monkeypatch):
+    monkeypatch.setattr(loans, "batcher", PredictionBatcher(max_wait_ms=1))
+    data = schemas.LoanBase(**records[0])
+    result = asyncio.run(loans.predict_loan(data))
+    assert "error" not in result
+    assert len(observed) == 1
+
+
+def test_observe_racing_promote_live_does_not_touch_new_baseline(records, monkeypatch, tmp_path):
+    monitor = drift_monitor.DriftMonitor(state_path=str(tmp_path / "drift.json"))
+    edges = {c: [0.0, 1.0, 1e6] for c in drift_monitor.NUMERIC_FEATURES + [drift_monitor.PROBABILITY]}
+    monitor.set_baseline(drift_monitor.DriftSketches.with_edges(edges), "test")
+    scored = [{"prediction": 0, "probability": 0.5}] * len(records)
+    monitor.observe(records, scored)
+
+    # promote_live chạy đúng lúc observe đã qua kiểm tra live nhưng chưa ghi
+    timed = drift_monitor.timed
+
+    @contextlib.contextmanager
+    def promote_then_time(name):
+        monkeypatch.setattr(drift_monitor, "timed", timed)
+        monitor.promote_live()
+        with timed(name):
+            yield
+
+    monkeypatch.setattr(drift_monitor, "timed", promote_then_time)
+    monitor.observe(records, scored)
+
+    assert monitor.baseline.n == monitor.baseline_info["n"] == N_ROWS
+    assert monitor.live.n == N_ROWS
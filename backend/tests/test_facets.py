@@ -0,0 +1,87 @@
+"""
+Facet index đếm theo collation_key như dashboard: 'North' / 'north' là 1 giá trị
+(nhãn = cách viết gặp đầu tiên), add / remove khác cách viết không làm lệch số
+dòng so với bảng loans.
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import dashboard_engine
+import migrations
+import models
+from benchmarks.sample_data import load_dump_rows
+from database import Base
+from facets import FacetIndex
+
+N_ROWS = 300
+MIXED_CASE = [
+    {"Region": "north", "Month": "september", "Gender": "MALE"},
+    {"Region": "SOUTH ", "Month": "SEPTEMBER", "Gender": "female"},
+    {"Region": "central", "Month": "September", "Gender": "Male"},
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'loans.db'}")
+    Base.metadata.create_all(engine)
+    rows = [dict(row, age=float(row["age"]), term=int(row["term"])) for row in load_dump_rows()[:N_ROWS]]
+    last_id = max(row["id"] for row in rows)
+    rows += [dict(rows[i], id=last_id + i + 1, **overrides) for i, overrides in enumerate(MIXED_CASE)]
+    with engine.begin() as conn:
+        conn.execute(models.Loan.__table__.insert(), rows)
+        migrations.backfill_loan_groups(conn)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def index(db):
+    index = FacetIndex()
+    index.build(db)
+    return index
+
+
+def values(index, column):
+    return {v["value"]: v["count"] for v in index.facets([column])["columns"][column]}
+
+
+def folded(counts: dict) -> dict:
+    """Nhãn so theo collation (nhãn của facet là cách viết đầu tiên trong kết quả GROUP BY)"""
+    return {dashboard_engine.collation_key(k): v for k, v in counts.items()}
+
+
+def test_case_variants_are_one_facet_value(db, index):
+    regions = folded(values(index, "Region"))
+    assert sorted(regions) == ["central", "north", "north-east", "south"]
+    assert sum(regions.values()) == N_ROWS + len(MIXED_CASE)
+
+    # Cùng số dòng với breakdown Region của dashboard
+    dashboard = dashboard_engine.get_dashboard_data(db)["demographics"]["region"]
+    assert regions == folded({row["Region"]: row["total_loans"] for row in dashboard})
+    assert len(values(index, "Gender")) == len(dashboard_engine.get_dashboard_data(db)["demographics"]["gender"])
+    assert [m.casefold() for m in index.filters()["months"]] == ["september"]
+
+
+def test_add_and_remove_other_spellings_do_not_drift(db, index):
+    before = folded(values(index, "Region"))
+    loan = crud.loan_to_dict(db.query(models.Loan).filter(models.Loan.Region == "north").first())
+
+    index.add([dict(loan, Region="NORTH")])
+    after_add = folded(values(index, "Region"))
+    assert after_add["north"] == before["north"] + 1 and set(after_add) == set(before)
+
+    index.remove([loan])
+    index.remove([dict(loan, Region="North")])
+    assert folded(values(index, "Region"))["north"] == before["north"] - 1
+
+    # Xóa hết 1 giá trị thì giá trị đó biến mất, thêm lại lấy cách viết mới
+    for _ in range(before["north"] - 1):
+        index.remove([loan])
+    assert "north" not in folded(values(index, "Region"))
+    index.add([dict(loan, Region="NoRtH")])
+    assert values(index, "Region")["NoRtH"] == 1
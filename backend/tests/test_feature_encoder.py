@@ -0,0 +1,72 @@
+"""
+FeatureEncoder (fast path của model_loader) phải cho đúng ma trận feature của
+ColumnTransformer trong Pipeline và xác suất giống hệt bit với predict_proba.
+"""
+import numpy as np
+import pytest
+
+import model_loader
+import model_registry
+from benchmarks.sample_data import load_dump_rows, loan_features
+
+
+@pytest.fixture(scope="module")
+def loaded():
+    loaded = model_registry.load_version(model_registry.BASE_VERSION, "pickle")
+    assert loaded.encoder is not None, "pipeline không dựng được FeatureEncoder"
+    return loaded
+
+
+@pytest.fixture(scope="module")
+def records():
+    records = [loan_features(r) for r in load_dump_rows()]
+    # Thiếu giá trị số / category lạ / key "co-applicant" dạng gạch ngang như request gốc
+    edge = dict(records[0], income=None, Credit_Score=None, rate_of_interest=None)
+    unknown = dict(records[1], loan_type="type9", Region="Nowhere", Gender=None)
+    hyphen = {("co-applicant_credit_type" if k == "co_applicant_credit_type" else k): v
+              for k, v in records[2].items()}
+    return records + [edge, unknown, hyphen]
+
+
+def pipeline_features(loaded, records):
+    X = model_loader._build_frame(records)
+    transformed = loaded.model.named_steps["preprocessor"].transform(X)
+    if hasattr(transformed, "toarray"):
+        transformed = transformed.toarray()
+    return np.asarray(transformed, dtype=np.float64).astype(np.float32)
+
+
+def test_encoder_matches_column_transformer(loaded, records):
+    expected = pipeline_features(loaded, records)
+    actual = loaded.encoder.encode_batch(records)
+    assert actual.dtype == np.float32
+    assert np.array_equal(actual, expected, equal_nan=True)
+
+
+def test_encoder_matches_column_transformer_one_row_at_a_time(loaded, records):
+    for record in records[:200] + records[-3:]:
+        expected = pipeline_features(loaded, [record])
+        assert np.array_equal(loaded.encoder.encode_batch([record]), expected, equal_nan=True)
+
+
+def test_fast_path_probabilities_are_bit_identical(loaded, records):
+    expected = loaded.model.predict_proba(model_loader._build_frame(records))[:, 1]
+    actual = loaded.booster.inplace_predict(loaded.encoder.encode_batch(records))
+    assert np.array_equal(actual, expected)
+
+    fast = model_loader._score_fast(records, loaded)
+    pandas = model_loader._score_frame(model_loader._build_frame(records), loaded.model)
+    assert fast == pandas
+
+
+def test_fast_path_single_row_is_bit_identical(loaded, records):
+    for record in records[:200]:
+        expected = loaded.model.predict_proba(model_loader._build_frame([record]))[:, 1]
+        assert np.array_equal(loaded.booster.inplace_predict(loaded.encoder.encode_batch([record])), expected)
+
+
+def test_encoder_rejects_missing_columns(loaded, records):
+    record = dict(records[0])
+    del record["credit_type"]
+    with pytest.raises(ValueError, match="columns are missing"):
+        loaded.encoder.encode_batch([record])
@@ -0,0 +1,128 @@
+"""
+loan_export stream theo chunk: đủ dòng theo thứ tự id cho mọi định dạng, mỗi
+chunk ra 1 phần của response, và bộ nhớ đỉnh (tracemalloc) không tăng theo số
+dòng của bảng như crud.get_loans (.all()).
+"""
+import csv
+import io
+import json
+import math
+import tracemalloc
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import loan_export
+import models
+from benchmarks.sample_data import create_sqlite_db
+
+CHUNK_SIZE = 500
+SMALL, LARGE = 2000, 10000
+
+
+@pytest.fixture(scope="module")
+def databases(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("export")
+    engines = {n: create_sqlite_db(str(directory / f"loans_{n}.db"), n) for n in (SMALL, LARGE)}
+    yield {n: sessionmaker(bind=engine) for n, engine in engines.items()}
+    for engine in engines.values():
+        engine.dispose()
+
+
+@pytest.fixture
+def use_db(databases, monkeypatch):
+    def use(n):
+        monkeypatch.setattr(loan_export, "SessionLocal", databases[n])
+        return databases[n]
+    return use
+
+
+def all_loans(db):
+    return db.query(models.Loan)
+
+
+def export(fmt, chunk_size=CHUNK_SIZE):
+    return list(loan_export.export_stream(fmt, all_loans, chunk_size))
+
+
+def test_csv_streams_one_part_per_chunk(use_db):
+    use_db(SMALL)
+    parts = export("csv")
+    assert len(parts) == math.ceil(SMALL / CHUNK_SIZE)
+
+    rows = list(csv.reader(io.StringIO(b"".join(parts).decode())))
+    assert rows[0] == loan_export.COLUMN_NAMES
+    ids = [int(r[0]) for r in rows[1:]]
+    assert ids == list(range(1, SMALL + 1))
+
+
+def test_ndjson_round_trips(use_db):
+    use_db(SMALL)
+    parts = export("ndjson")
+    assert len(parts) == math.ceil(SMALL / CHUNK_SIZE)
+    records = [json.loads(line) for part in parts for line in part.decode().splitlines()]
+    assert [r["id"] for r in records] == list(range(1, SMALL + 1))
+    assert set(records[0]) == set(loan_export.COLUMN_NAMES)
+
+
+def test_parquet_writes_one_row_group_per_chunk(use_db):
+    pq = pytest.importorskip("pyarrow.parquet")
+    use_db(SMALL)
+    parts = export("parquet")
+    assert len(parts) > 1
+
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(parts)))
+    assert parquet.metadata.num_rows == SMALL
+    assert parquet.metadata.num_row_groups == math.ceil(SMALL / CHUNK_SIZE)
+    assert parquet.read(columns=["id"]).column("id").to_pylist() == list(range(1, SMALL + 1))
+
+
+def test_first_part_is_sent_before_the_table_is_read(use_db):
+    session_factory = use_db(LARGE)
+    stream = loan_export.export_stream("csv", all_loans, CHUNK_SIZE)
+    first = next(stream)
+    stream.close()
+    assert first.decode().count("\n") == CHUNK_SIZE + 1
+    with session_factory() as db:
+        assert db.query(models.Loan).count() == LARGE
+
+
+def peak_bytes(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def drain(fmt):
+    for _ in loan_export.export_stream(fmt, all_loans, CHUNK_SIZE):
+        pass
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson", "parquet"])
+def test_peak_memory_does_not_grow_with_table_size(use_db, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    use_db(SMALL)
+    drain(fmt)  # import / khởi tạo lần đầu không tính
+    small = peak_bytes(lambda: drain(fmt))
+    use_db(LARGE)
+    large = peak_bytes(lambda: drain(fmt))
+    # Bảng lớn gấp 5 lần, bộ nhớ đỉnh gần như không đổi
+    assert large < 1.5 * small, (small, large)
+
+
+def test_streaming_uses_far_less_memory_than_loading_all_rows(use_db):
+    session_factory = use_db(LARGE)
+    drain("csv")
+    streamed = peak_bytes(lambda: drain("csv"))
+
+    def load_all():
+        with session_factory() as db:
+            crud.get_loans(db)
+
+    loaded = peak_bytes(load_all)
+    assert streamed * 5 < loaded, (streamed, loaded)
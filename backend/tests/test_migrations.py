@@ -0,0 +1,100 @@
+"""
+Sau `migrations.upgrade`, các query nóng (HOT_QUERIES) phải dùng index của
+bảng loans theo migrations.explain - trên DB mới lẫn DB có sẵn bảng loans
+không index (như import từ dump).
+"""
+import pytest
+from sqlalchemy import Column, MetaData, String, Table, create_engine
+from sqlalchemy.orm import sessionmaker
+
+import dashboard_engine
+import migrations
+import models
+import rollups
+from benchmarks.sample_data import load_dump_rows
+
+EXPECTED_INDEX = {
+    "dashboard (month + year)": "ix_loans_year_month_id",
+    "dashboard (month)": "ix_loans_month_id",
+    "loans page (year + month, keyset)": "ix_loans_year_month_id",
+}
+
+
+@pytest.fixture
+def fresh_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    yield engine
+    engine.dispose()
+
+
+def assert_hot_queries_use_indexes(engine):
+    plans = {name: migrations.explain(engine, sql, params) for name, sql, params in migrations.HOT_QUERIES}
+    for name, index in EXPECTED_INDEX.items():
+        plan, used = plans[name]
+        assert used == index, f"{name}: {plan}"
+    for name, (plan, used) in plans.items():
+        assert used is not None, f"{name} does not use an index: {plan}"
+
+
+def test_fresh_database_uses_filter_indexes(fresh_engine):
+    migrations.upgrade(fresh_engine)
+    assert all(applied for _, _, applied in migrations.status(fresh_engine))
+    assert_hot_queries_use_indexes(fresh_engine)
+
+
+def test_existing_loans_table_gets_indexes(fresh_engine):
+    metadata = MetaData()
+    loans = models.Loan.__table__.to_metadata(metadata)
+    loans.indexes.clear()
+    metadata.create_all(fresh_engine)
+    _, used = migrations.explain(fresh_engine, *migrations.HOT_QUERIES[0][1:])
+    assert used is None
+
+    migrations.upgrade(fresh_engine)
+    assert_hot_queries_use_indexes(fresh_engine)
+
+
+def test_upgrade_is_idempotent(fresh_engine):
+    migrations.upgrade(fresh_engine)
+    migrations.upgrade(fresh_engine)
+    assert [version for version, _, applied in migrations.status(fresh_engine) if applied] == \
+        [version for version, _, _ in migrations.MIGRATIONS]
+
+
+def create_dump_schema(engine, rows):
+    """Bảng loans như file dump (trước migration 4): age / term là chuỗi, chưa có cột nhóm, chưa có index"""
+    metadata = MetaData()
+    columns = [
+        Column(c.name, String(20) if c.name in ("age", "term") else c.type, primary_key=c.primary_key)
+        for c in models.Loan.__table__.columns if c.name not in dashboard_engine.GROUP_SQL
+    ]
+    loans = Table("loans", metadata, *columns)
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(loans.insert(), rows)
+
+
+def test_dump_import_upgrades_through_every_migration(fresh_engine):
+    rows = load_dump_rows()[:500]
+    create_dump_schema(fresh_engine, rows)
+    migrations.upgrade(fresh_engine)
+
+    assert all(applied for _, _, applied in migrations.status(fresh_engine))
+    assert_hot_queries_use_indexes(fresh_engine)
+    with sessionmaker(bind=fresh_engine)() as db:
+        scan = dashboard_engine.get_dashboard_data(db)
+        assert scan["kpi"]["total_loans"] == len(rows)
+        assert rollups.get_dashboard_data(db) == scan
+
+
+def test_rollups_rebuild_before_group_columns_exist(fresh_engine):
+    """Migration 3 (dựng rollups) chạy khi bảng loans chưa có age_group / loan_amount_group"""
+    rows = load_dump_rows()[:500]
+    create_dump_schema(fresh_engine, rows)
+    with fresh_engine.begin() as conn:
+        models.LoanRollup.__table__.create(bind=conn)
+        assert rollups.rebuild(conn) > 0
+    with sessionmaker(bind=fresh_engine)() as db:
+        data = rollups.get_dashboard_data(db)
+    assert data["kpi"]["total_loans"] == len(rows)
+    assert sum(row["total_loans"] for row in data["loan_characteristics"]["loan_amount_group"]) == len(rows)
@@ -0,0 +1,106 @@
+"""
+Các backend suy luận (MODEL_FORMAT=native / onnx) phải cho cùng xác suất với
+Pipeline trong pickle trên toàn bộ dump:
+- native (XGBoost booster + spec): giống hệt bit
+- onnx (ONNX Runtime, cây tính bằng float32): |diff| <= ONNX_TOLERANCE, nhãn chỉ
+  được lệch ở hồ sơ có xác suất cách ngưỡng 0.5 không quá ONNX_TOLERANCE
+Artifact được export vào thư mục tạm từ models/xgboost_model.pkl; export cũ
+hơn pickle (train lại sau khi export) thì không được load.
+"""
+import logging
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import model_loader
+import model_registry
+from benchmarks.sample_data import load_dump_rows, loan_features
+
+ONNX_TOLERANCE = 1e-5
+
+
+@pytest.fixture(scope="module")
+def records():
+    return [loan_features(r) for r in load_dump_rows()]
+
+
+@pytest.fixture(scope="module")
+def expected(records):
+    pipeline = model_registry.load_pickle_model()
+    return pipeline.predict_proba(model_loader._build_frame(records))[:, 1]
+
+
+def as_loaded(model, fmt):
+    return model_registry.LoadedModel(model, fmt, fmt, 0.0)
+
+
+def served_proba(loaded, records, batch_size=512):
+    """Xác suất theo đúng đường serve: fast path theo batch và predict_proba (pandas)"""
+    fast = np.concatenate([
+        loaded.booster.inplace_predict(loaded.encoder.encode_batch(records[i:i + batch_size]))
+        for i in range(0, len(records), batch_size)
+    ])
+    frame = loaded.model.predict_proba(model_loader._build_frame(records))[:, 1]
+    return fast, frame
+
+
+@pytest.fixture(scope="module")
+def native(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("native")
+    paths = model_registry.export_native(
+        model_path=str(directory / "xgboost_model.ubj"), spec_path=str(directory / "preprocessing_spec.json"),
+    )
+    return as_loaded(model_registry.load_native_model(*paths), "native")
+
+
+@pytest.fixture(scope="module")
+def onnx(tmp_path_factory):
+    pytest.importorskip("onnxmltools")
+    pytest.importorskip("onnxruntime")
+    directory = tmp_path_factory.mktemp("onnx")
+    paths = model_registry.export_onnx(
+        model_path=str(directory / "xgboost_model.onnx"), spec_path=str(directory / "preprocessing_spec.json"),
+    )
+    return as_loaded(model_registry.load_onnx_model(*paths), "onnx")
+
+
+def test_native_backend_is_bit_identical(native, records, expected):
+    assert native.encoder is not None
+    for actual in served_proba(native, records):
+        assert np.array_equal(actual, expected)
+
+
+def test_onnx_backend_within_tolerance(onnx, records, expected):
+    assert onnx.encoder is not None
+    for actual in served_proba(onnx, records):
+        assert np.abs(actual - expected).max() <= ONNX_TOLERANCE
+        flipped = (actual > 0.5) != (expected > 0.5)
+        assert np.all(np.abs(expected[flipped] - 0.5) <= ONNX_TOLERANCE)
+
+
+def test_onnx_single_row_within_tolerance(onnx, records, expected):
+    for i in range(0, len(records), 50):
+        actual = onnx.booster.inplace_predict(onnx.encoder.encode_batch([records[i]]))
+        assert abs(float(actual[0]) - expected[i]) <= ONNX_TOLERANCE
+
+
+def test_stale_native_export_falls_back_to_pickle(tmp_path, caplog):
+    pickle_path = tmp_path / "xgboost_model.pkl"
+    shutil.copy2(model_registry.MODEL_PATH, pickle_path)
+    model_path, spec_path = model_registry.artifact_paths("native", str(tmp_path))
+    model_registry.export_native(pickle_path=str(pickle_path), model_path=model_path, spec_path=spec_path)
+    assert model_registry.resolve_format("auto", str(tmp_path)) == "native"
+
+    # Train lại: pickle bị thay sau khi export
+    stat = os.stat(pickle_path)
+    os.utime(pickle_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    with caplog.at_level(logging.ERROR, logger="model_registry"):
+        assert model_registry.resolve_format("auto", str(tmp_path)) == "pickle"
+        assert model_registry.resolve_format("native", str(tmp_path)) == "pickle"
+    assert "export-native" in caplog.text
+
+    # Export lại từ pickle mới -> dùng native như cũ
+    model_registry.export_native(pickle_path=str(pickle_path), model_path=model_path, spec_path=spec_path)
+    assert model_registry.resolve_format("auto", str(tmp_path)) == "native"
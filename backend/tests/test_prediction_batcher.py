@@ -0,0 +1,94 @@
+"""
+PredictionBatcher: worker chạy lại không làm mất request đang chờ trong queue,
+và tối đa max_in_flight batch chấm điểm song song trong threadpool.
+"""
+import asyncio
+import contextlib
+import threading
+import time
+
+import pytest
+
+import model_loader
+from prediction_batcher import PredictionBatcher
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """predict_batch giả: mỗi batch mất `delay` giây, ghi lại số batch chạy đồng thời"""
+    state = {"delay": 0.0, "running": 0, "peak": 0, "batches": []}
+    lock = threading.Lock()
+
+    def predict_batch(rows):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            state["batches"].append(len(rows))
+        time.sleep(state["delay"])
+        with lock:
+            state["running"] -= 1
+        return [{"prediction": row["i"]} for row in rows]
+
+    monkeypatch.setattr(model_loader, "predict_batch", predict_batch)
+    return state
+
+
+def test_restarted_worker_keeps_pending_requests(fake_model):
+    async def scenario():
+        batcher = PredictionBatcher(max_wait_ms=1, max_batch_size=2)
+        pending = [asyncio.create_task(batcher.submit({"i": i})) for i in range(3)]
+        await asyncio.sleep(0)
+        # Worker dừng trước khi kịp lấy các request đã vào queue
+        batcher._worker.cancel()
+        await asyncio.sleep(0)
+        late = await asyncio.wait_for(batcher.submit({"i": 3}), 2)
+        return await asyncio.wait_for(asyncio.gather(*pending), 2) + [late]
+
+    results = asyncio.run(scenario())
+    assert [r["prediction"] for r in results] == [0, 1, 2, 3]
+
+
+def test_worker_cancelled_while_collecting_requeues_batch(fake_model):
+    async def scenario():
+        batcher = PredictionBatcher(max_wait_ms=200, max_batch_size=4)
+        pending = [asyncio.create_task(batcher.submit({"i": i})) for i in range(2)]
+        # Worker đã lấy 2 request vào batch và đang chờ thêm tới max_wait
+        await asyncio.sleep(0.05)
+        assert batcher._queue.empty()
+        batcher._worker.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await batcher._worker
+        late = await asyncio.wait_for(batcher.submit({"i": 2}), 5)
+        return await asyncio.wait_for(asyncio.gather(*pending), 5) + [late]
+
+    results = asyncio.run(scenario())
+    assert [r["prediction"] for r in results] == [0, 1, 2]
+    assert fake_model["batches"] == [3]
+
+
+def test_batches_run_concurrently_up_to_max_in_flight(fake_model):
+    fake_model["delay"] = 0.1
+
+    async def scenario():
+        batcher = PredictionBatcher(max_wait_ms=1, max_batch_size=1, max_in_flight=3)
+        return await asyncio.gather(*(batcher.submit({"i": i}) for i in range(9)))
+
+    results = asyncio.run(scenario())
+    assert [r["prediction"] for r in results] == list(range(9))
+    # 3 batch chấm cùng lúc, không hơn
+    assert fake_model["peak"] == 3
+
+
+def test_requests_queue_into_larger_batches_while_slots_are_busy(fake_model):
+    fake_model["delay"] = 0.1
+
+    async def scenario():
+        batcher = PredictionBatcher(max_wait_ms=1, max_batch_size=64, max_in_flight=1)
+        first = asyncio.create_task(batcher.submit({"i": 0}))
+        await asyncio.sleep(0.02)
+        rest = await asyncio.gather(*(batcher.submit({"i": i}) for i in range(1, 11)))
+        return [await first] + rest
+
+    results = asyncio.run(scenario())
+    assert [r["prediction"] for r in results] == list(range(11))
+    assert fake_model["batches"] == [1, 10]
@@ -0,0 +1,53 @@
+"""
+Kết quả trong prediction_cache / explanation_cache luôn thuộc đúng model đã chấm:
+request lấy model v1 rồi registry đổi sang v2 (cache bind v2) trước khi ghi
+cache thì kết quả của v1 không được thành cache hit cho request dùng v2.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import model_loader
+from model_loader import PredictionCache
+
+RECORDS = [{"loan_amount": 100000 + i, "rate_of_interest": 4.5} for i in range(3)]
+V1, V2 = SimpleNamespace(fingerprint="v1"), SimpleNamespace(fingerprint="v2")
+
+
+def scorer(probability, on_score=None):
+    calls = []
+
+    def score(records, loaded):
+        calls.append(len(records))
+        if on_score:
+            on_score()
+        return [{"prediction": 0, "probability": probability} for _ in records]
+    score.calls = calls
+    return score
+
+
+@pytest.mark.parametrize("swap_during_score", [False, True])
+def test_old_model_results_are_not_served_after_swap(swap_during_score):
+    cache = PredictionCache()
+    cache.bind(V1.fingerprint)
+    swap = lambda: cache.bind(V2.fingerprint)
+    if not swap_during_score:
+        # Đổi model sau get_loaded_model() nhưng trước khi tính key
+        swap()
+    old = scorer(0.1, on_score=swap if swap_during_score else None)
+    model_loader._cached_batch(RECORDS, V1, cache, old)
+
+    new = scorer(0.9)
+    results = model_loader._cached_batch(RECORDS, V2, cache, new)
+    assert new.calls == [len(RECORDS)]
+    assert [r["probability"] for r in results] == [0.9] * len(RECORDS)
+
+    again = scorer(0.5)
+    assert [r["probability"] for r in model_loader._cached_batch(RECORDS, V2, cache, again)] == [0.9] * 3
+    assert again.calls == []
+
+
+def test_key_depends_on_model_fingerprint():
+    cache = PredictionCache()
+    assert cache.key(RECORDS[0], "v1") != cache.key(RECORDS[0], "v2")
+    assert cache.key(RECORDS[0], "v1") == cache.key(dict(RECORDS[0]), "v1")
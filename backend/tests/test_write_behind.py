@@ -0,0 +1,92 @@
+"""
+Group commit của write_behind: lỗi xảy ra SAU khi INSERT đã commit (cập nhật
+snapshot / facet index, ghi spool) không được làm worker ghi lại group từng
+dòng một -> không có loan / rollups bị nhân đôi.
+"""
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import models
+import schemas
+from benchmarks.sample_data import load_dump_rows, loan_features
+from database import Base
+from write_behind import WriteBehindQueue
+
+N_LOANS = 5
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'loans.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def sample_loans():
+    return [
+        schemas.LoanCreate(**loan_features(row), prediction=row["prediction"], probability=row["probability"])
+        for row in load_dump_rows()[:N_LOANS]
+    ]
+
+
+def run_queue(session_factory, tmp_path):
+    queue = WriteBehindQueue(spool_path=str(tmp_path / "loans.jsonl"), batch_size=N_LOANS,
+                             max_wait_ms=1000, session_factory=session_factory)
+    queue.start()
+    tickets = [queue.submit(loan) for loan in sample_loans()]
+    queue.stop()
+    return queue, tickets
+
+
+def stored_counts(session_factory):
+    with session_factory() as db:
+        loans = db.scalar(select(func.count()).select_from(models.Loan))
+        kpi = db.scalar(select(func.sum(models.LoanRollup.n)).where(models.LoanRollup.section == "kpi"))
+    return loans, kpi
+
+
+def test_post_commit_index_error_does_not_reinsert(session_factory, tmp_path, monkeypatch):
+    def fail(rows):
+        raise RuntimeError("index update failed")
+
+    monkeypatch.setattr(crud.facet_index, "add", fail)
+    monkeypatch.setattr(crud.snapshot, "append", fail)
+    queue, tickets = run_queue(session_factory, tmp_path)
+
+    assert stored_counts(session_factory) == (N_LOANS, N_LOANS)
+    assert [t.status for t in tickets] == ["persisted"] * N_LOANS
+    assert queue.commits == 1 and queue.failed == 0
+
+
+def test_post_commit_spool_error_does_not_reinsert(session_factory, tmp_path, monkeypatch):
+    spool_write = WriteBehindQueue._spool_write
+
+    def done_fails(self, entries):
+        if any("done" in entry for entry in entries):
+            raise OSError("disk full")
+        spool_write(self, entries)
+
+    monkeypatch.setattr(WriteBehindQueue, "_spool_write", done_fails)
+    _, tickets = run_queue(session_factory, tmp_path)
+
+    assert stored_counts(session_factory) == (N_LOANS, N_LOANS)
+    assert [t.status for t in tickets] == ["persisted"] * N_LOANS
+
+
+def test_insert_error_falls_back_to_single_rows(session_factory, tmp_path, monkeypatch):
+    insert = crud.insert_loan_rows
+
+    def reject_groups(db, rows, with_ids=False):
+        if len(rows) > 1:
+            raise ValueError("bad row in group")
+        return insert(db, rows, with_ids)
+
+    monkeypatch.setattr(crud, "insert_loan_rows", reject_groups)
+    queue, tickets = run_queue(session_factory, tmp_path)
+
+    assert stored_counts(session_factory) == (N_LOANS, N_LOANS)
+    assert [t.status for t in tickets] == ["persisted"] * N_LOANS
+    assert queue.commits == N_LOANS
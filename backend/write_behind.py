@@ -0,0 +1,330 @@
+"""
+Ghi trễ (write-behind) cho POST /loans/: request chỉ ghi vào spool rồi xếp
+hàng, trả 202 kèm ticket; 1 thread nền gom các loan thành group commit
+(normalize_loans + INSERT nhiều dòng + rollups trong 1 transaction) theo kích
+thước hoặc cửa sổ thời gian, thay vì mỗi request 1 commit + refresh.
+
+- Spool (WRITE_BEHIND_SPOOL, JSON lines): mỗi loan (chưa chuẩn hóa, kèm Month /
+  Year lúc nhận) được ghi trước khi trả 202, sau mỗi group commit ghi dòng
+  {"done": [...]}; lúc khởi động các ticket chưa "done" được xếp hàng lại. Spool được cắt về rỗng khi hàng đợi trống.
+  Nếu process chết giữa commit và dòng "done" thì loan đó được ghi lại 1 lần nữa
+  (at-least-once).
+- Hàng đợi giới hạn WRITE_BEHIND_MAX_QUEUE: đầy thì chờ tối đa
+  WRITE_BEHIND_ENQUEUE_TIMEOUT_MS rồi báo QueueFull (route trả 503 + Retry-After).
+- GET /loans/tickets/{ticket}?wait=<giây>: trạng thái queued | persisted | failed,
+  kèm loan_id khi DB trả được id (executemany RETURNING: SQLite, MariaDB).
+
+Bật bằng WRITE_BEHIND=1; cấu hình còn lại:
+- WRITE_BEHIND_BATCH_SIZE: số loan tối đa mỗi group commit (mặc định 200)
+- WRITE_BEHIND_MAX_WAIT_MS: thời gian tối đa gom 1 group (mặc định 20ms)
+- WRITE_BEHIND_FSYNC=1: fsync spool mỗi lần ghi (mặc định chỉ flush, đủ cho
+  trường hợp process chết, không đủ khi mất điện)
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+import crud
+import schemas
+from dashboard_cache import dashboard_cache
+from database import SessionLocal
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_SPOOL = os.getenv("WRITE_BEHIND_SPOOL", os.path.join(BASE_DIR, "spool", "loans.jsonl"))
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_MAX_WAIT_MS = float(os.getenv("WRITE_BEHIND_MAX_WAIT_MS", "20"))
+WRITE_BEHIND_ENQUEUE_TIMEOUT_MS = float(os.getenv("WRITE_BEHIND_ENQUEUE_TIMEOUT_MS", "100"))
+WRITE_BEHIND_FSYNC = os.getenv("WRITE_BEHIND_FSYNC", "0") == "1"
+# Số ticket đã xong giữ lại để tra cứu
+WRITE_BEHIND_TICKET_HISTORY = int(os.getenv("WRITE_BEHIND_TICKET_HISTORY", "100000"))
+
+RETRY_BACKOFF_SECONDS = [0.1, 0.5, 1, 2, 5]
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Ticket:
+    __slots__ = ("id", "status", "loan_id", "error", "done")
+
+    def __init__(self, ticket_id: str):
+        self.id = ticket_id
+        self.status = "queued"
+        self.loan_id = None
+        self.error = None
+        self.done = threading.Event()
+
+    def finish(self, status: str, loan_id=None, error=None):
+        self.status, self.loan_id, self.error = status, loan_id, error
+        self.done.set()
+
+    def as_dict(self):
+        return {"ticket": self.id, "status": self.status, "loan_id": self.loan_id, "error": self.error}
+
+
+class WriteBehindQueue:
+    def __init__(self, spool_path: str = WRITE_BEHIND_SPOOL, max_queue: int = WRITE_BEHIND_MAX_QUEUE,
+                 batch_size: int = WRITE_BEHIND_BATCH_SIZE, max_wait_ms: float = WRITE_BEHIND_MAX_WAIT_MS,
+                 session_factory=SessionLocal):
+        self.spool_path = spool_path
+        self.session_factory = session_factory
+        self.max_queue = max_queue
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._spool_lock = threading.Lock()
+        self._spool = None
+        self._tickets = OrderedDict()
+        self._in_flight = 0
+        self._worker = None
+        self._stopping = False
+
+        self.accepted = 0
+        self.persisted = 0
+        self.failed = 0
+        self.rejected = 0
+        self.recovered = 0
+        self.commits = 0
+        self.batch_size_hist = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024])
+
+    # --- spool -----------------------------------------------------------------
+
+    def _spool_write(self, entries: list):
+        with self._spool_lock:
+            for entry in entries:
+                self._spool.write(json.dumps(entry, default=str) + "\n")
+            self._spool.flush()
+            if WRITE_BEHIND_FSYNC:
+                os.fsync(self._spool.fileno())
+
+    def _spool_compact(self):
+        """Hàng đợi trống và không có group nào đang ghi -> mọi dòng trong spool đã xong"""
+        with self._cond:
+            idle = not self._queue and self._in_flight == 0
+            if idle:
+                with self._spool_lock:
+                    self._spool.seek(0)
+                    self._spool.truncate()
+
+    def _recover(self) -> list:
+        """Đọc spool cũ, trả về các (ticket, loan) chưa được đánh dấu done"""
+        if not os.path.exists(self.spool_path):
+            return []
+        pending = OrderedDict()
+        with open(self.spool_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Dòng cuối bị cắt dở khi process chết giữa lúc ghi
+                    continue
+                if "done" in entry:
+                    for ticket_id in entry["done"]:
+                        pending.pop(ticket_id, None)
+                else:
+                    pending[entry["ticket"]] = entry["loan"]
+        return list(pending.items())
+
+    # --- vòng đời ----------------------------------------------------------------
+
+    def start(self):
+        if self._worker is not None:
+            return
+        os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+        recovered = self._recover()
+        self._spool = open(self.spool_path, "w", encoding="utf-8")
+        if recovered:
+            # Spool mới chỉ chứa phần còn dang dở của spool cũ
+            self._spool_write([{"ticket": t, "loan": loan} for t, loan in recovered])
+            with self._cond:
+                for ticket_id, loan in recovered:
+                    self._queue.append((self._new_ticket(ticket_id), loan))
+            self.recovered = len(recovered)
+            logger.info("Write-behind recovered %d loans from %s", len(recovered), self.spool_path)
+
+        self._stopping = False
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: float = 30):
+        """Dừng worker sau khi ghi hết hàng đợi"""
+        if self._worker is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        self._worker = None
+        with self._spool_lock:
+            self._spool.close()
+
+    # --- ticket ------------------------------------------------------------------
+
+    def _new_ticket(self, ticket_id: str = None) -> Ticket:
+        ticket = Ticket(ticket_id or uuid.uuid4().hex)
+        self._tickets[ticket.id] = ticket
+        while len(self._tickets) > WRITE_BEHIND_TICKET_HISTORY:
+            oldest = next(iter(self._tickets.values()))
+            if oldest.status == "queued":
+                break
+            self._tickets.popitem(last=False)
+        return ticket
+
+    def ticket(self, ticket_id: str):
+        with self._cond:
+            return self._tickets.get(ticket_id)
+
+    # --- nhận loan ---------------------------------------------------------------
+
+    def submit(self, loan: schemas.LoanCreate, timeout_ms: float = WRITE_BEHIND_ENQUEUE_TIMEOUT_MS) -> Ticket:
+        # Chuẩn hóa (pandas) để worker làm 1 lần cho cả group; Month/Year lấy lúc nhận
+        now = datetime.now()
+        row = dict(loan.dict(), Month=now.strftime("%B"), Year=now.year)
+
+        deadline = time.monotonic() + timeout_ms / 1000.0
+        with self._cond:
+            while len(self._queue) >= self.max_queue:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise QueueFull("Write-behind queue is full")
+                self._cond.wait(remaining)
+            ticket = self._new_ticket()
+            # Ghi spool trong lock để thứ tự trong spool khớp thứ tự hàng đợi
+            self._spool_write([{"ticket": ticket.id, "loan": row}])
+            self._queue.append((ticket, row))
+            self.accepted += 1
+            self._cond.notify_all()
+        return ticket
+
+    # --- worker ------------------------------------------------------------------
+
+    def _collect(self) -> list:
+        with self._cond:
+            while not self._queue and not self._stopping:
+                self._cond.wait()
+            if not self._queue:
+                return []
+
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._in_flight += 1
+            # Có chỗ trống -> đánh thức các request đang chờ (backpressure)
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            try:
+                self._flush(batch)
+            except Exception as e:
+                logger.exception("Write-behind flush error: %s", e)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+            self._spool_compact()
+
+    def _flush(self, batch: list):
+        attempt = 0
+        while True:
+            try:
+                ids = self._commit(batch)
+            except DBAPIError as e:
+                if not (e.connection_invalidated or isinstance(e, OperationalError)):
+                    break
+                # Mất kết nối DB: giữ nguyên group và thử lại, hàng đợi đầy dần -> 503
+                delay = RETRY_BACKOFF_SECONDS[min(attempt, len(RETRY_BACKOFF_SECONDS) - 1)]
+                logger.warning("Write-behind commit failed (%s), retrying in %.1fs", e.__class__.__name__, delay)
+                attempt += 1
+                time.sleep(delay)
+            except Exception:
+                break
+            else:
+                # Ngoài try: lỗi sau khi đã commit không được rơi xuống nhánh ghi lại từng dòng
+                self._persisted(batch, ids)
+                return
+
+        # Lỗi dữ liệu (INSERT / COMMIT không thành): ghi từng dòng để chỉ loan hỏng bị đánh dấu failed
+        for item in batch:
+            try:
+                ids = self._commit([item])
+            except Exception as e:
+                logger.warning("Write-behind insert failed for ticket %s: %s", item[0].id, e)
+                with self._cond:
+                    item[0].finish("failed", error=e.__class__.__name__)
+                    self.failed += 1
+                self._spool_write([{"done": [item[0].id]}])
+            else:
+                self._persisted([item], ids)
+
+    def _commit(self, batch: list):
+        """INSERT + COMMIT cả group; ném lỗi nghĩa là chưa dòng nào được ghi"""
+        db = self.session_factory()
+        try:
+            rows = crud.normalize_loans([row for _, row in batch])
+            for row, (_, accepted) in zip(rows, batch):
+                row["Month"], row["Year"] = accepted["Month"], accepted["Year"]
+            return crud.insert_loan_rows(db, rows, with_ids=True)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _persisted(self, batch: list, ids):
+        dashboard_cache.invalidate()
+        try:
+            self._spool_write([{"done": [ticket.id for ticket, _ in batch]}])
+        finally:
+            with self._cond:
+                for i, (ticket, _) in enumerate(batch):
+                    ticket.finish("persisted", ids[i] if ids else None)
+                self.persisted += len(batch)
+                self.commits += 1
+            self.batch_size_hist.observe(len(batch))
+
+    def stats(self):
+        with self._cond:
+            return {
+                "enabled": WRITE_BEHIND,
+                "running": self._worker is not None,
+                "queue_depth": len(self._queue),
+                "max_queue": self.max_queue,
+                "batch_size": self.batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "accepted": self.accepted,
+                "persisted": self.persisted,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "recovered": self.recovered,
+                "commits": self.commits,
+                "group_size": self.batch_size_hist.snapshot(),
+                "spool": self.spool_path,
+            }
+
+
+writer = WriteBehindQueue()